@@ -14,6 +14,7 @@ from pathlib import Path
 from decouple import config
 import dj_database_url
 import os
+import tempfile
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -90,6 +91,18 @@ WSGI_APPLICATION = 'library_management.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Connections are kept for DB_CONN_MAX_AGE seconds and checked before they
+# are reused, instead of a new TCP and auth handshake per request. With
+# DB_POOL=True each process keeps a psycopg pool of DB_POOL_MIN_SIZE to
+# DB_POOL_MAX_SIZE connections instead (Postgres only; Django requires
+# CONN_MAX_AGE = 0 then). Size it so that processes * DB_POOL_MAX_SIZE stays
+# below the server's max_connections.
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+DB_CONNECTIONS = {
+    'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+    'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+}
+
 if config('POSTGRES_DB'):
     DATABASES = {
         'default': {
@@ -98,17 +111,105 @@ if config('POSTGRES_DB'):
             'USER': config('POSTGRES_USER'),
             'PASSWORD': config('POSTGRES_PASSWORD'),
             'HOST': config('POSTGRES_HOST'),
-            'PORT': 5432,
+            'PORT': config('POSTGRES_PORT', default=5432, cast=int),
+            **DB_CONNECTIONS,
         }
     }
+    if DB_POOL:
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+                'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+                'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+            },
+        }
 else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            **DB_CONNECTIONS,
+        }
+    }
+
+
+# Cache
+# Redis in production (shared by all workers), a directory or local memory
+# otherwise. The dashboard statistics use STATS_CACHE_ALIAS.
+
+if config('REDIS_URL', default=''):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('REDIS_URL'),
+        }
+    }
+elif config('CACHE_DIR', default=''):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         }
     }
 
+# Rendered barcode images. They never change, so entries do not expire;
+# each web node keeps its own directory, outside the source tree.
+CACHES['barcodes'] = {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': config('BARCODE_CACHE_DIR',
+                       default=os.path.join(tempfile.gettempdir(), 'library_barcodes')),
+    'TIMEOUT': None,
+    'OPTIONS': {
+        'MAX_ENTRIES': config('BARCODE_CACHE_ENTRIES', default=100_000, cast=int),
+    },
+}
+
+STATS_CACHE_ALIAS = 'default'
+STATS_CACHE_TIMEOUT = config('STATS_CACHE_TIMEOUT', default=60 * 60 * 24, cast=int)
+
+# Serialized API payloads (myApp.api.caching), evicted by the backend.
+API_CACHE_ALIAS = 'default'
+API_CACHE_TIMEOUT = config('API_CACHE_TIMEOUT', default=300, cast=int)
+
+# PDF reports are rendered by this many worker processes per web process,
+# 0 renders them inside the request.
+REPORT_WORKERS = config('REPORT_WORKERS', default=2, cast=int)
+# Rows drawn per chart in the PDF report.
+REPORT_CHART_TOP = config('REPORT_CHART_TOP', default=20, cast=int)
+# Pending or running reports older than this (seconds) are marked failed.
+REPORT_TIMEOUT = config('REPORT_TIMEOUT', default=600, cast=int)
+
+# Route the read-heavy views to their async versions (myApp.async_views);
+# turn on when serving through ASGI (uvicorn workers).
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# Returned loans older than this move to the archive table (myApp.archive).
+LOAN_ARCHIVE_AFTER_DAYS = config('LOAN_ARCHIVE_AFTER_DAYS', default=365, cast=int)
+
+# Circulation events younger than this are left for the next rollup run
+# (myApp.rollups), so transactions still in flight are never skipped.
+ROLLUP_SETTLE_SECONDS = config('ROLLUP_SETTLE_SECONDS', default=30, cast=int)
+
+# Outgoing mail, overdue notices (myApp.notices) included.
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='library@localhost')
+# Overdue notices are sent by this many threads, at most NOTICE_RATE
+# messages per second in total (0 for no limit).
+NOTICE_WORKERS = config('NOTICE_WORKERS', default=4, cast=int)
+NOTICE_RATE = config('NOTICE_RATE', default=10, cast=float)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -1,8 +1,133 @@
-from django.contrib import admin
-from .models import Author, Book, BorrowRecord, BookCopy
+import io
 
+from django.contrib import admin, messages
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.urls import path
 
-admin.site.register(Author)
-admin.site.register(Book)
-admin.site.register(BorrowRecord)
-admin.site.register(BookCopy)
\ No newline at end of file
+from . import catalogue
+from .forms import CatalogueImportForm
+from .models import (
+    ArchivedBorrowRecord, Author, Book, BorrowRecord, BookCopy, CirculationEvent,
+    LibraryCard, OverdueNotice
+)
+
+
+@admin.register(Author)
+class AuthorAdmin(admin.ModelAdmin):
+    list_display = ('name', 'book_count')
+    search_fields = ('name',)
+
+
+@admin.register(Book)
+class BookAdmin(admin.ModelAdmin):
+    list_display = ('title', 'author', 'daily_rent',
+                    'total_copies', 'available_copies')
+    list_select_related = ('author',)
+    search_fields = ('title',)
+    change_list_template = 'admin/myApp/book/catalogue_change_list.html'
+    actions = ['export_csv', 'export_jsonl']
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_catalogue),
+                 name='myApp_book_import'),
+        ] + super().get_urls()
+
+    def import_catalogue(self, request):
+        """Stream-import an uploaded catalogue file."""
+        if not self.has_add_permission(request):
+            return redirect('admin:myApp_book_changelist')
+        form = CatalogueImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            fmt = form.cleaned_data['format'] or catalogue.guess_format(upload.name)
+            try:
+                stats = catalogue.import_rows(catalogue.read_rows(
+                    io.TextIOWrapper(upload.file, encoding='utf-8', newline=''), fmt))
+            except ValueError as e:
+                messages.error(request, f'Import stopped, earlier batches were kept: {e}')
+            else:
+                messages.success(
+                    request,
+                    f"Imported {stats['books']} books, {stats['authors']} new authors "
+                    f"and {stats['copies']} copies, skipped {stats['skipped']} known titles.")
+                return redirect('admin:myApp_book_changelist')
+        return render(request, 'admin/myApp/book/import_catalogue.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'form': form,
+            'title': 'Import catalogue',
+        })
+
+    def _export(self, queryset, fmt):
+        response = StreamingHttpResponse(
+            catalogue.export_lines(catalogue.export_rows(queryset), fmt),
+            content_type='text/csv' if fmt == 'csv' else 'application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="catalogue.{fmt}"'
+        return response
+
+    @admin.action(description='Export selected books as CSV')
+    def export_csv(self, request, queryset):
+        return self._export(queryset, 'csv')
+
+    @admin.action(description='Export selected books as JSON lines')
+    def export_jsonl(self, request, queryset):
+        return self._export(queryset, 'jsonl')
+
+
+@admin.register(BorrowRecord)
+class BorrowRecordAdmin(admin.ModelAdmin):
+    list_select_related = ('borrower', 'book_copy__book')
+
+
+@admin.register(ArchivedBorrowRecord)
+class ArchivedBorrowRecordAdmin(admin.ModelAdmin):
+    list_display = ('id', 'borrower', 'book_copy', 'borrowed_at', 'returned_at', 'total_fee')
+    list_select_related = ('borrower', 'book_copy__book')
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(BookCopy)
+class BookCopyAdmin(admin.ModelAdmin):
+    list_select_related = ('book',)
+
+
+@admin.register(CirculationEvent)
+class CirculationEventAdmin(admin.ModelAdmin):
+    list_display = ('occurred_at', 'kind', 'book_copy_id', 'user_id', 'record_id', 'delta')
+    list_filter = ('kind',)
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LibraryCard)
+class LibraryCardAdmin(admin.ModelAdmin):
+    list_display = ('number', 'user', 'is_active', 'issued_at')
+    list_select_related = ('user',)
+    list_filter = ('is_active',)
+    search_fields = ('=number', 'user__username')
+    raw_id_fields = ('user',)
+
+
+@admin.register(OverdueNotice)
+class OverdueNoticeAdmin(admin.ModelAdmin):
+    list_display = ('borrower', 'day', 'status', 'loans', 'amount', 'sent_at')
+    list_select_related = ('borrower',)
+    list_filter = ('status', 'day')
+    search_fields = ('borrower__username', 'borrower__email')
+    raw_id_fields = ('borrower',)
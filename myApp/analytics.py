@@ -0,0 +1,121 @@
+"""
+Series behind the eight inventory dashboard charts.
+
+Every series comes from a grouped ``values``/``annotate`` query, three
+queries in total whatever the size of the catalogue:
+
+* books: copies, daily rent, borrow count, borrowed now and revenue;
+* authors: books and copies;
+* users: revenue (top ``DEFAULT_TOP_USERS`` unless ``top`` is given).
+
+Snapshot series read the stored copy counters. Borrow counts and revenue
+are summed from the daily rollups (``rollups``), so limiting them to the
+days from ``since`` to ``until`` only reads the rows of those days. Loans
+count on the day they were made, revenue on the day it was charged.
+"""
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.db.models import DecimalField, F, FilteredRelation, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Author, Book
+
+
+DEFAULT_TOP_USERS = 10
+
+
+def _days(since=None, until=None):
+    """
+    The ``daily_stats`` rollup rows from ``since`` to ``until``. The range
+    goes into the JOIN, so it is read through the (key, day) unique index.
+    """
+    q = Q()
+    if since:
+        q &= Q(daily_stats__day__gte=_day(since))
+    if until:
+        q &= Q(daily_stats__day__lte=_day(until))
+    return FilteredRelation('daily_stats', condition=q)
+
+
+def _day(value):
+    return timezone.localdate(value) if isinstance(value, datetime) else value
+
+
+def _books(top=None, since=None, until=None):
+    money = DecimalField(max_digits=12, decimal_places=2)
+    books = Book.objects.order_by().annotate(days=_days(since, until)).annotate(
+        borrow_count=Coalesce(Sum('days__loans'), 0),
+        revenue=Coalesce(Sum('days__revenue'), 0, output_field=money),
+        borrowed_now=F('total_copies') - F('available_copies'),
+    ).values(
+        'pk', 'title', 'daily_rent', 'total_copies',
+        'borrow_count', 'borrowed_now', 'revenue',
+    )
+    if top:
+        return books.order_by('-borrow_count', 'pk')[:top]
+    return books.order_by('pk')
+
+
+def _authors(top=None):
+    authors = Author.objects.order_by().annotate(
+        copies=Coalesce(Sum('books__total_copies'), 0),
+    ).values('pk', 'name', 'book_count', 'copies')
+    if top:
+        return authors.order_by('-copies', 'pk')[:top]
+    return authors.order_by('pk')
+
+
+def _users(top=DEFAULT_TOP_USERS, since=None, until=None):
+    money = DecimalField(max_digits=12, decimal_places=2)
+    users = get_user_model().objects.order_by().annotate(days=_days(since, until)).annotate(
+        revenue=Coalesce(Sum('days__revenue'), 0, output_field=money),
+    ).filter(revenue__gt=0).values('username', 'revenue')
+    return users.order_by('-revenue', 'username')[:top or DEFAULT_TOP_USERS]
+
+
+def book_rows(top=None, since=None, until=None):
+    return list(_books(top, since, until))
+
+
+def author_rows(top=None):
+    return list(_authors(top))
+
+
+def user_rows(top=DEFAULT_TOP_USERS, since=None, until=None):
+    return list(_users(top, since, until))
+
+
+def chart_series(top=None, since=None, until=None):
+    """The ``chart_data`` payload: eight ``{labels, values}`` series."""
+    return _series(book_rows(top, since, until), author_rows(top),
+                   user_rows(top, since, until))
+
+
+async def achart_series(top=None, since=None, until=None):
+    """``chart_series`` through the async ORM."""
+    return _series(
+        [row async for row in _books(top, since, until)],
+        [row async for row in _authors(top)],
+        [row async for row in _users(top, since, until)],
+    )
+
+
+def _series(books, authors, users):
+    books_list = [book['title'] for book in books]
+    authors_list = [author['name'] for author in authors]
+
+    def series(labels, rows, key):
+        return {"labels": labels, "values": [row[key] for row in rows]}
+
+    return {
+        "chart1": series(books_list, books, 'total_copies'),
+        "chart2": series(authors_list, authors, 'copies'),
+        "chart3": series(authors_list, authors, 'book_count'),
+        "chart4": series(books_list, books, 'daily_rent'),
+        "chart5": series(books_list, books, 'borrow_count'),
+        "chart6": series(books_list, books, 'borrowed_now'),
+        "chart7": series(books_list, books, 'revenue'),
+        "chart8": series([user['username'] for user in users], users, 'revenue'),
+    }
@@ -0,0 +1,118 @@
+"""
+Conditional GET and server-side caching for the read-only API endpoints.
+
+A view lists the models its payload is built from in ``cache_models``. The
+ETag of a response is a hash of their data versions (``myApp.stats_cache``),
+the full request URL and the caller's scope, so it can be computed from the
+cache alone: a poll with a matching ``If-None-Match`` gets a 304, and any
+other poll of unchanged data is answered with the serialized payload stored
+under that ETag. Neither touches the database.
+
+Payloads expire after ``settings.API_CACHE_TIMEOUT`` seconds and are evicted
+by the cache backend (``settings.API_CACHE_ALIAS``) when it is full.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from myApp import stats_cache
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def make_etag(request, models, scope='public'):
+    """ETag of a payload built from ``models`` for this URL and scope."""
+    parts = [
+        *stats_cache.get_versions(*models),
+        request.build_absolute_uri(),
+        scope,
+    ]
+    return '"%s"' % hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def payload_key(etag):
+    return f'api:payload:{etag}'
+
+
+def payload_timeout():
+    return getattr(settings, 'API_CACHE_TIMEOUT', 300)
+
+
+async def acached_json(request, models, build, scope='public'):
+    """
+    ``CachedResponseMixin.cached_response`` for async views: a 304, the
+    cached payload or ``await build()``, rendered like DRF renders it. It
+    shares the ETags and payloads of the sync views.
+    """
+    etag = make_etag(request, models, scope)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        cache = get_cache()
+        data = await cache.aget(payload_key(etag))
+        if data is None:
+            data = await build()
+            await cache.aset(payload_key(etag), data, timeout=payload_timeout())
+        response = HttpResponse(
+            JSONRenderer().render(data), content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class CachedResponseMixin:
+    """
+    Serve GET responses of an API view through ``cached_response``.
+    ``cache_models`` must name every model the payload reads.
+    """
+    cache_models = ()
+
+    def cache_scope(self, request):
+        """Who may share a cached payload; views that filter per user override it."""
+        return 'public'
+
+    def cache_etag(self, request):
+        return make_etag(request, self.cache_models, self.cache_scope(request))
+
+    def cached_response(self, request, build):
+        """
+        A 304 or the cached payload when the data has not moved, otherwise
+        ``build()``, whose successful payload is cached.
+        """
+        etag = self.cache_etag(request)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache = get_cache()
+            data = cache.get(payload_key(etag))
+            if data is None:
+                response = build()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(payload_key(etag), response.data, timeout=payload_timeout())
+            else:
+                response = Response(data)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class CachedViewSetMixin(CachedResponseMixin):
+    """``CachedResponseMixin`` for the list and retrieve actions of a viewset."""
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(CachedViewSetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(CachedViewSetMixin, self).retrieve(request, *args, **kwargs))
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class LibraryCursorPagination(CursorPagination):
+    """
+    Newest first, ``?page_size=`` up to 200. A cursor page costs one query
+    however deep the client scrolls.
+    """
+    ordering = '-pk'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
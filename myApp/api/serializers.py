@@ -1,10 +1,87 @@
-from myApp.models import Author
+from django.db.models.functions import Lower
+from myApp.models import Author, Book, BookCopy, BorrowRecord
 from rest_framework import serializers
 
 
 
+class FieldsMixin:
+    """
+    Let clients pick the fields they need with ``?fields=id,title``.
+    Unknown names are ignored.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        wanted = request.query_params.get('fields') if request else None
+        if wanted:
+            keep = {name.strip() for name in wanted.split(',')}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+
+
 class AuthorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Author
         fields = ['id', 'name']
-        read_only_fields = ['id']
\ No newline at end of file
+        read_only_fields = ['id']
+
+
+class BookSerializer(FieldsMixin, serializers.ModelSerializer):
+    author_name = serializers.CharField(source='author.name', read_only=True)
+    stock = serializers.IntegerField(source='available_copies', read_only=True)
+
+    class Meta:
+        model = Book
+        fields = ['id', 'title', 'author', 'author_name', 'daily_rent',
+                  'image', 'total_copies', 'stock']
+        read_only_fields = ['id', 'total_copies']
+
+    def validate_title(self, value):
+        """Titles are unique whatever their case (``unique_book_title_ci``)."""
+        books = Book.objects.annotate(lower_title=Lower('title')).filter(
+            lower_title=value.lower())
+        if self.instance is not None:
+            books = books.exclude(pk=self.instance.pk)
+        if books.exists():
+            raise serializers.ValidationError("We already have this book.")
+        return value
+
+
+class BookCopySerializer(FieldsMixin, serializers.ModelSerializer):
+    book_title = serializers.CharField(source='book.title', read_only=True)
+    barcode_url = serializers.CharField(read_only=True)
+    current_borrower = serializers.CharField(read_only=True, default=None)
+
+    class Meta:
+        model = BookCopy
+        fields = ['id', 'book', 'book_title', 'barcode', 'barcode_url',
+                  'is_available', 'current_borrower']
+        read_only_fields = ['id', 'is_available']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if not (request and request.user.is_staff):
+            # Who holds a copy is for the desk only.
+            self.fields.pop('current_borrower', None)
+
+
+class BorrowRecordSerializer(FieldsMixin, serializers.ModelSerializer):
+    book = serializers.IntegerField(source='book_copy.book_id', read_only=True)
+    book_title = serializers.CharField(source='book_copy.book.title', read_only=True)
+    barcode = serializers.CharField(source='book_copy.barcode', read_only=True)
+    borrower = serializers.CharField(source='borrower.username', read_only=True)
+    current_fee = serializers.DecimalField(
+        max_digits=10, decimal_places=2, read_only=True, default=None)
+
+    class Meta:
+        model = BorrowRecord
+        fields = ['id', 'book_copy', 'book', 'book_title', 'barcode',
+                  'borrower', 'rented_days', 'borrowed_at', 'returned_at',
+                  'total_fee', 'current_fee']
+        read_only_fields = fields
+
+
+class BorrowSerializer(serializers.Serializer):
+    rented_days = serializers.IntegerField(min_value=1, required=False)
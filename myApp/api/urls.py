@@ -1,9 +1,21 @@
 from . import views
-from django.urls import path
+from django.conf import settings
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from myApp import async_views
 
 
 app_name = "myApp"
 
+router = DefaultRouter()
+router.register('books', views.BookViewSet, basename='book')
+router.register('copies', views.BookCopyViewSet, basename='copy')
+router.register('loans', views.BorrowRecordViewSet, basename='loan')
+
 urlpatterns = [
-    path('authors/', views.AuthorAPIView.as_view(), name='authors_api'),
+    path('authors/',
+         async_views.author_list if settings.ASYNC_VIEWS else views.AuthorAPIView.as_view(),
+         name='authors_api'),
+    path('', include(router.urls)),
 ]
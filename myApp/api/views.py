@@ -1,16 +1,226 @@
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.utils import timezone
 from rest_framework.views import APIView
-from .serializers import AuthorSerializer
-from myApp.models import Author
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from .caching import CachedResponseMixin, CachedViewSetMixin
+from .pagination import LibraryCursorPagination
+from .serializers import (
+    AuthorSerializer, BookCopySerializer, BookSerializer,
+    BorrowRecordSerializer, BorrowSerializer
+)
+from myApp import dashboard, services
+from myApp.models import Author, Book, BookCopy, BorrowRecord, LoanHistory
 from rest_framework.response import Response
-from rest_framework import status
 
 
 
-class AuthorAPIView(APIView):
+class AuthorAPIView(CachedResponseMixin, APIView):
+    cache_models = (Author,)
+
     def get(self, request):
+        return self.cached_response(request, self.build)
+
+    def build(self):
         authors = Author.objects.all()
         serialized_authors = AuthorSerializer(authors, many=True)
         return Response(
             serialized_authors.data,
             status=status.HTTP_200_OK
-        )
\ No newline at end of file
+        )
+
+
+class IsStaffOrReadOnly(permissions.BasePermission):
+    """Signed-in users can read, only staff can change the catalogue."""
+
+    def has_permission(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return False
+        return request.method in permissions.SAFE_METHODS or request.user.is_staff
+
+
+def _circulation_error(e):
+    """A ``services.CirculationError`` as a 409 response."""
+    return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+
+
+def _loan_response(view, record, status=status.HTTP_200_OK):
+    """``record`` reloaded with its fee annotations, serialized."""
+    record = BorrowRecord.objects.with_fees().select_related(
+        'book_copy', 'book_copy__book', 'borrower').get(pk=record.pk)
+    return Response(
+        BorrowRecordSerializer(record, context=view.get_serializer_context()).data,
+        status=status)
+
+
+def _flag(value):
+    if value in ('1', 'true', 'True', 'yes'):
+        return True
+    if value in ('0', 'false', 'False', 'no'):
+        return False
+    raise ValidationError(f"Expected true or false, got {value!r}.")
+
+
+def _id(params, name):
+    try:
+        return int(params[name])
+    except ValueError:
+        raise ValidationError({name: f"Expected an id, got {params[name]!r}."})
+
+
+def _user_or_400(value):
+    try:
+        return User.objects.get(pk=int(value))
+    except (TypeError, ValueError, User.DoesNotExist):
+        raise ValidationError({"user": "Unknown user."})
+
+
+class BookViewSet(CachedViewSetMixin, viewsets.ModelViewSet):
+    """
+    Books with their author and stock. Filters: ``?q=`` (title or author),
+    ``?author=<id>``, ``?available=true``.
+    """
+    serializer_class = BookSerializer
+    cache_models = (Book, Author)
+    permission_classes = [IsStaffOrReadOnly]
+    pagination_class = LibraryCursorPagination
+
+    def get_queryset(self):
+        books = Book.objects.select_related('author')
+        params = self.request.query_params
+        q = params.get('q', '').strip()
+        if q:
+            books = books.filter(Q(title__icontains=q) | Q(author__name__icontains=q))
+        if params.get('author'):
+            books = books.filter(author_id=_id(params, 'author'))
+        if params.get('available'):
+            if _flag(params['available']):
+                books = books.filter(available_copies__gt=0)
+            else:
+                books = books.filter(available_copies=0)
+        return books
+
+    @action(detail=True, methods=['post'],
+            permission_classes=[permissions.IsAuthenticated])
+    def borrow(self, request, pk=None):
+        """Check out any free copy of the book to the signed-in user."""
+        book = self.get_object()
+        options = BorrowSerializer(data=request.data)
+        options.is_valid(raise_exception=True)
+        if BorrowRecord.objects.filter(
+                book_copy__book=book, borrower=request.user,
+                returned_at__isnull=True).exists():
+            return _circulation_error(
+                "You have already borrowed a copy of this book.")
+        try:
+            record = services.borrow_book(
+                book, request.user, options.validated_data.get('rented_days'))
+        except services.CirculationError as e:
+            return _circulation_error(e)
+        return _loan_response(self, record, status.HTTP_201_CREATED)
+
+
+class BookCopyViewSet(CachedViewSetMixin, viewsets.ModelViewSet):
+    """
+    Copies, with the user holding them for staff. Filters: ``?book=<id>``,
+    ``?barcode=``, ``?available=true``.
+    """
+    serializer_class = BookCopySerializer
+    cache_models = (BookCopy, Book, BorrowRecord, User)
+    permission_classes = [IsStaffOrReadOnly]
+    pagination_class = LibraryCursorPagination
+
+    def cache_scope(self, request):
+        # Only staff payloads name the borrowers.
+        return 'staff' if request.user.is_staff else 'public'
+
+    def get_queryset(self):
+        copies = BookCopy.objects.select_related('book')
+        if self.request.user.is_staff:
+            copies = copies.annotate(current_borrower=dashboard.current_borrower())
+        params = self.request.query_params
+        if params.get('book'):
+            copies = copies.filter(book_id=_id(params, 'book'))
+        if params.get('barcode'):
+            copies = copies.filter(barcode=params['barcode'])
+        if params.get('available'):
+            copies = copies.filter(is_available=_flag(params['available']))
+        return copies
+
+    @action(detail=True, methods=['post'],
+            permission_classes=[permissions.IsAdminUser])
+    def checkout(self, request, pk=None):
+        """Desk check-out of this copy to ``user`` (a user id)."""
+        book_copy = self.get_object()
+        options = BorrowSerializer(data=request.data)
+        options.is_valid(raise_exception=True)
+        borrower = _user_or_400(request.data.get('user'))
+        try:
+            record = services.borrow_copy(
+                book_copy, borrower, options.validated_data.get('rented_days'))
+        except services.CirculationError as e:
+            return _circulation_error(e)
+        return _loan_response(self, record, status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'], url_path='return',
+            permission_classes=[permissions.IsAuthenticated])
+    def return_copy(self, request, pk=None):
+        """Return the open loan of this copy (staff: whoever holds it)."""
+        book_copy = self.get_object()
+        try:
+            record = services.return_copy(
+                book_copy,
+                user=None if request.user.is_staff else request.user,
+                any_borrower=request.user.is_staff)
+        except services.CirculationError as e:
+            return _circulation_error(e)
+        return _loan_response(self, record)
+
+
+class BorrowRecordViewSet(CachedViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Loans with their current fee. Users see their own, staff see all and can
+    filter with ``?user=<id>``. ``?open=true`` keeps loans not yet returned,
+    ``?include_archived=true`` lists and retrieves the archived loans too.
+    """
+    serializer_class = BorrowRecordSerializer
+    cache_models = (BorrowRecord, BookCopy, Book, User)
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = LibraryCursorPagination
+
+    def cache_scope(self, request):
+        # Fees of open loans grow every day.
+        who = 'staff' if request.user.is_staff else f'user:{request.user.pk}'
+        return f'{who}:{timezone.now().date()}'
+
+    def get_queryset(self):
+        params = self.request.query_params
+        model = BorrowRecord
+        if (self.action in ('list', 'retrieve') and params.get('include_archived')
+                and _flag(params['include_archived'])):
+            # Archiving bumps the BorrowRecord version, so the cache keeps up.
+            model = LoanHistory
+        records = model.objects.with_fees().select_related(
+            'book_copy', 'book_copy__book', 'borrower')
+        if not self.request.user.is_staff:
+            records = records.filter(borrower=self.request.user)
+        elif params.get('user'):
+            records = records.filter(borrower_id=_id(params, 'user'))
+        if params.get('open'):
+            records = records.filter(returned_at__isnull=_flag(params['open']))
+        return records
+
+    @action(detail=True, methods=['post'], url_path='return')
+    def return_record(self, request, pk=None):
+        """Return this loan."""
+        record = self.get_object()
+        try:
+            record = services.return_record(
+                record,
+                user=None if request.user.is_staff else request.user,
+                any_borrower=request.user.is_staff)
+        except services.CirculationError as e:
+            return _circulation_error(e)
+        return _loan_response(self, record)
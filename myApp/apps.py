@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate, pre_migrate
 
 
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myApp'
+
+    def ready(self):
+        from . import signals
+        pre_migrate.connect(signals.remove_indexes, sender=self)
+        post_migrate.connect(signals.install_indexes, sender=self)
@@ -0,0 +1,107 @@
+"""
+Archive of returned loans.
+
+``BorrowRecord`` only keeps the open loans and the ones returned in the last
+``settings.LOAN_ARCHIVE_AFTER_DAYS`` days. ``archive`` moves older returned
+loans, oldest first and ``batch_size`` at a time, into
+``ArchivedBorrowRecord`` under the same id: every batch is one INSERT ...
+SELECT and one DELETE in a transaction, found through the partial
+``returned_loan_idx`` index. Loans never change once returned, so nothing
+is lost, and the circulation events keep pointing at the same ids.
+
+Reports read ``LoanHistory``, a ``UNION ALL`` view over both tables that
+``install`` (re)creates after ``migrate``: borrow counts and revenue come
+out the same before and after a loan is archived. The desk, the API and
+the fee jobs keep working on the small live table. A view blocks changes
+to the columns it reads, so ``uninstall`` drops it before ``migrate``.
+"""
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import stats_cache
+from .models import ArchivedBorrowRecord, BorrowRecord, LoanHistory
+
+
+COLUMNS = [
+    'id', 'book_copy_id', 'borrower_id', 'rented_days', 'borrowed_at',
+    'returned_at', 'total_fee', 'due_at', 'overdue_days', 'accrued_fee',
+    'fees_as_of',
+]
+
+
+def uninstall():
+    """Drop the ``LoanHistory`` view."""
+    view = connection.ops.quote_name(LoanHistory._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP VIEW IF EXISTS {view}')
+
+
+def install():
+    """(Re)create the ``LoanHistory`` view over the live and archived loans."""
+    uninstall()
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(column) for column in COLUMNS)
+    view = qn(LoanHistory._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIEW {view} AS '
+            f'SELECT {columns}, FALSE AS is_archived '
+            f'FROM {qn(BorrowRecord._meta.db_table)} '
+            'UNION ALL '
+            f'SELECT {columns}, TRUE AS is_archived '
+            f'FROM {qn(ArchivedBorrowRecord._meta.db_table)}'
+        )
+
+
+def cutoff(days=None, now=None):
+    """Loans returned before this moment (``days`` ago) are due for the archive."""
+    if days is None:
+        days = getattr(settings, 'LOAN_ARCHIVE_AFTER_DAYS', 365)
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def due(before):
+    """Returned loans older than ``before``, oldest return first."""
+    return BorrowRecord.objects.filter(
+        returned_at__lt=before,
+        # A copy still pointing at the loan (drift) keeps it live.
+        held_copy__isnull=True,
+    ).order_by('returned_at')
+
+
+def _move_sql(count):
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(column) for column in COLUMNS)
+    placeholders = ', '.join(['%s'] * count)
+    return (
+        f'INSERT INTO {qn(ArchivedBorrowRecord._meta.db_table)} ({columns}) '
+        f'SELECT {columns} FROM {qn(BorrowRecord._meta.db_table)} '
+        f'WHERE id IN ({placeholders})',
+        f'DELETE FROM {qn(BorrowRecord._meta.db_table)} WHERE id IN ({placeholders})',
+    )
+
+
+def archive(before=None, batch_size=5000, max_batches=None):
+    """
+    Move the returned loans older than ``before`` (default: ``cutoff()``)
+    to the archive, a batch per transaction. Returns the number moved.
+    """
+    before = before or cutoff()
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            ids = list(due(before).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            insert, delete = _move_sql(len(ids))
+            with connection.cursor() as cursor:
+                cursor.execute(insert, ids)
+                cursor.execute(delete, ids)
+            transaction.on_commit(partial(stats_cache.bump, BorrowRecord))
+        moved += len(ids)
+        batches += 1
+    return moved
@@ -0,0 +1,94 @@
+"""
+Async versions of the read-heavy views, for ASGI deployments.
+
+With ``settings.ASYNC_VIEWS`` on, ``urls`` routes the home page, the chart
+data, the barcode scan lookup and the authors API here instead of to their
+sync versions. Run them under uvicorn workers (see the README): a slow
+query then parks a coroutine instead of holding a whole worker. Under WSGI
+the sync versions are faster, since every async view would be run through
+``async_to_sync``.
+
+Queries go through the async ORM and the cache through its async API; both
+produce the same responses, ETags and cached payloads as the sync views.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.core.paginator import InvalidPage, Paginator
+from django.http import Http404, JsonResponse
+from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.views import View
+from django.views.decorators.http import condition, require_safe
+
+from . import scan, search, stats_cache
+from .api import caching
+from .models import Author, Book
+from .views import _chart_etag, _chart_last_modified, _chart_params
+
+
+class IndexTemplateView(View):
+    """``views.IndexTemplateView``: the catalogue or the ``?q=`` search results."""
+    template_name = "myApp/index.html"
+    paginate_by = 12
+
+    async def get(self, request):
+        q = request.GET.get('q', '').strip()
+        if q:
+            # The search looks up author matches (Postgres) or the FTS table
+            # (SQLite) before it returns the queryset.
+            books = await sync_to_async(search.search)(q)
+        else:
+            books = Book.objects.select_related('author').order_by('pk')
+
+        paginator = Paginator(books, self.paginate_by)
+        paginator.count = await books.acount()
+        try:
+            page = paginator.page(request.GET.get('page') or 1)
+        except InvalidPage:
+            raise Http404("Invalid page.")
+        page.object_list = [book async for book in page.object_list]
+
+        # Resolved here, so the templates never load the user synchronously.
+        request.user = await request.auser()
+        return render(request, self.template_name, {
+            'all_books': page.object_list,
+            'object_list': page.object_list,
+            'page_obj': page,
+            'paginator': paginator,
+            'is_paginated': paginator.num_pages > 1,
+            'q': q,
+        })
+
+
+@staff_member_required
+@login_required
+async def scan_barcode(request, barcode):
+    """Copy, book and open loan of a scanned barcode in one query."""
+    row = await scan.alookup(barcode)
+    if row is None:
+        return JsonResponse(
+            {"error": "There is no book with the code you entered."}, status=404)
+    return JsonResponse(scan.as_json(row))
+
+
+@condition(etag_func=_chart_etag, last_modified_func=_chart_last_modified)
+async def chart_data(request):
+    """Series for the dashboard charts, see ``views._chart_params`` for filters."""
+    try:
+        params = _chart_params(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    response = JsonResponse(await stats_cache.achart_series(**params))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_safe
+async def author_list(request):
+    """``api.views.AuthorAPIView``, sharing its ETags and cached payloads."""
+    async def build():
+        return [author async for author in Author.objects.values('id', 'name')]
+
+    return await caching.acached_json(request, (Author,), build)
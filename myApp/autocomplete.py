@@ -0,0 +1,145 @@
+"""
+Type-ahead suggestions for book titles, author names and usernames.
+
+``complete(kind, text)`` returns the best few ``(pk, label)`` pairs of one
+of the ``SOURCES``; the forms use it (through ``widgets``) instead of
+rendering every row of the table as an ``<option>``.
+
+On Postgres each label column has a pg_trgm GIN index on ``UPPER(column)``,
+created by ``install``. The same index serves both halves of the match: the
+``icontains`` Django writes as ``UPPER(column::text) LIKE UPPER(...)`` and
+the word-similarity operator ``%>``, which still finds a row when the text
+has a typo. Only the rows the index finds are ranked, by word similarity.
+
+Other backends (SQLite in development and tests) keep a prefix index per
+source in memory: the sorted ``(word, pk)`` pairs of every word of every
+label, searched with ``bisect``. It is rebuilt when the model's data
+version moves (see ``stats_cache``), so a warm lookup costs one cache read.
+"""
+import re
+from bisect import bisect_left, bisect_right
+from heapq import nsmallest
+
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.lookups import TrigramWordSimilar
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Length, Upper
+
+from . import stats_cache
+from .models import Author, Book
+
+
+SOURCES = {
+    'books': (Book, 'title'),
+    'authors': (Author, 'name'),
+    'users': (get_user_model(), get_user_model().USERNAME_FIELD),
+}
+MAX_LIMIT = 50
+
+
+def _trigram_index(model, field):
+    return GinIndex(OpClass(Upper(field), name='gin_trgm_ops'),
+                    name=f'{model._meta.model_name}_{field}_trgm')
+
+
+def install():
+    """Create pg_trgm and the trigram indexes if they are missing (Postgres only)."""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with connection.schema_editor() as editor, connection.cursor() as cursor:
+        for model, field in SOURCES.values():
+            index = _trigram_index(model, field)
+            existing = connection.introspection.get_constraints(
+                cursor, model._meta.db_table)
+            if index.name not in existing:
+                editor.add_index(model, index)
+
+
+def _words(text):
+    return re.findall(r'\w+', text.casefold())
+
+
+class PrefixIndex:
+    """Every word of every label of a source, sorted for prefix lookups."""
+
+    def __init__(self, rows):
+        self.labels = dict(rows)
+        pairs = sorted(
+            (word, pk) for pk, label in self.labels.items() for word in _words(label))
+        self.words = [word for word, pk in pairs]
+        self.pks = [pk for word, pk in pairs]
+
+    def _prefixed(self, prefix):
+        start = bisect_left(self.words, prefix)
+        end = bisect_right(self.words, prefix + '\U0010ffff', start)
+        return set(self.pks[start:end])
+
+    def search(self, text, limit):
+        """
+        Labels with a word starting with each word of ``text``; those that
+        start with ``text`` come first, then the shorter ones.
+        """
+        words = _words(text)
+        if not words:
+            return []
+        matches = None
+        for word in sorted(words, key=len, reverse=True):
+            found = self._prefixed(word)
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        text = text.strip().casefold()
+        best = nsmallest(limit, matches, key=lambda pk: (
+            not self.labels[pk].casefold().startswith(text),
+            len(self.labels[pk]), self.labels[pk].casefold(), pk))
+        return [(pk, self.labels[pk]) for pk in best]
+
+
+_prefix_indexes = {}
+
+
+def prefix_index(kind):
+    """The in-memory index of ``kind``, rebuilt when its model has changed."""
+    model, field = SOURCES[kind]
+    [version] = stats_cache.get_versions(model)
+    key = (connection.settings_dict['NAME'], kind)
+    cached = _prefix_indexes.get(key)
+    if cached is None or cached[0] != version:
+        index = PrefixIndex(model._default_manager.values_list('pk', field).iterator())
+        cached = _prefix_indexes[key] = (version, index)
+    return cached[1]
+
+
+def complete(kind, text, limit=10):
+    """Up to ``limit`` ``(pk, label)`` pairs of ``kind`` matching ``text``, best first."""
+    model, field = SOURCES[kind]
+    text = text.strip()
+    limit = max(1, min(limit, MAX_LIMIT))
+    if not text:
+        return []
+
+    if connection.vendor == 'postgresql':
+        column = Upper(field)
+        matches = model._default_manager.filter(
+            Q(**{f'{field}__icontains': text})
+            | Q(TrigramWordSimilar(column, text.upper()))
+        ).annotate(
+            similarity=TrigramWordSimilarity(text.upper(), column),
+        ).order_by('-similarity', Length(field), 'pk')
+        return list(matches.values_list('pk', field)[:limit])
+
+    return prefix_index(kind).search(text, limit)
+
+
+def label(kind, pk):
+    """The label of one row of ``kind``, or ``''`` when there is no such row."""
+    model, field = SOURCES[kind]
+    try:
+        return model._default_manager.filter(pk=pk).values_list(field, flat=True).first() or ''
+    except (TypeError, ValueError):
+        return ''
@@ -0,0 +1,85 @@
+"""
+Barcode formatting and rendering.
+
+Nothing here touches the database or models, so the rendering functions
+can run in freshly spawned worker processes. ``cached_image`` memoizes
+rendered images in the ``barcodes`` cache (a directory by default): a
+barcode always renders the same, so entries never expire.
+"""
+from functools import partial
+from io import BytesIO
+
+import barcode
+from barcode.writer import ImageWriter, SVGWriter
+from django.core.cache import caches
+
+
+# Allocated barcodes are 13 digits in the "2" (in-store use) range. The
+# random codes generated before had 12 digits, so the two never collide.
+PREFIX = '2'
+DIGITS = 12
+
+
+def format_barcode(number):
+    return f'{PREFIX}{number:0{DIGITS}d}'
+
+
+# Library cards count in their own sequence behind a letter, so a card
+# scanned into the book field can never match a copy.
+CARD_PREFIX = 'P'
+
+
+def format_card(number):
+    return f'{CARD_PREFIX}{number:0{DIGITS}d}'
+
+
+WRITERS = {'png': ImageWriter, 'svg': SVGWriter}
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+
+def render(code, fmt='svg'):
+    """Code128 image of ``code`` in ``fmt`` (``svg`` or ``png``) as bytes."""
+    BarcodeClass = barcode.get_barcode_class('code128')
+    buffer = BytesIO()
+    BarcodeClass(code, writer=WRITERS[fmt]()).write(buffer)
+    return buffer.getvalue()
+
+
+render_png = partial(render, fmt='png')
+
+
+def get_cached(code, fmt='svg'):
+    """The cached image of ``code``, or None if it was never rendered."""
+    return caches['barcodes'].get(f'barcode:{fmt}:{code}')
+
+
+def cache_image(code, fmt, image):
+    caches['barcodes'].set(f'barcode:{fmt}:{code}', image, timeout=None)
+
+
+def cached_image(code, fmt='svg'):
+    """``render(code, fmt)``, rendered once and then read from the cache."""
+    image = get_cached(code, fmt)
+    if image is None:
+        image = render(code, fmt)
+        cache_image(code, fmt, image)
+    return image
+
+
+def render_many(codes, workers=None, chunksize=64, fmt='png'):
+    """
+    ``(code, image)`` pairs for ``codes``, rendered in a process pool when
+    there are enough of them to pay for starting it.
+    """
+    codes = list(codes)
+    func = partial(render, fmt=fmt)
+    if workers == 1 or len(codes) < 2 * chunksize:
+        return [(code, func(code)) for code in codes]
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(zip(codes, pool.map(func, codes, chunksize=chunksize)))
@@ -0,0 +1,180 @@
+"""
+Streaming import and export of the catalogue.
+
+A catalogue file has one book per row with the columns ``title``,
+``author``, ``daily_rent`` (optional) and ``copies`` (optional, copies to
+create), as CSV with a header row or as JSON lines. Rows are read and
+written in batches, so memory stays flat whatever the size of the file:
+
+* authors are resolved through a name -> id map that is filled one batch
+  at a time, missing ones are created with ``bulk_create``;
+* titles are deduplicated case-insensitively, inside the batch and against
+  the database with one query per batch (books already there are skipped);
+* books are written with ``bulk_create`` and their copies go through
+  ``intake.create_copies``.
+"""
+import csv
+import json
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from functools import partial
+from itertools import islice
+
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from . import intake, stats_cache
+from .models import Author, Book, BookCopy
+
+
+FIELDS = ['title', 'author', 'daily_rent', 'copies']
+FORMATS = ('csv', 'jsonl')
+
+
+class CatalogueError(ValueError):
+    """A catalogue row that cannot be imported."""
+
+
+def guess_format(name, default='csv'):
+    name = str(name).lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream, fmt='csv'):
+    """Yield the rows of a text ``stream`` as dicts."""
+    if fmt == 'csv':
+        try:
+            yield from csv.DictReader(stream)
+        except csv.Error as e:
+            raise CatalogueError(f"Bad CSV: {e}")
+    elif fmt == 'jsonl':
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise CatalogueError(f"Unknown format {fmt!r}.")
+
+
+def _clean(row, line):
+    title = str(row.get('title') or '').strip()
+    author = str(row.get('author') or '').strip()
+    if not title or not author:
+        raise CatalogueError(f"Row {line}: title and author are required.")
+    try:
+        daily_rent = Decimal(str(row.get('daily_rent') or 1))
+        copies = int(row.get('copies') or 0)
+    except (InvalidOperation, ValueError):
+        raise CatalogueError(f"Row {line}: daily_rent or copies is not a number.")
+    if not 0 <= daily_rent < 100 or copies < 0:
+        raise CatalogueError(f"Row {line}: daily_rent or copies is out of range.")
+    return title[:264], author[:264], daily_rent, copies
+
+
+class Importer:
+    """Import rows in batches; counts what happened in ``stats``."""
+
+    def __init__(self, batch_size=2000):
+        self.batch_size = batch_size
+        self.authors = {}
+        self.stats = Counter()
+
+    def run(self, rows):
+        rows = iter(rows)
+        line = 1
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return self.stats
+            cleaned = []
+            for row in batch:
+                line += 1
+                cleaned.append(_clean(row, line))
+            with transaction.atomic():
+                self._import_batch(cleaned)
+
+    def _resolve_authors(self, names):
+        missing = {name for name in names if name not in self.authors}
+        if not missing:
+            return
+        self.authors.update(
+            Author.objects.filter(name__in=missing).values_list('name', 'pk'))
+        new = [Author(name=name) for name in missing if name not in self.authors]
+        Author.objects.bulk_create(new, batch_size=self.batch_size)
+        self.authors.update((author.name, author.pk) for author in new)
+        self.stats['authors'] += len(new)
+
+    def _import_batch(self, cleaned):
+        existing = set(
+            Book.objects.annotate(lower_title=Lower('title'))
+            .filter(lower_title__in={title.lower() for title, *rest in cleaned})
+            .values_list('lower_title', flat=True)
+        )
+        rows = []
+        for title, author, daily_rent, copies in cleaned:
+            key = title.lower()
+            if key in existing:
+                self.stats['skipped'] += 1
+                continue
+            existing.add(key)
+            rows.append((title, author, daily_rent, copies))
+        if not rows:
+            return
+
+        self._resolve_authors({author for title, author, *rest in rows})
+        books = Book.objects.bulk_create(
+            [Book(title=title, author_id=self.authors[author], daily_rent=daily_rent)
+             for title, author, daily_rent, copies in rows],
+            batch_size=self.batch_size)
+        # bulk_create skips Book.save and the signals.
+        Author.adjust_many(Counter(book.author_id for book in books))
+        transaction.on_commit(stats_cache.invalidate)
+        transaction.on_commit(partial(stats_cache.bump, Book, Author))
+
+        copies = [
+            BookCopy(book=book)
+            for book, (title, author, daily_rent, count) in zip(books, rows)
+            for _ in range(count)
+        ]
+        if copies:
+            intake.create_copies(copies, batch_size=self.batch_size)
+        self.stats['books'] += len(books)
+        self.stats['copies'] += len(copies)
+
+
+def import_rows(rows, batch_size=2000):
+    """Import catalogue rows (dicts), see the module docstring."""
+    return Importer(batch_size).run(rows)
+
+
+def export_rows(queryset=None, chunk_size=2000):
+    """Yield catalogue rows of ``queryset`` (all books) in import format."""
+    if queryset is None:
+        queryset = Book.objects.all()
+    rows = queryset.order_by('pk').values_list(
+        'title', 'author__name', 'daily_rent', 'total_copies')
+    for title, author, daily_rent, copies in rows.iterator(chunk_size=chunk_size):
+        yield {'title': title, 'author': author,
+               'daily_rent': str(daily_rent), 'copies': copies}
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def export_lines(rows, fmt='csv'):
+    """Yield the lines of a catalogue file for ``rows``."""
+    if fmt == 'csv':
+        writer = csv.DictWriter(_Echo(), fieldnames=FIELDS)
+        yield writer.writeheader()
+        for row in rows:
+            yield writer.writerow(row)
+    elif fmt == 'jsonl':
+        for row in rows:
+            yield json.dumps(row) + '\n'
+    else:
+        raise CatalogueError(f"Unknown format {fmt!r}.")
@@ -0,0 +1,188 @@
+"""
+Server-side SVG versions of the dashboard charts.
+
+The report embeds these instead of PNGs exported by Chart.js in the
+browser, so a report needs no client at all. Rendered charts are cached
+per statistics data version (see ``stats_cache``).
+"""
+import math
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils.html import escape
+
+from . import stats_cache
+
+
+COLORS = [
+    (255, 99, 132),   # soft red
+    (54, 162, 235),   # soft blue
+    (255, 206, 86),   # light yellow
+    (255, 159, 243),  # soft pink
+    (153, 102, 255),  # light purple
+    (75, 192, 192),   # mint green / teal
+    (255, 215, 0),    # gold
+]
+
+# Same order, types and titles as the Chart.js configs on the dashboard.
+CHARTS = [
+    ("chart1", "bar", "Number of copies for each book"),
+    ("chart2", "bar", "Number of copies for each Author"),
+    ("chart3", "bar", "Number of books for each Author"),
+    ("chart4", "bar", "Daily rent of each book"),
+    ("chart5", "line", "Number of times each book borrowed"),
+    ("chart6", "pie", "Number of unavailable(borrowed) books now"),
+    ("chart7", "bar", "Revenue for each book"),
+    ("chart8", "bar", "Revenue for each User"),
+]
+
+WIDTH = 600
+HEIGHT = 340
+MARGIN = {'top': 40, 'right': 20, 'bottom': 90, 'left': 50}
+
+
+def _fill(index, opacity=0.6):
+    r, g, b = COLORS[index % len(COLORS)]
+    return f'fill="rgb({r},{g},{b})" fill-opacity="{opacity}"'
+
+
+def _number(value):
+    if isinstance(value, (int, float, Decimal)):
+        return float(value)
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _svg(title, body):
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {WIDTH} {HEIGHT}" '
+        f'width="{WIDTH}" height="{HEIGHT}" font-family="sans-serif" font-size="10">'
+        f'<text x="{WIDTH / 2}" y="20" text-anchor="middle" font-size="14" '
+        f'font-weight="bold">{escape(title)}</text>{body}</svg>'
+    )
+
+
+def _nice_max(value):
+    """Round the top of the value axis up to 1, 2 or 5 times a power of 10."""
+    if value <= 0:
+        return 1
+    magnitude = 10 ** math.floor(math.log10(value))
+    for step in (1, 2, 5, 10):
+        if value <= step * magnitude:
+            return step * magnitude
+    return 10 * magnitude
+
+
+def _axes(labels, top):
+    """Grid, value axis and rotated category labels shared by bar/line."""
+    plot_w = WIDTH - MARGIN['left'] - MARGIN['right']
+    plot_h = HEIGHT - MARGIN['top'] - MARGIN['bottom']
+    bottom = MARGIN['top'] + plot_h
+    parts = []
+    for i in range(5):
+        value = top * i / 4
+        y = bottom - plot_h * i / 4
+        parts.append(
+            f'<line x1="{MARGIN["left"]}" y1="{y:.1f}" x2="{WIDTH - MARGIN["right"]}" '
+            f'y2="{y:.1f}" stroke="#ddd"/>'
+            f'<text x="{MARGIN["left"] - 5}" y="{y + 3:.1f}" text-anchor="end">'
+            f'{value:g}</text>'
+        )
+    step = plot_w / max(len(labels), 1)
+    for i, label in enumerate(labels):
+        x = MARGIN['left'] + step * (i + 0.5)
+        parts.append(
+            f'<text x="{x:.1f}" y="{bottom + 10}" text-anchor="end" '
+            f'transform="rotate(-45 {x:.1f} {bottom + 10})">'
+            f'{escape(str(label)[:24])}</text>'
+        )
+    return ''.join(parts), plot_w, plot_h, bottom, step
+
+
+def bar_chart(title, labels, values):
+    values = [_number(v) for v in values]
+    top = _nice_max(max(values, default=0))
+    axes, plot_w, plot_h, bottom, step = _axes(labels, top)
+    bars = []
+    for i, value in enumerate(values):
+        height = plot_h * value / top
+        x = MARGIN['left'] + step * i + step * 0.1
+        bars.append(
+            f'<rect x="{x:.1f}" y="{bottom - height:.1f}" width="{step * 0.8:.1f}" '
+            f'height="{height:.1f}" {_fill(i)}/>'
+        )
+    return _svg(title, axes + ''.join(bars))
+
+
+def line_chart(title, labels, values):
+    values = [_number(v) for v in values]
+    top = _nice_max(max(values, default=0))
+    axes, plot_w, plot_h, bottom, step = _axes(labels, top)
+    points = ' '.join(
+        f'{MARGIN["left"] + step * (i + 0.5):.1f},{bottom - plot_h * value / top:.1f}'
+        for i, value in enumerate(values)
+    )
+    line = (f'<polyline points="{points}" fill="none" stroke="rgb(54,162,235)" '
+            f'stroke-width="2"/>') if values else ''
+    return _svg(title, axes + line)
+
+
+def pie_chart(title, labels, values):
+    values = [_number(v) for v in values]
+    total = sum(values)
+    cx, cy, radius = WIDTH / 3, HEIGHT / 2 + 10, 120
+    parts = []
+    if total <= 0:
+        parts.append(f'<circle cx="{cx}" cy="{cy}" r="{radius}" fill="#eee"/>')
+    angle = -math.pi / 2
+    shown = [(label, value) for label, value in zip(labels, values) if value > 0]
+    for i, (label, value) in enumerate(shown):
+        sweep = 2 * math.pi * value / total
+        if sweep >= 2 * math.pi - 1e-9:
+            parts.append(f'<circle cx="{cx}" cy="{cy}" r="{radius}" {_fill(i)}/>')
+        else:
+            x1, y1 = cx + radius * math.cos(angle), cy + radius * math.sin(angle)
+            x2 = cx + radius * math.cos(angle + sweep)
+            y2 = cy + radius * math.sin(angle + sweep)
+            large = 1 if sweep > math.pi else 0
+            parts.append(
+                f'<path d="M{cx:.1f},{cy:.1f} L{x1:.1f},{y1:.1f} '
+                f'A{radius},{radius} 0 {large} 1 {x2:.1f},{y2:.1f} Z" '
+                f'{_fill(i)} stroke="#fff"/>'
+            )
+        angle += sweep
+    for i, (label, value) in enumerate(shown[:20]):
+        y = 50 + i * 14
+        parts.append(
+            f'<rect x="{WIDTH * 2 / 3 - 10}" y="{y - 8}" width="10" height="10" {_fill(i)}/>'
+            f'<text x="{WIDTH * 2 / 3 + 5}" y="{y}">{escape(str(label)[:30])} ({value:g})</text>'
+        )
+    return _svg(title, ''.join(parts))
+
+
+RENDERERS = {'bar': bar_chart, 'line': line_chart, 'pie': pie_chart}
+
+
+def render_charts(series):
+    """SVG markup of the eight charts for a ``chart_series`` payload."""
+    return {
+        key: RENDERERS[kind](title, series[key]['labels'], series[key]['values'])
+        for key, kind, title in CHARTS
+    }
+
+
+def report_charts(top=None):
+    """
+    The report charts of the current data version, limited to the ``top``
+    (``settings.REPORT_CHART_TOP``) biggest rows so they stay readable.
+    """
+    top = top or getattr(settings, 'REPORT_CHART_TOP', 20)
+    cache = stats_cache.get_cache()
+    key = f'stats:svg:{stats_cache.current_version()}:{top}'
+    rendered = cache.get(key)
+    if rendered is None:
+        rendered = render_charts(stats_cache.chart_series(top=top))
+        cache.set(key, rendered, timeout=stats_cache.cache_timeout())
+    return rendered
@@ -0,0 +1,80 @@
+"""
+Querysets behind the inventory dashboard tables.
+
+Both tables are filtered, sorted and paginated in the database. Every
+column a row shows is selected or annotated up front, so rendering a row
+never runs a query.
+"""
+from django.core.paginator import Paginator
+from django.db.models import F, Q
+
+from .models import Book, BookCopy
+
+
+DEFAULT_PER_PAGE = 25
+MAX_PER_PAGE = 200
+
+BOOK_SORTS = {
+    'id': 'pk',
+    'title': 'title',
+    'author': 'author__name',
+    'rent': 'daily_rent',
+    'stock': 'available_copies',
+    'copies': 'total_copies',
+}
+
+COPY_SORTS = {
+    'id': 'pk',
+    'title': 'book__title',
+    'barcode': 'barcode',
+    'status': 'is_available',
+}
+
+
+def _ordering(sorts, value, default='id'):
+    """Translate ``title`` / ``-title`` into a whitelisted order_by field."""
+    value = value or default
+    descending = value.startswith('-')
+    field = sorts.get(value.lstrip('-'), sorts[default])
+    return (f'-{field}' if descending else field), 'pk'
+
+
+def book_queryset(params):
+    books = Book.objects.select_related('author')
+    q = params.get('q', '').strip()
+    if q:
+        books = books.filter(Q(title__icontains=q) | Q(author__name__icontains=q))
+    if params.get('low_stock'):
+        books = books.filter(available_copies__lte=1)
+    return books.order_by(*_ordering(BOOK_SORTS, params.get('books_sort')))
+
+
+def current_borrower():
+    """Username of the open loan of a copy row, through ``current_loan``."""
+    return F('current_loan__borrower__username')
+
+
+def copy_queryset(params):
+    copies = BookCopy.objects.select_related('book').annotate(
+        current_borrower=current_borrower())
+    q = params.get('copy_q', '').strip()
+    if q:
+        copies = copies.filter(Q(barcode__icontains=q) | Q(book__title__icontains=q))
+    status = params.get('status')
+    if status == 'available':
+        copies = copies.filter(is_available=True)
+    elif status == 'borrowed':
+        copies = copies.filter(is_available=False)
+    return copies.order_by(*_ordering(COPY_SORTS, params.get('copies_sort')))
+
+
+def per_page(params):
+    try:
+        value = int(params.get('per_page') or DEFAULT_PER_PAGE)
+    except ValueError:
+        value = DEFAULT_PER_PAGE
+    return max(1, min(value, MAX_PER_PAGE))
+
+
+def paginate(queryset, params, page_param):
+    return Paginator(queryset, per_page(params)).get_page(params.get(page_param))
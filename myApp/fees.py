@@ -0,0 +1,90 @@
+"""
+Materialized overdue days and fees of the loans.
+
+Every loan stores when it is due (``due_at``, set by ``BorrowRecord.save``)
+and, as of the day in ``fees_as_of``, the days it is overdue and the fee it
+has accrued. ``materialize`` brings those up to date with set-based UPDATEs
+and only touches the loans whose numbers can have moved since it last ran:
+
+* open loans that were never materialized (new, or given a new due date);
+* open loans that are overdue and were not materialized today yet, since
+  every day adds to their fee.
+
+Open loans that are not due yet and already materialized are left alone,
+and both kinds are found through partial indexes on the open loans, so a
+run costs as much as the loans that changed. Returned loans get their final
+numbers from ``services.return_record``.
+
+Days are whole UTC days, counted like ``BorrowRecordQuerySet.with_fees``.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from functools import partial
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import stats_cache
+from .models import BookCopy, BorrowRecord, EpochDays, epoch_days
+
+
+def backfill_due_dates(batch_size=1000):
+    """
+    Fill in ``due_at`` (and the final numbers of returned loans) on records
+    saved before it existed or inserted with ``bulk_create``.
+    """
+    filled = 0
+    while True:
+        batch = list(
+            BorrowRecord.objects.filter(due_at__isnull=True)
+            .select_related('book_copy__book').order_by('pk')[:batch_size])
+        if not batch:
+            return filled
+        for record in batch:
+            record.due_at = record.borrowed_at + timedelta(days=record.rented_days)
+            record.fees_as_of = None
+            if record.returned_at:
+                fees = record.get_total_debt_till_now()
+                record.overdue_days = fees['overdue_days']
+                record.accrued_fee = record.total_fee
+                record.fees_as_of = record.returned_at.date()
+        BorrowRecord.objects.bulk_update(
+            batch, ['due_at', 'overdue_days', 'accrued_fee', 'fees_as_of'])
+        filled += len(batch)
+
+
+def stale(today):
+    """Open loans whose materialized numbers are out of date on ``today``."""
+    midnight = datetime.combine(today, time.min, tzinfo=dt_timezone.utc)
+    return BorrowRecord.objects.filter(returned_at__isnull=True).filter(
+        Q(fees_as_of__isnull=True) | Q(due_at__lt=midnight, fees_as_of__lt=today))
+
+
+def materialize(today=None, batch_size=1000):
+    """
+    Bring the overdue days and accrued fees of the stale open loans up to
+    ``today``, one UPDATE per ``batch_size`` loans. Returns how many changed.
+    """
+    today = today or timezone.now().date()
+    money = DecimalField(max_digits=8, decimal_places=2)
+    daily_rent = Subquery(
+        BookCopy.objects.filter(pk=OuterRef('book_copy_id')).values('book__daily_rent')[:1],
+        output_field=money)
+    overdue_days = Greatest(
+        Value(epoch_days(today)) - EpochDays('due_at'), Value(0))
+    updated = 0
+    while True:
+        with transaction.atomic():
+            ids = list(stale(today).order_by().values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            updated += BorrowRecord.objects.filter(pk__in=ids).update(
+                overdue_days=overdue_days,
+                accrued_fee=ExpressionWrapper(
+                    daily_rent * (F('rented_days') + overdue_days * 2), output_field=money),
+                fees_as_of=today,
+            )
+    if updated:
+        transaction.on_commit(partial(stats_cache.bump, BorrowRecord))
+    return updated
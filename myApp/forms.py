@@ -2,7 +2,8 @@ from django import forms
 from django.forms import modelformset_factory, BaseFormSet, ValidationError
 from django.contrib.auth import get_user_model
 
-from .models import Book, Author, BookCopy, BorrowRecord
+from .models import Book, Author, BookCopy, BorrowRecord, LibraryCard
+from .widgets import AutocompleteWidget
 
 
 SELECT_CHOICES = [
@@ -29,11 +30,19 @@ class BorrowAndReturnForm(forms.Form):
         )
     )
     select = forms.ChoiceField(choices=SELECT_CHOICES, label='Action')
+    card = forms.CharField(
+        max_length=32,
+        required=False,
+        label='Library card',
+        widget=forms.TextInput(
+            attrs={'placeholder': 'Scan the borrower\'s card'}
+        )
+    )
     user = forms.ModelChoiceField(
         queryset=get_user_model().objects.all(),
         required=False,
         label="Borrower (only for borrow)",
-        widget=forms.Select(attrs={'class': 'form-control'})
+        widget=AutocompleteWidget('users', attrs={'placeholder': 'Or search by username'})
     )
     rented_days = forms.IntegerField(
         min_value=1,
@@ -44,18 +53,28 @@ class BorrowAndReturnForm(forms.Form):
         )
     )
 
+    def clean(self):
+        """A scanned card names the borrower, in one primary-key lookup."""
+        cleaned_data = super().clean()
+        number = cleaned_data.get('card', '').strip()
+        if number:
+            card = LibraryCard.objects.select_related('user').filter(
+                pk=number, is_active=True).first()
+            if card is None:
+                self.add_error('card', 'This library card is unknown or cancelled.')
+            elif cleaned_data.get('user') not in (None, card.user):
+                self.add_error('card', 'This card belongs to another patron.')
+            else:
+                cleaned_data['user'] = card.user
+        return cleaned_data
+
 
 class BookForm(forms.ModelForm):
 
     class Meta:
         model = Book
         fields = ['title', 'author', 'image', 'daily_rent']
-
-    def clean_title(self):
-        title = self.cleaned_data.get('title')
-        if Book.objects.filter(title__iexact=title).exists():
-            raise forms.ValidationError('We already have this book.')
-        return title
+        widgets = {'author': AutocompleteWidget('authors')}
 
     def clean_daily_rent(self):
         daily_rent = self.cleaned_data.get('daily_rent')
@@ -68,6 +87,7 @@ class BookCopyForm(forms.ModelForm):
     class Meta:
         model = BookCopy
         fields = ['book', 'barcode', 'barcode_image']
+        widgets = {'book': AutocompleteWidget('books')}
 
 
 BookCopyFormSet = modelformset_factory(
@@ -84,3 +104,11 @@ class AuthorForm(forms.ModelForm):
         model = Author
         fields = ['name']
 
+
+class CatalogueImportForm(forms.Form):
+    """Upload of a catalogue file, see ``myApp.catalogue``."""
+    file = forms.FileField(label='Catalogue file')
+    format = forms.ChoiceField(
+        choices=[('', 'Guess from the file name'), ('csv', 'CSV'), ('jsonl', 'JSON lines')],
+        required=False
+    )
@@ -0,0 +1,79 @@
+"""
+Bulk intake of book copies.
+
+Receiving a shipment goes through ``create_copies`` instead of saving the
+copies one by one: barcodes come from a single ``BarcodeSequence`` block,
+rows are inserted with ``bulk_create``, the book counters are adjusted
+with one UPDATE per distinct count and the stock changes are logged with
+one INSERT. Barcode images are served on demand,
+but ``attach_images`` can still store PNGs, rendered in a process pool,
+for copies that need a file (``render_images=True``).
+"""
+from collections import Counter
+from functools import partial
+
+from django.db import transaction
+
+from . import barcodes, stats_cache
+from .models import BarcodeSequence, Book, BookCopy, CirculationEvent
+
+
+def assign_barcodes(copies):
+    """Give every copy without a barcode one from a freshly reserved block."""
+    missing = [copy for copy in copies if not copy.barcode]
+    if missing:
+        block = BarcodeSequence.allocate(len(missing))
+        for copy, number in zip(missing, block):
+            copy.barcode = barcodes.format_barcode(number)
+    return copies
+
+
+def create_copies(copies, render_images=False, workers=None, batch_size=1000):
+    """
+    Insert unsaved ``copies`` in bulk and return them with their pks.
+
+    ``bulk_create`` skips ``BookCopy.save`` and the signals, so the counters
+    and the statistics cache are taken care of here.
+    """
+    copies = assign_barcodes(list(copies))
+    with transaction.atomic():
+        BookCopy.objects.bulk_create(copies, batch_size=batch_size)
+        totals, available = Counter(), Counter()
+        for copy in copies:
+            totals[copy.book_id] += 1
+            available[copy.book_id] += int(copy.is_available)
+            copy._loaded_state = (copy.book_id, copy.is_available)
+        Book.adjust_many({
+            book_id: (total, available[book_id])
+            for book_id, total in totals.items()
+        })
+        CirculationEvent.stock(copies, 1)
+        transaction.on_commit(stats_cache.invalidate)
+        transaction.on_commit(partial(stats_cache.bump, BookCopy, Book))
+    if render_images:
+        attach_images(copies, workers=workers, batch_size=batch_size)
+    return copies
+
+
+def attach_images(copies, workers=None, batch_size=1000):
+    """Render the missing barcode images in parallel and store them."""
+    pending = [copy for copy in copies if copy.barcode and not copy.barcode_image]
+    rendered = barcodes.render_many(
+        [copy.barcode for copy in pending], workers=workers)
+    for copy, (code, png) in zip(pending, rendered):
+        copy.create_and_assign_barcode(png)
+    BookCopy.objects.bulk_update(pending, ['barcode_image'], batch_size=batch_size)
+    return pending
+
+
+def intake(book_counts, **kwargs):
+    """
+    Create ``count`` available copies for each ``(book_id, count)`` pair.
+    Extra keyword arguments go to ``create_copies``.
+    """
+    copies = [
+        BookCopy(book_id=book_id)
+        for book_id, count in book_counts
+        for _ in range(count)
+    ]
+    return create_copies(copies, **kwargs)
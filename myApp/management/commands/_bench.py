@@ -0,0 +1,182 @@
+"""
+Helpers shared by the benchmark commands.
+
+Benchmarks seed a lot of rows, so by default they run against a throwaway
+test database created the same way ``manage.py test`` does it.
+"""
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, connections, reset_queries
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from myApp import events, rollups
+from myApp.models import Author, Book, BookCopy, BorrowRecord
+
+
+def add_database_arguments(parser):
+    parser.add_argument(
+        '--use-current-db',
+        action='store_true',
+        help="Run against the configured database instead of a scratch "
+             "test database. Seeded rows are left behind."
+    )
+    parser.add_argument(
+        '--keepdb',
+        action='store_true',
+        help="Keep the scratch test database between runs."
+    )
+
+
+@contextmanager
+def scratch_database(options, verbosity=0):
+    """Swap the default connection to a test database for the block."""
+    if options.get('use_current_db'):
+        yield
+        return
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+        # An in-memory database serializes threads on table locks, a file
+        # waits on them like a real server would.
+        test_settings['NAME'] = os.path.join(
+            tempfile.gettempdir(), 'library_bench.sqlite3')
+    connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, keepdb=options.get('keepdb'))
+    try:
+        yield
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(
+            old_name, verbosity=verbosity, keepdb=options.get('keepdb'))
+
+
+@contextmanager
+def measure():
+    """Collect wall time and query count of the block into a dict."""
+    result = {}
+    reset_queries()
+    with CaptureQueriesContext(connection) as ctx:
+        start = time.perf_counter()
+        yield result
+        result['seconds'] = time.perf_counter() - start
+    result['queries'] = len(ctx.captured_queries)
+
+
+def percentiles(samples):
+    """p50/p95/p99/max of a list of durations in seconds, as milliseconds."""
+    if not samples:
+        return {'p50': 0, 'p95': 0, 'p99': 0, 'max': 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        'p50': statistics.median(ordered) * 1000,
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'max': ordered[-1] * 1000,
+    }
+
+
+def format_row(label, result):
+    return (f"{label:<28} {result['seconds'] * 1000:>10.1f} ms "
+            f"{result['queries']:>8} queries")
+
+
+@contextmanager
+def manual_timestamps(model, *field_names):
+    """Let seeding code set ``auto_now_add`` fields itself."""
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, saved):
+            field.auto_now_add = value
+
+
+def seed_catalogue(books=1000, copies_per_book=3, users=200, records=10000,
+                   days=365, batch_size=5000, stdout=None):
+    """
+    Bulk insert a synthetic catalogue with a loan history spread over the
+    last ``days`` days. About one copy in ten is left on loan.
+    """
+    rng = random.Random(42)
+    User = get_user_model()
+
+    def log(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    authors = Author.objects.bulk_create(
+        [Author(name=f'Author {i}') for i in range(max(1, books // 10))],
+        batch_size=batch_size)
+    book_objs = Book.objects.bulk_create(
+        [Book(title=f'Book {i}', author=authors[i % len(authors)],
+              daily_rent=1 + i % 5)
+         for i in range(books)],
+        batch_size=batch_size)
+    log(f"seeded {len(authors)} authors and {len(book_objs)} books")
+
+    copies = BookCopy.objects.bulk_create(
+        [BookCopy(book=book, barcode=f'{book.pk:08d}{n:04d}')
+         for book in book_objs for n in range(copies_per_book)],
+        batch_size=batch_size)
+    user_objs = User.objects.bulk_create(
+        [User(username=f'patron{i}') for i in range(users)],
+        batch_size=batch_size)
+    log(f"seeded {len(copies)} copies and {len(user_objs)} users")
+
+    now = timezone.now()
+    open_copies = set(rng.sample(range(len(copies)), len(copies) // 10))
+    opened = []
+    with manual_timestamps(BorrowRecord, 'borrowed_at'):
+        batch = []
+        for i in range(records):
+            copy_index = i % len(copies)
+            book_copy = copies[copy_index]
+            rented_days = rng.randint(1, 14)
+            borrowed_at = now - timedelta(
+                days=rng.uniform(0, days), microseconds=i)
+            is_open = i >= records - len(copies) and copy_index in open_copies
+            if is_open:
+                opened.append(book_copy.pk)
+            returned_at = None if is_open else min(now, borrowed_at + timedelta(
+                days=rng.uniform(0, rented_days + 5)))
+            batch.append(BorrowRecord(
+                book_copy=book_copy,
+                borrower=user_objs[rng.randrange(len(user_objs))],
+                rented_days=rented_days,
+                borrowed_at=borrowed_at,
+                due_at=borrowed_at + timedelta(days=rented_days),
+                returned_at=returned_at,
+                total_fee=0 if is_open else rented_days * (1 + book_copy.book_id % 5),
+            ))
+            if len(batch) >= batch_size:
+                BorrowRecord.objects.bulk_create(batch)
+                batch = []
+                if (i + 1) % (batch_size * 20) == 0:
+                    log(f"seeded {i + 1} borrow records")
+        BorrowRecord.objects.bulk_create(batch)
+    for start in range(0, len(opened), batch_size):
+        BookCopy.objects.filter(
+            pk__in=opened[start:start + batch_size]
+        ).update(is_available=False)
+    call_command('rebuild_counters', stdout=io.StringIO())
+    events.backfill(batch_size=batch_size * 4)
+    rollups.update(batch_size=batch_size * 4, settle=0)
+    log(f"seeded {records} borrow records")
+    return book_objs
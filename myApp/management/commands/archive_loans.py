@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myApp import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move returned loans older than LOAN_ARCHIVE_AFTER_DAYS (or --days) "
+        "to the archive table, in batches. Reports keep counting them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help=f"Archive loans returned more than this many days ago "
+                 f"(default {getattr(settings, 'LOAN_ARCHIVE_AFTER_DAYS', 365)})."
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--max-batches', type=int, default=None,
+            help="Stop after this many batches, to spread the work over runs."
+        )
+
+    def handle(self, *args, **options):
+        before = archive.cutoff(options['days'])
+        started = time.perf_counter()
+        moved = archive.archive(before, options['batch_size'], options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {moved} loan(s) returned before {before:%Y-%m-%d} in "
+            f"{time.perf_counter() - started:.2f}s."))
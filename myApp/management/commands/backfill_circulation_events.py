@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from myApp import events
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the borrow and return events of the loans made before the "
+        "circulation log existed. Safe to run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = events.backfill(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Logged {written} event(s) in {time.perf_counter() - started:.2f}s."))
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from myApp import barcodes, intake
+from myApp.models import BookCopy
+
+
+class Command(BaseCommand):
+    help = (
+        "Manage barcode images now that they are rendered on demand: drop the "
+        "stored PNG files, backfill them, or warm the barcode cache."
+    )
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group(required=True)
+        action.add_argument(
+            '--drop', action='store_true',
+            help="Delete the stored barcode_image files and clear the field."
+        )
+        action.add_argument(
+            '--backfill', action='store_true',
+            help="Store a PNG for every copy that has a barcode but no file."
+        )
+        action.add_argument(
+            '--warm', action='store_true',
+            help="Render the SVG of every barcode into the barcode cache."
+        )
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only count the copies that would be touched."
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+        no_image = Q(barcode_image='') | Q(barcode_image__isnull=True)
+        if options['drop']:
+            queryset = BookCopy.objects.exclude(no_image)
+        elif options['backfill']:
+            queryset = BookCopy.objects.filter(no_image).exclude(barcode__isnull=True)
+        else:
+            queryset = BookCopy.objects.exclude(barcode__isnull=True)
+        queryset = queryset.exclude(barcode='').order_by('pk')
+
+        if options['dry_run']:
+            self.stdout.write(f"{queryset.count()} copies would be touched.")
+            return
+
+        done = 0
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).only(
+                'pk', 'barcode', 'barcode_image')[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            if options['drop']:
+                for copy in batch:
+                    copy.barcode_image.delete(save=False)
+                BookCopy.objects.filter(pk__in=[c.pk for c in batch]).update(
+                    barcode_image=None)
+            elif options['backfill']:
+                intake.attach_images(batch, workers=options['workers'],
+                                     batch_size=options['batch_size'])
+            else:
+                codes = [c.barcode for c in batch
+                         if barcodes.get_cached(c.barcode) is None]
+                for code, image in barcodes.render_many(
+                        codes, workers=options['workers'], fmt='svg'):
+                    barcodes.cache_image(code, 'svg', image)
+            done += len(batch)
+            self.stdout.write(f"{done} copies done...")
+
+        self.stdout.write(self.style.SUCCESS(f"Finished, {done} copies."))
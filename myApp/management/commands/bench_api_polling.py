@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from myApp import services, stats_cache
+from myApp.api import views
+from myApp.models import Book
+
+from ._bench import add_database_arguments, measure, scratch_database, seed_catalogue
+
+
+ENDPOINTS = [
+    ('authors', views.AuthorAPIView.as_view(), '/api/v1/authors/'),
+    ('books', views.BookViewSet.as_view({'get': 'list'}), '/api/v1/books/'),
+    ('copies', views.BookCopyViewSet.as_view({'get': 'list'}), '/api/v1/copies/'),
+    ('loans', views.BorrowRecordViewSet.as_view({'get': 'list'}), '/api/v1/loans/'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Poll the API endpoints like a kiosk does and report the queries of "
+        "a cold request, of plain polls and of If-None-Match polls, before "
+        "and after a loan changes the data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=2_000)
+        parser.add_argument('--records', type=int, default=20_000)
+        parser.add_argument('--polls', type=int, default=200)
+        add_database_arguments(parser)
+
+    def handle(self, *args, **options):
+        with scratch_database(options):
+            seed_catalogue(books=options['books'], records=options['records'],
+                           users=200, stdout=self.stdout)
+            staff = get_user_model().objects.create_user(
+                'bench-staff', is_staff=True)
+            factory = APIRequestFactory()
+
+            def poll(view, path, etag=None):
+                headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+                request = factory.get(path, {'page_size': 100}, **headers)
+                force_authenticate(request, user=staff)
+                return view(request)
+
+            # Start cold: nothing cached for the current versions.
+            stats_cache.bump(*{model for name, view, path in ENDPOINTS
+                               for model in view.cls.cache_models})
+            for name, view, path in ENDPOINTS:
+                with measure() as cold:
+                    response = poll(view, path)
+                if response.status_code != 200:
+                    raise CommandError(f"{path} answered {response.status_code}.")
+                etag = response['ETag']
+                with measure() as warm:
+                    for _ in range(options['polls']):
+                        poll(view, path)
+                with measure() as conditional:
+                    statuses = {poll(view, path, etag).status_code
+                                for _ in range(options['polls'])}
+                self.stdout.write(
+                    f"{name:<8} cold {cold['queries']:>2} queries "
+                    f"{cold['seconds'] * 1000:>7.1f} ms | "
+                    f"{options['polls']} polls {warm['queries']:>3} queries "
+                    f"{warm['seconds'] * 1000 / options['polls']:>6.2f} ms/poll | "
+                    f"If-None-Match {conditional['queries']:>3} queries "
+                    f"{sorted(statuses)}"
+                )
+
+            book = Book.objects.filter(available_copies__gt=0).first()
+            services.borrow_book(book, staff)
+            self.stdout.write("after a loan:")
+            for name, view, path in ENDPOINTS:
+                with measure() as result:
+                    response = poll(view, path, etag=None)
+                self.stdout.write(
+                    f"{name:<8} {result['queries']:>2} queries "
+                    f"({'rebuilt' if result['queries'] else 'cached'})")
@@ -0,0 +1,166 @@
+import asyncio
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, RequestFactory, override_settings
+from django.urls import clear_url_caches
+
+from myApp.models import BookCopy
+
+from ._bench import add_database_arguments, percentiles, scratch_database, seed_catalogue
+
+
+ENDPOINTS = [
+    ('home', '/'),
+    ('search', '/?q=book+1'),
+    ('charts', '/chart-data/?top=20'),
+    ('authors', '/api/v1/authors/'),
+    ('scan', '/scan/{barcode}/'),
+]
+
+
+def _reload_urls(async_views):
+    """Rebuild the URLconf for ``settings.ASYNC_VIEWS = async_views``."""
+    with override_settings(ASYNC_VIEWS=async_views):
+        for name in ('myApp.api.urls', 'myApp.urls', settings.ROOT_URLCONF):
+            importlib.reload(importlib.import_module(name))
+    clear_url_caches()
+
+
+async def _asgi_get(app, url, cookie):
+    """GET ``url`` from the ASGI ``app`` in process; returns the status."""
+    parts = urlsplit(url)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'root_path': '',
+        'path': parts.path, 'raw_path': parts.path.encode(),
+        'query_string': parts.query.encode(),
+        'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+    }
+    received = False
+    status = None
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client stays connected; Django cancels this once it answered.
+        return await asyncio.get_running_loop().create_future()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the read-heavy endpoints in process, through the WSGI handler "
+        "with sync views from threads and through the ASGI handler with the "
+        "async views from coroutines, and compare requests/sec and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=400,
+                            help="Requests per endpoint and mode.")
+        parser.add_argument('--books', type=int, default=2_000)
+        parser.add_argument('--records', type=int, default=20_000)
+        add_database_arguments(parser)
+
+    def handle(self, *args, **options):
+        with scratch_database(options), override_settings(ALLOWED_HOSTS=['*']):
+            seed_catalogue(books=options['books'], records=options['records'],
+                           stdout=self.stdout)
+            staff = get_user_model().objects.create_user('bench-staff', is_staff=True)
+            client = Client()
+            client.force_login(staff)
+            cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+            barcode = BookCopy.objects.values_list('barcode', flat=True).first()
+            urls = [(name, url.format(barcode=barcode)) for name, url in ENDPOINTS]
+
+            try:
+                for mode in ('sync', 'async'):
+                    _reload_urls(mode == 'async')
+                    for name, url in urls:
+                        if mode == 'sync':
+                            samples, statuses, elapsed = self.run_wsgi(url, cookie, options)
+                        else:
+                            samples, statuses, elapsed = asyncio.run(
+                                self.run_asgi(url, cookie, options))
+                        stats = percentiles(samples)
+                        errors = sum(status != 200 for status in statuses)
+                        self.stdout.write(
+                            f"{mode:<5} {name:<8} {len(samples) / elapsed:>7.0f} req/s  " +
+                            "  ".join(f"{k}={v:.1f}ms" for k, v in stats.items()) +
+                            (f"  {errors} errors" if errors else ""))
+            finally:
+                _reload_urls(settings.ASYNC_VIEWS)
+
+    def run_wsgi(self, url, cookie, options):
+        """``--requests`` GETs from ``--concurrency`` threads, like a threaded gunicorn worker."""
+        handler = WSGIHandler()
+        parts = urlsplit(url)
+        environ = RequestFactory().get(parts.path, HTTP_COOKIE=cookie).environ
+        environ['QUERY_STRING'] = parts.query
+        lock = threading.Lock()
+        samples, statuses = [], []
+
+        def worker(count):
+            for _ in range(count):
+                started = time.perf_counter()
+                status = []
+                response = handler(dict(environ), lambda line, headers: status.append(line))
+                b''.join(response)
+                response.close()
+                with lock:
+                    samples.append(time.perf_counter() - started)
+                    statuses.append(int(status[0].split()[0]))
+            connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            list(pool.map(worker, self.shares(options)))
+        return samples, statuses, time.perf_counter() - started
+
+    async def run_asgi(self, url, cookie, options):
+        """``--requests`` GETs from ``--concurrency`` coroutines, like one uvicorn worker."""
+        app = ASGIHandler()
+        samples, statuses = [], []
+
+        async def worker(count):
+            for _ in range(count):
+                started = time.perf_counter()
+                statuses.append(await _asgi_get(app, url, cookie))
+                samples.append(time.perf_counter() - started)
+
+        # As Django advises for ASGI: no persistent connections, since every
+        # request runs its queries on a thread of its own.
+        settings_dict = connections.settings['default']
+        saved = settings_dict['CONN_MAX_AGE']
+        settings_dict['CONN_MAX_AGE'] = 0
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(count) for count in self.shares(options)))
+            return samples, statuses, time.perf_counter() - started
+        finally:
+            settings_dict['CONN_MAX_AGE'] = saved
+
+    def shares(self, options):
+        """``--requests`` split over ``--concurrency`` workers."""
+        count, rest = divmod(options['requests'], options['concurrency'])
+        return [count + (i < rest) for i in range(options['concurrency'])]
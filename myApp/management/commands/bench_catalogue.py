@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from myApp import catalogue
+from myApp.models import Book
+
+from ._bench import add_database_arguments, scratch_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Import and export a synthetic catalogue file and report rows/s "
+        "(and peak Python memory) of both directions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--authors', type=int, default=5_000)
+        parser.add_argument('--copies', type=int, default=0,
+                            help="Copies to create per imported book.")
+        parser.add_argument('--format', choices=catalogue.FORMATS, default='csv')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--trace-memory', action='store_true',
+            help="Report peak Python memory per phase (tracing makes it several "
+                 "times slower, so rows/s are not comparable).")
+        add_database_arguments(parser)
+
+    def _write_source(self, path, options):
+        rows = (
+            {'title': f'Imported book {i}', 'author': f'Imported author {i % options["authors"]}',
+             'daily_rent': str(1 + i % 7), 'copies': options['copies']}
+            for i in range(options['rows'])
+        )
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            f.writelines(catalogue.export_lines(rows, options['format']))
+        # Every tenth row again in different case: must be skipped.
+        if options['format'] == 'jsonl':
+            with open(path, 'a', encoding='utf-8') as f:
+                for i in range(0, options['rows'], 10):
+                    f.write(json.dumps({'title': f'IMPORTED BOOK {i}', 'author': 'x'}) + '\n')
+
+    def _run(self, label, func, rows):
+        if self.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - started
+        line = (f"{label:<9} {rows:>8} rows {seconds:>8.2f}s "
+                f"{rows / seconds:>9.0f} rows/s")
+        if self.trace_memory:
+            line += f" peak {tracemalloc.get_traced_memory()[1] / 2 ** 20:>6.1f} MiB"
+            tracemalloc.stop()
+        self.stdout.write(line)
+        return result
+
+    def handle(self, *args, **options):
+        fmt = options['format']
+        self.trace_memory = options['trace_memory']
+        with scratch_database(options), tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, f'source.{fmt}')
+            target = os.path.join(tmp, f'export.{fmt}')
+            self._write_source(source, options)
+
+            def do_import():
+                with open(source, newline='', encoding='utf-8') as f:
+                    return catalogue.import_rows(
+                        catalogue.read_rows(f, fmt), options['batch_size'])
+
+            def do_export():
+                with open(target, 'w', newline='', encoding='utf-8') as f:
+                    f.writelines(catalogue.export_lines(
+                        catalogue.export_rows(chunk_size=options['batch_size']), fmt))
+
+            stats = self._run('import', do_import, options['rows'])
+            self.stdout.write(f"          {dict(stats)}")
+            self._run('export', do_export, Book.objects.count())
+            stats = self._run('re-import', do_import, options['rows'])
+            self.stdout.write(f"          {dict(stats)} (everything known)")
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+
+from myApp import analytics
+from myApp.models import Author, Book
+
+from ._bench import (
+    add_database_arguments, format_row, measure, scratch_database,
+    seed_catalogue
+)
+
+
+def legacy_chart_series():
+    """The prefetch-and-loop implementation ``chart_data`` used to run."""
+    queried_authors = Author.objects.prefetch_related(
+        'books', 'books__copies', 'books__copies__borrow_records')
+    queried_main_books = Book.objects.select_related(
+        'author').prefetch_related('copies')
+
+    books_list = [book.title for book in queried_main_books]
+    copies = [book.copies.count() for book in queried_main_books]
+    authors_list = [author.name for author in queried_authors]
+    author_copies_count = [
+        sum(book.copies.count() for book in author.books.all())
+        for author in queried_authors
+    ]
+    author_books_count = [author.books.count() for author in queried_authors]
+    daily_rent_list = [book.daily_rent for book in queried_main_books]
+    book_borrowed_counts = [
+        sum(len(copy.borrow_records.all()) for copy in book.copies.all())
+        for book in queried_main_books
+    ]
+    books_are_borrowed_now = [
+        sum(1 for copy in book.copies.all() if not copy.is_available)
+        for book in queried_main_books
+    ]
+    books_revenue = [
+        book.revenue or 0 for book in queried_main_books.annotate(
+            revenue=Sum("copies__borrow_records__total_fee"))
+    ]
+    users_with_revenue = get_user_model().objects.annotate(
+        revenue=Sum("borrowed_books__total_fee")).order_by('-revenue')
+    return {
+        "chart1": {"labels": books_list, "values": copies},
+        "chart2": {"labels": authors_list, "values": author_copies_count},
+        "chart3": {"labels": authors_list, "values": author_books_count},
+        "chart4": {"labels": books_list, "values": daily_rent_list},
+        "chart5": {"labels": books_list, "values": book_borrowed_counts},
+        "chart6": {"labels": books_list, "values": books_are_borrowed_now},
+        "chart7": {"labels": books_list, "values": books_revenue},
+        "chart8": {
+            "labels": [user.username for user in users_with_revenue],
+            "values": [user.revenue for user in users_with_revenue],
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large catalogue and compare query count and latency of the "
+        "legacy chart_data loops with the grouped analytics queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=10_000)
+        parser.add_argument('--copies-per-book', type=int, default=3)
+        parser.add_argument('--users', type=int, default=2_000)
+        parser.add_argument('--records', type=int, default=1_000_000)
+        parser.add_argument('--top', type=int, default=None)
+        parser.add_argument(
+            '--skip-legacy', action='store_true',
+            help="Do not run the legacy implementation (it loads every "
+                 "borrow record into memory).")
+        add_database_arguments(parser)
+
+    def handle(self, *args, **options):
+        with scratch_database(options):
+            seed_catalogue(
+                books=options['books'],
+                copies_per_book=options['copies_per_book'],
+                users=options['users'],
+                records=options['records'],
+                stdout=self.stdout,
+            )
+            if not options['skip_legacy']:
+                with measure() as before:
+                    legacy = legacy_chart_series()
+                self.stdout.write(format_row('legacy chart_data', before))
+            with measure() as after:
+                current = analytics.chart_series(top=options['top'])
+            self.stdout.write(format_row('analytics.chart_series', after))
+            with measure() as ranged:
+                analytics.chart_series(
+                    top=options['top'], since=timezone.localdate() - timedelta(days=30))
+            self.stdout.write(format_row('last 30 days', ranged))
+
+            if not options['skip_legacy'] and not options['top']:
+                same = all(
+                    [str(v) for v in legacy[key]['values']] ==
+                    [str(v) for v in current[key]['values']]
+                    for key in ('chart1', 'chart3', 'chart4', 'chart5', 'chart6')
+                )
+                self.stdout.write(
+                    f"book/author series match the legacy output: {same}")
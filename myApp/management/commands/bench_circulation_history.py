@@ -0,0 +1,89 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+
+from myApp import dashboard, events, services
+from myApp.models import BookCopy, BorrowRecord
+
+from ._bench import (
+    add_database_arguments, measure, percentiles, scratch_database,
+    seed_catalogue
+)
+
+
+def legacy_holder(book_copy):
+    """How the open loan of a copy used to be found."""
+    return (
+        BorrowRecord.objects.select_related('borrower', 'book_copy__book')
+        .filter(book_copy=book_copy, returned_at__isnull=True)
+        .order_by('-borrowed_at')
+        .first()
+    )
+
+
+def legacy_copy_page(page):
+    """The dashboard copy table with the ordered subquery per row."""
+    return list(BookCopy.objects.select_related('book').annotate(
+        current_borrower=Subquery(BorrowRecord.objects.filter(
+            book_copy=OuterRef('pk'), returned_at__isnull=True
+        ).order_by('-borrowed_at').values('borrower__username')[:1])
+    ).order_by('-pk')[page * 25:(page + 1) * 25])
+
+
+def copy_page(page):
+    return list(dashboard.copy_queryset({}).order_by('-pk')[page * 25:(page + 1) * 25])
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare current-holder and history queries on the loan table with "
+        "the current_loan pointer and the circulation event log."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=5_000)
+        parser.add_argument('--records', type=int, default=500_000)
+        parser.add_argument('--lookups', type=int, default=1_000)
+        add_database_arguments(parser)
+
+    def handle(self, *args, **options):
+        with scratch_database(options):
+            seed_catalogue(books=options['books'], records=options['records'],
+                           users=500, stdout=self.stdout)
+            rng = random.Random(11)
+            copies = list(BookCopy.objects.filter(is_available=False)[:200])
+            copies += list(BookCopy.objects.order_by('?')[:200])
+            users = list(get_user_model().objects.order_by('?')[:200])
+            n = options['lookups']
+            copy_sample = [rng.choice(copies) for _ in range(n)]
+            user_sample = [rng.choice(users) for _ in range(n)]
+
+            cases = [
+                ('holder: ordered lookup', copy_sample, legacy_holder),
+                ('holder: current_loan', copy_sample, services.open_record_for),
+                ('copy table: subquery', range(n // 10), legacy_copy_page),
+                ('copy table: current_loan', range(n // 10), copy_page),
+                ('copy history: loans', copy_sample, lambda c: list(
+                    BorrowRecord.objects.filter(book_copy=c)[:50])),
+                ('copy history: events', copy_sample, lambda c: list(
+                    events.copy_history(c))),
+                ('user history: loans', user_sample, lambda u: list(
+                    BorrowRecord.objects.filter(borrower=u)[:50])),
+                ('user history: events', user_sample, lambda u: list(
+                    events.user_history(u))),
+            ]
+            for label, sample, func in cases:
+                samples = []
+                with measure() as total:
+                    for item in sample:
+                        started = time.perf_counter()
+                        func(item)
+                        samples.append(time.perf_counter() - started)
+                stats = percentiles(samples)
+                self.stdout.write(
+                    f"{label:<26} {total['queries'] / len(samples):>5.2f} queries  " +
+                    "  ".join(f"{k}={v:.2f}ms" for k, v in stats.items())
+                )
@@ -0,0 +1,130 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory, override_settings
+
+from ._bench import add_database_arguments, percentiles, scratch_database, seed_catalogue
+
+
+MODES = {
+    'per-request': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+    'persistent': {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True},
+    'pool': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+}
+
+
+def _has_pool():
+    if connection.vendor != 'postgresql':
+        return False
+    try:
+        import psycopg_pool  # noqa: F401
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+    except ImportError:
+        return False
+    return is_psycopg3
+
+
+class Command(BaseCommand):
+    help = (
+        "Request a page from concurrent threads through the WSGI handler, "
+        "like a threaded gunicorn worker, once per connection setup "
+        "(per-request, persistent, psycopg pool on Postgres), and report "
+        "the latency and the database connections opened."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=100,
+                            help="Requests per thread.")
+        parser.add_argument('--path', default='/')
+        parser.add_argument('--books', type=int, default=2_000)
+        parser.add_argument('--modes', default=','.join(MODES),
+                            help="Comma separated, of: " + ', '.join(MODES))
+        add_database_arguments(parser)
+
+    def handle(self, *args, **options):
+        modes = options['modes'].split(',')
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}.")
+        with scratch_database(options), override_settings(ALLOWED_HOSTS=['*']):
+            seed_catalogue(books=options['books'], records=options['books'] * 5,
+                           stdout=self.stdout)
+            if 'pool' in modes and not _has_pool():
+                self.stdout.write("pool: skipped, needs Postgres with psycopg 3 and psycopg_pool")
+                modes.remove('pool')
+            for mode in modes:
+                self.run_mode(mode, options)
+
+    def run_mode(self, mode, options):
+        settings_dict = connections.settings['default']
+        saved = {key: settings_dict.get(key) for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'OPTIONS')}
+        settings_dict.update(MODES[mode])
+        settings_dict['OPTIONS'] = dict(saved['OPTIONS'] or {})
+        if mode == 'pool':
+            settings_dict['OPTIONS']['pool'] = {
+                'min_size': 1, 'max_size': options['threads']}
+        else:
+            settings_dict['OPTIONS'].pop('pool', None)
+        connections.close_all()
+
+        handler = WSGIHandler()
+        environ = RequestFactory().get(options['path']).environ
+        lock = threading.Lock()
+        opened = []
+        samples = []
+
+        def count(sender, connection, **kwargs):
+            with lock:
+                opened.append(connection.alias)
+
+        def worker():
+            times = []
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                response = handler(dict(environ), lambda status, headers: None)
+                b''.join(response)
+                response.close()  # request_finished: close_old_connections
+                times.append(time.perf_counter() - started)
+            connections.close_all()
+            with lock:
+                samples.extend(times)
+
+        connection_created.connect(count)
+        peak = 0
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(options['threads']) as pool:
+                futures = [pool.submit(worker) for _ in range(options['threads'])]
+                while wait(futures, timeout=0.05).not_done:
+                    peak = max(peak, self.server_connections())
+                for future in futures:
+                    future.result()
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count)
+            if hasattr(connection, 'close_pool'):
+                connection.close_pool()
+            settings_dict.update(saved)
+            connections.close_all()
+
+        stats = percentiles(samples)
+        server = f" | server connections peak {peak}" if connection.vendor == 'postgresql' else ''
+        self.stdout.write(
+            f"{mode:<12} {len(samples) / elapsed:>7.0f} req/s  " +
+            "  ".join(f"{k}={v:.1f}ms" for k, v in stats.items()) +
+            f" | {len(opened)} connects for {len(samples)} requests{server}")
+
+    def server_connections(self):
+        """Backends connected to the database besides this one (Postgres only)."""
+        if connection.vendor != 'postgresql':
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) - 1 FROM pg_stat_activity WHERE datname = current_database()")
+            return cursor.fetchone()[0]
@@ -0,0 +1,65 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from myApp import scan
+from myApp.models import BookCopy, BorrowRecord
+
+from ._bench import (
+    add_database_arguments, measure, percentiles, scratch_database,
+    seed_catalogue
+)
+
+
+def legacy_scan(barcode):
+    """What ``book_transactions`` used to do for a Track scan."""
+    book = BookCopy.objects.filter(barcode=barcode).first()
+    if not book:
+        return None
+    record = BorrowRecord.objects.filter(book_copy=book).order_by('-borrowed_at').first()
+    if record and not record.returned_at:
+        return f"The user ({record.borrower.username}) has the book ({book.book.title})."
+    return f"The book ({book.book.title}) is in the library."
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate a burst of scanner input and compare latency of the scan "
+        "lookup (cold and warm barcode cache) with the legacy queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=5_000)
+        parser.add_argument('--records', type=int, default=200_000)
+        parser.add_argument('--scans', type=int, default=2_000)
+        parser.add_argument('--distinct', type=int, default=300,
+                            help="Distinct barcodes in the burst.")
+        add_database_arguments(parser)
+
+    def handle(self, *args, **options):
+        with scratch_database(options):
+            seed_catalogue(books=options['books'], records=options['records'],
+                           users=500, stdout=self.stdout)
+            barcodes = list(
+                BookCopy.objects.order_by('?').values_list(
+                    'barcode', flat=True)[:options['distinct']])
+            rng = random.Random(7)
+            burst = [rng.choice(barcodes) for _ in range(options['scans'])]
+
+            scan.barcode_cache.clear()
+            for label, func in (('legacy queries', legacy_scan),
+                                ('scan.lookup (cold cache)', scan.lookup),
+                                ('scan.lookup (warm cache)', scan.lookup)):
+                samples = []
+                with measure() as total:
+                    for barcode in burst:
+                        started = time.perf_counter()
+                        func(barcode)
+                        samples.append(time.perf_counter() - started)
+                stats = percentiles(samples)
+                self.stdout.write(
+                    f"{label:<26} {len(burst) / total['seconds']:>8.0f} scans/s "
+                    f"{total['queries'] / len(burst):>5.2f} queries/scan  " +
+                    "  ".join(f"{k}={v:.2f}ms" for k, v in stats.items())
+                )
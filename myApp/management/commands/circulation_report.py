@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from myApp import rollups
+from myApp.models import Author, Book
+
+
+NAMES = {
+    'book': (Book, 'title'),
+    'author': (Author, 'name'),
+    'user': (get_user_model(), get_user_model().USERNAME_FIELD),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the books, authors or users with the most revenue over a "
+        "range of days, from the daily rollups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--by', choices=sorted(rollups.TABLES), default='book')
+        parser.add_argument('--since', help="First day (YYYY-MM-DD).")
+        parser.add_argument('--until', help="Last day (YYYY-MM-DD).")
+        parser.add_argument('--top', type=int, default=10)
+
+    def _day(self, value):
+        if value is None:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"{value!r} is not a date (YYYY-MM-DD).")
+        return day
+
+    def handle(self, *args, **options):
+        rows = rollups.totals(
+            options['by'], self._day(options['since']), self._day(options['until']),
+            top=options['top'])
+        model, field = NAMES[options['by']]
+        key_column = rollups.TABLES[options['by']][1]
+        names = dict(model.objects.filter(
+            pk__in=[row[key_column] for row in rows]).values_list('pk', field))
+        self.stdout.write(
+            f"{options['by']:<32} {'loans':>8} {'returns':>8} {'revenue':>12} {'overdue':>12}")
+        for row in rows:
+            self.stdout.write(
+                f"{names.get(row[key_column], row[key_column])!s:<32.32} "
+                f"{row['loans']:>8} {row['returns']:>8} "
+                f"{row['revenue']:>12} {row['overdue_fees']:>12}")
@@ -0,0 +1,41 @@
+import sys
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+
+from myApp import catalogue
+
+
+class Command(BaseCommand):
+    help = "Export the catalogue as CSV or JSON lines, in the import format."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or - for stdout.")
+        parser.add_argument('--format', choices=catalogue.FORMATS,
+                            help="Default: guessed from the file name, else csv.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or catalogue.guess_format(options['path'])
+        to_stdout = options['path'] == '-'
+        output = nullcontext(sys.stdout) if to_stdout else open(
+            options['path'], 'w', newline='', encoding='utf-8')
+
+        count = 0
+
+        def counted(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row
+
+        started = time.perf_counter()
+        rows = counted(catalogue.export_rows(chunk_size=options['chunk_size']))
+        with output as f:
+            f.writelines(catalogue.export_lines(rows, fmt))
+        seconds = time.perf_counter() - started
+        if not to_stdout:
+            self.stdout.write(self.style.SUCCESS(
+                f"Exported {count} books to {options['path']} in {seconds:.2f}s "
+                f"({count / max(seconds, 1e-9):.0f} rows/s)."))
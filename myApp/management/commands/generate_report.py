@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from myApp import reports
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the inventory PDF report without a browser, e.g. from cron. "
+        "Charts are drawn on the server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Path of the PDF file to write.")
+        parser.add_argument(
+            '--base-url',
+            default='http://localhost:8000/',
+            help="Base URL WeasyPrint resolves static files against."
+        )
+
+    def handle(self, *args, **options):
+        pdf = reports.render_report(options['base_url'])
+        with open(options['output'], 'wb') as output:
+            output.write(pdf)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(pdf)} bytes to {options['output']}."))
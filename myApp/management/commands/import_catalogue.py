@@ -0,0 +1,39 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myApp import catalogue
+
+
+class Command(BaseCommand):
+    help = (
+        "Import books (and their copies) from a CSV or JSON lines catalogue "
+        "file. Titles already in the catalogue are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Catalogue file, or - for stdin.")
+        parser.add_argument('--format', choices=catalogue.FORMATS,
+                            help="Default: guessed from the file name, else csv.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or catalogue.guess_format(options['path'])
+        started = time.perf_counter()
+        try:
+            if options['path'] == '-':
+                stats = catalogue.import_rows(
+                    catalogue.read_rows(sys.stdin, fmt), options['batch_size'])
+            else:
+                with open(options['path'], newline='', encoding='utf-8') as f:
+                    stats = catalogue.import_rows(
+                        catalogue.read_rows(f, fmt), options['batch_size'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        seconds = time.perf_counter() - started
+        rows = stats['books'] + stats['skipped']
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['books']} books, {stats['authors']} new authors "
+            f"and {stats['copies']} copies, skipped {stats['skipped']} known "
+            f"titles in {seconds:.2f}s ({rows / seconds:.0f} rows/s)."))
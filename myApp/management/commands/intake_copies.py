@@ -0,0 +1,75 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myApp import intake
+from myApp.models import Book
+
+
+def _parse_item(value):
+    try:
+        book_id, count = value.split(':')
+        return int(book_id), int(count)
+    except ValueError:
+        raise CommandError(f"Expected BOOK_ID:COUNT, got {value!r}.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Receive a shipment: create copies of books in bulk with barcodes "
+        "reserved in one block."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'items', nargs='*', metavar='BOOK_ID:COUNT',
+            help="Number of copies to create per book."
+        )
+        parser.add_argument(
+            '--csv',
+            help="CSV file with book_id,count rows (a header row is allowed)."
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help="Processes rendering the barcode images (default: CPU count)."
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+        )
+        parser.add_argument(
+            '--images', action='store_true',
+            help="Also store PNG barcode images (normally rendered on demand)."
+        )
+
+    def handle(self, *args, **options):
+        items = [_parse_item(value) for value in options['items']]
+        if options['csv']:
+            with open(options['csv'], newline='') as f:
+                for row in csv.reader(f):
+                    if row and row[0].strip().isdigit():
+                        items.append((int(row[0]), int(row[1])))
+        if not items:
+            raise CommandError("Nothing to receive.")
+        if any(count < 1 for book_id, count in items):
+            raise CommandError("Counts must be positive.")
+
+        book_ids = {book_id for book_id, count in items}
+        unknown = book_ids - set(
+            Book.objects.filter(pk__in=book_ids).values_list('pk', flat=True))
+        if unknown:
+            raise CommandError(
+                f"Unknown book id(s): {', '.join(map(str, sorted(unknown)))}")
+
+        started = time.perf_counter()
+        copies = intake.intake(
+            items,
+            render_images=options['images'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+        )
+        seconds = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(copies)} copies of {len(book_ids)} book(s) in "
+            f"{seconds:.2f}s ({len(copies) / seconds:.0f} copies/s), "
+            f"barcodes {copies[0].barcode}..{copies[-1].barcode}."))
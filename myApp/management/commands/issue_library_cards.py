@@ -0,0 +1,33 @@
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from myApp.models import LibraryCard
+
+
+class Command(BaseCommand):
+    help = (
+        "Issue library cards to the users without an active one, or new cards "
+        "(cancelling the old) to the given usernames."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help="Reissue the cards of these users instead."
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        else:
+            users = users.exclude(library_cards__is_active=True)
+        users = users.iterator(chunk_size=options['batch_size'])
+
+        issued = 0
+        while batch := list(islice(users, options['batch_size'])):
+            issued += len(LibraryCard.issue(batch))
+        self.stdout.write(f"Issued {issued} library cards.")
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myApp import fees
+from myApp.models import BorrowRecord
+
+
+class Command(BaseCommand):
+    help = (
+        "Bring the stored overdue days and accrued fees of the open loans up "
+        "to date, touching only loans that changed. Run it from cron, or "
+        "with --loop as a long-running worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep running, every --interval seconds."
+        )
+        parser.add_argument('--interval', type=int, default=600)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options['batch_size'])
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def run_once(self, batch_size):
+        started = time.perf_counter()
+        filled = fees.backfill_due_dates(batch_size)
+        updated = fees.materialize(batch_size=batch_size)
+        totals = BorrowRecord.objects.outstanding()
+        self.stdout.write(
+            f"{timezone.now():%Y-%m-%d %H:%M:%S} "
+            f"backfilled {filled}, updated {updated} loans in "
+            f"{time.perf_counter() - started:.2f}s; "
+            f"{totals['loans']} open, {totals['overdue']} overdue, "
+            f"${totals['fees']} accrued")
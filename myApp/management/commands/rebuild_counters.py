@@ -0,0 +1,120 @@
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from myApp import stats_cache
+from myApp.models import Author, Book, BookCopy, BorrowRecord
+
+
+def _count_subquery(queryset, group_field):
+    """Correlated COUNT(*) of ``queryset`` grouped by ``group_field``."""
+    return Coalesce(
+        Subquery(
+            queryset.order_by()
+            .values(group_field)
+            .annotate(c=Count('pk'))
+            .values('c'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the stored total/available copy counters of books, the book "
+        "counter of authors and the availability and current loan of copies, "
+        "or only report drift with --check."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only report counters that disagree with the real rows."
+        )
+
+    def handle(self, *args, **options):
+        real_total = _count_subquery(
+            BookCopy.objects.filter(book=OuterRef('pk')), 'book')
+        real_available = _count_subquery(
+            BookCopy.objects.filter(book=OuterRef('pk'), is_available=True),
+            'book')
+        real_books = _count_subquery(
+            Book.objects.filter(author=OuterRef('pk')), 'author')
+
+        drifted_books = Book.objects.annotate(
+            real_total=real_total, real_available=real_available
+        ).filter(
+            ~Q(total_copies=real_total) | ~Q(available_copies=real_available)
+        )
+        drifted_authors = Author.objects.annotate(
+            real_books=real_books
+        ).exclude(book_count=real_books)
+        open_loans = BorrowRecord.objects.filter(
+            book_copy=OuterRef('pk'), returned_at__isnull=True)
+        real_loan = Subquery(open_loans.values('pk')[:1])
+        drifted_copies = BookCopy.objects.annotate(
+            held=Coalesce('current_loan', 0), real_loan=Coalesce(real_loan, 0)
+        ).exclude(held=F('real_loan'))
+        # A copy is available exactly when it has no open loan.
+        misflagged_copies = BookCopy.objects.filter(
+            Q(Exists(open_loans), is_available=True)
+            | Q(~Exists(open_loans), is_available=False))
+
+        if options['check']:
+            drift = 0
+            for book in drifted_books.values(
+                    'pk', 'title', 'total_copies', 'real_total',
+                    'available_copies', 'real_available'):
+                drift += 1
+                self.stdout.write(
+                    f"Book #{book['pk']} {book['title']!r}: "
+                    f"total {book['total_copies']} != {book['real_total']} or "
+                    f"available {book['available_copies']} != {book['real_available']}"
+                )
+            for author in drifted_authors.values(
+                    'pk', 'name', 'book_count', 'real_books'):
+                drift += 1
+                self.stdout.write(
+                    f"Author #{author['pk']} {author['name']!r}: "
+                    f"books {author['book_count']} != {author['real_books']}"
+                )
+            for copy in drifted_copies.values('pk', 'barcode', 'held', 'real_loan'):
+                drift += 1
+                self.stdout.write(
+                    f"Copy #{copy['pk']} {copy['barcode']!r}: "
+                    f"current loan {copy['held'] or None} != {copy['real_loan'] or None}"
+                )
+            for copy in misflagged_copies.values('pk', 'barcode', 'is_available'):
+                drift += 1
+                self.stdout.write(
+                    f"Copy #{copy['pk']} {copy['barcode']!r}: "
+                    f"available {copy['is_available']} but "
+                    f"{'an' if copy['is_available'] else 'no'} open loan"
+                )
+            if drift:
+                raise CommandError(f"{drift} counter(s) out of sync.")
+            self.stdout.write(self.style.SUCCESS("All counters are in sync."))
+            return
+
+        with transaction.atomic():
+            # Availability first: the book counters are counted from it.
+            flags = misflagged_copies.update(is_available=~Exists(open_loans))
+            books = Book.objects.update(
+                total_copies=real_total, available_copies=real_available)
+            authors = Author.objects.update(book_count=real_books)
+            # Unset first: a loan may only be held by one copy at a time.
+            copies = drifted_copies.update(current_loan=None)
+            BookCopy.objects.filter(
+                Exists(open_loans), current_loan__isnull=True
+            ).update(current_loan=real_loan)
+            transaction.on_commit(partial(stats_cache.bump, Book, Author, BookCopy))
+            transaction.on_commit(stats_cache.invalidate)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt counters for {books} book(s) and {authors} author(s), "
+            f"the availability of {flags} and the current loan of {copies} "
+            f"copy(ies)."))
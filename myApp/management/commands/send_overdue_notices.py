@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from myApp import fees, notices
+
+
+class Command(BaseCommand):
+    help = (
+        "Email today's overdue notice to every borrower with overdue loans. "
+        "Safe to rerun: a borrower gets at most one notice a day."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Borrowers claimed and rendered at a time.")
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help="Messages sent per backend connection.")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Sending threads (default: settings.NOTICE_WORKERS).")
+        parser.add_argument('--rate', type=float, default=None,
+                            help="Messages per second, 0 for no limit "
+                                 "(default: settings.NOTICE_RATE).")
+
+    def handle(self, *args, **options):
+        fees.materialize()
+        stats = notices.send_overdue_notices(
+            chunk_size=options['chunk_size'], batch_size=options['batch_size'],
+            workers=options['workers'], rate=options['rate'])
+        self.stdout.write(
+            f"Sent {stats['sent']} notices, {stats['failed']} failed, "
+            f"{stats['skipped']} already handled today.")
@@ -0,0 +1,139 @@
+import io
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from myApp import services
+from myApp.models import Author, Book, BookCopy, BorrowRecord
+
+from ._bench import add_database_arguments, percentiles, scratch_database
+
+
+RETURN_ATTEMPTS = 10
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer the borrow/return service from many threads and check that "
+        "no copy is ever checked out twice. Reports borrow throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--copies', type=int, default=8,
+                            help="Copies of the single contended book.")
+        parser.add_argument('--rounds', type=int, default=25,
+                            help="Borrow attempts per thread.")
+        add_database_arguments(parser)
+
+    def handle(self, *args, **options):
+        with scratch_database(options):
+            self.run(options)
+
+    def run(self, options):
+        User = get_user_model()
+        author = Author.objects.create(name='Stress Author')
+        book = Book.objects.create(title='Stress Book', author=author)
+        BookCopy.objects.bulk_create([
+            BookCopy(book=book, barcode=f'STRESS-{book.pk}-{i}')
+            for i in range(options['copies'])
+        ])
+        call_command('rebuild_counters', stdout=io.StringIO())
+        users = [
+            User.objects.create(username=f'stress-{book.pk}-{i}')
+            for i in range(options['threads'])
+        ]
+        connection.close()
+
+        held = {}
+        violations = []
+        outcomes = Counter()
+        latencies = []
+        lock = threading.Lock()
+        start_gate = threading.Barrier(options['threads'])
+
+        def worker(user):
+            start_gate.wait()
+            try:
+                for _ in range(options['rounds']):
+                    started = time.perf_counter()
+                    try:
+                        record = services.borrow_book(book, user)
+                    except services.CirculationError:
+                        with lock:
+                            outcomes['no_copy'] += 1
+                            latencies.append(time.perf_counter() - started)
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+                        outcomes['borrowed'] += 1
+                        holder = held.get(record.book_copy_id)
+                        if holder is not None:
+                            violations.append((record.book_copy_id, holder, user.pk))
+                        held[record.book_copy_id] = user.pk
+                    time.sleep(0)
+                    for attempt in range(1, RETURN_ATTEMPTS + 1):
+                        # Freed in the books only once the return committed,
+                        # before anyone can have borrowed the copy again.
+                        with lock:
+                            try:
+                                services.return_record(record, user=user)
+                            except services.CirculationError:
+                                outcomes['return_retried'] += 1
+                            else:
+                                held.pop(record.book_copy_id, None)
+                                break
+                        time.sleep(min(0.005 * 2 ** attempt, 0.25))
+                    else:
+                        with lock:
+                            outcomes['return_failed'] += 1
+                        return
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        doubled = (
+            BorrowRecord.objects.filter(returned_at__isnull=True)
+            .values('book_copy')
+            .annotate(open_loans=Count('pk'))
+            .filter(open_loans__gt=1)
+            .count()
+        )
+        stats = percentiles(latencies)
+        self.stdout.write(
+            f"{options['threads']} threads x {options['rounds']} rounds over "
+            f"{options['copies']} copies in {elapsed:.2f}s"
+        )
+        self.stdout.write(
+            f"borrowed: {outcomes['borrowed']}  no copy/busy: {outcomes['no_copy']}  "
+            f"returns retried: {outcomes['return_retried']}  "
+            f"returns failed: {outcomes['return_failed']}  "
+            f"throughput: {outcomes['borrowed'] / elapsed:.1f} borrows/s"
+        )
+        self.stdout.write(
+            "borrow latency ms: " + "  ".join(
+                f"{key}={value:.1f}" for key, value in stats.items())
+        )
+        call_command('rebuild_counters', '--check', stdout=self.stdout)
+        if outcomes['return_failed']:
+            raise CommandError(
+                f"{outcomes['return_failed']} return(s) still failed after "
+                f"{RETURN_ATTEMPTS} attempts.")
+        if violations or doubled:
+            raise CommandError(
+                f"Double checkout detected: {len(violations)} in-flight, "
+                f"{doubled} copies with several open loans.")
+        self.stdout.write(self.style.SUCCESS("No copy was checked out twice."))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myApp import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold the circulation events logged since the last run into the "
+        "daily book, author and user rollups. Run it from cron, or with "
+        "--loop as a long-running worker; --rebuild starts over."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help="Keep running, every --interval seconds."
+        )
+        parser.add_argument('--interval', type=int, default=60)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Empty the rollups and fold the whole log in again first."
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.run_once(rollups.rebuild, options['batch_size'])
+        while True:
+            self.run_once(rollups.update, options['batch_size'])
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def run_once(self, func, batch_size):
+        started = time.perf_counter()
+        folded = func(batch_size=batch_size)
+        self.stdout.write(
+            f"{timezone.now():%Y-%m-%d %H:%M:%S} folded {folded} events in "
+            f"{time.perf_counter() - started:.2f}s")
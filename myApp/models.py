@@ -1,21 +1,52 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import (
+    Case, DecimalField, ExpressionWrapper, F, IntegerField, Sum, Value, When
+)
+from django.db.models.functions import Coalesce, Greatest, Lower
 from django.contrib.auth.models import User
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
 from django.core.validators import MinValueValidator
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, timedelta
+from functools import partial
 from django.core.files.base import ContentFile
+from django.urls import reverse
 
-import barcode
-from barcode.writer import ImageWriter
-import random
-from io import BytesIO
+from . import barcodes
+
+
+def _group_by_value(mapping):
+    """Invert ``{key: value}`` into ``{value: [keys]}``."""
+    groups = {}
+    for key, value in mapping.items():
+        groups.setdefault(value, []).append(key)
+    return groups
 
 
 class Author(models.Model):
     name = models.CharField(max_length=264)
+    book_count = models.PositiveIntegerField(default=0, editable=False)
+
+    @staticmethod
+    def adjust_counters(author_id, books=0):
+        """Shift the stored book counter of an author by the given delta."""
+        if author_id and books:
+            Author.objects.filter(pk=author_id).update(
+                book_count=F('book_count') + books)
+
+    @staticmethod
+    def adjust_many(deltas):
+        """
+        ``adjust_counters`` for a ``{author_id: books}`` mapping, one UPDATE
+        per distinct delta.
+        """
+        for books, author_ids in _group_by_value(deltas).items():
+            if books:
+                Author.objects.filter(pk__in=author_ids).update(
+                    book_count=F('book_count') + books)
 
     def __str__(self):
-        return f'{self.name} ({self.books.count()} books)'
+        return f'{self.name} ({self.book_count} books)'
 
 
 class Book(models.Model):
@@ -35,14 +66,90 @@ class Book(models.Model):
         validators=[MinValueValidator(0)],
         default=1
     )
+    total_copies = models.PositiveIntegerField(default=0, editable=False)
+    available_copies = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            # Titles are unique whatever their case. The index behind the
+            # constraint also serves lookups on Lower('title').
+            models.UniqueConstraint(
+                Lower('title'),
+                name='unique_book_title_ci',
+                violation_error_code='unique_title',
+                violation_error_message='We already have this book.'
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_author_id = instance.__dict__.get('author_id')
+        return instance
+
+    def validate_constraints(self, exclude=None):
+        """Report a clash of titles on the title field, not the whole form."""
+        try:
+            super().validate_constraints(exclude=exclude)
+        except ValidationError as e:
+            errors = e.update_error_dict({})
+            general = errors.pop(NON_FIELD_ERRORS, [])
+            title = [error for error in general if error.code == 'unique_title']
+            if title:
+                errors['title'] = errors.get('title', []) + title
+            rest = [error for error in general if error.code != 'unique_title']
+            if rest:
+                errors[NON_FIELD_ERRORS] = rest
+            raise ValidationError(errors)
+
+    def save(self, *args, **kwargs):
+        creating = self._state.adding
+        super().save(*args, **kwargs)
+        old_author_id = None if creating else getattr(
+            self, '_loaded_author_id', self.author_id)
+        if old_author_id != self.author_id:
+            Author.adjust_counters(old_author_id, books=-1)
+            Author.adjust_counters(self.author_id, books=1)
+        self._loaded_author_id = self.author_id
+
+    @staticmethod
+    def _bump_version():
+        """The counter UPDATEs skip the signals, so move the version here."""
+        from . import stats_cache
+        transaction.on_commit(partial(stats_cache.bump, Book))
+
+    @staticmethod
+    def adjust_counters(book_id, total=0, available=0):
+        """Shift the stored copy counters of a book by the given deltas."""
+        if not book_id or not (total or available):
+            return
+        Book.objects.filter(pk=book_id).update(
+            total_copies=F('total_copies') + total,
+            available_copies=F('available_copies') + available,
+        )
+        Book._bump_version()
+
+    @staticmethod
+    def adjust_many(deltas):
+        """
+        ``adjust_counters`` for a ``{book_id: (total, available)}`` mapping,
+        one UPDATE per distinct pair of deltas.
+        """
+        for (total, available), book_ids in _group_by_value(deltas).items():
+            if total or available:
+                Book.objects.filter(pk__in=book_ids).update(
+                    total_copies=F('total_copies') + total,
+                    available_copies=F('available_copies') + available,
+                )
+                Book._bump_version()
 
     @property
     def stock(self):
         """Number of available copies."""
-        return self.copies.filter(is_available=True).count()
+        return self.available_copies
 
     def __str__(self):
-        return f'{self.title} by {self.author.name} ({self.copies.count()} copies)'
+        return f'{self.title} by {self.author.name} ({self.total_copies} copies)'
 
 
 class BookCopy(models.Model):
@@ -63,92 +170,253 @@ class BookCopy(models.Model):
         null=True
     )
     is_available = models.BooleanField(default=True)
+    # The open loan holding the copy, kept by ``services`` in the same
+    # UPDATE that flips ``is_available``. ``rebuild_counters`` repairs it.
+    current_loan = models.OneToOneField(
+        'BorrowRecord',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='held_copy'
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_state = (
+            instance.__dict__.get('book_id'),
+            instance.__dict__.get('is_available'),
+        )
+        return instance
 
     def save(self, *args, **kwargs):
+        # The image is rendered on demand by the barcode endpoint, see
+        # ``barcode_url``; ``barcode_image`` only holds uploaded files.
         if not self.barcode:
             self.barcode = self.generate_unique_barcode()
-            self.create_and_assign_barcode()
-        elif not self.barcode_image:
-            self.create_and_assign_barcode()
 
-        super().save(*args, **kwargs)
-
-    def create_and_assign_barcode(self):
+        creating = self._state.adding
+        old_book_id = None if creating else getattr(
+            self, '_loaded_state', (self.book_id,))[0]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.sync_book_counters(creating)
+            if old_book_id != self.book_id:
+                if old_book_id:
+                    CirculationEvent.stock([self], -1, book_id=old_book_id)
+                CirculationEvent.stock([self], 1)
+
+    def sync_book_counters(self, creating=False):
         """
-        Create barcode image and assign it to the book field.
+        Apply the difference between the loaded and the saved state of this
+        copy to the counters of its book(s).
         """
-        barcode_str = self.barcode
-        BarcodeClass = barcode.get_barcode_class('code128')
-        ean = BarcodeClass(barcode_str, writer=ImageWriter())
+        if creating:
+            old_book_id, old_available = None, None
+        else:
+            old_book_id, old_available = getattr(
+                self, '_loaded_state', (self.book_id, self.is_available))
+        if old_book_id != self.book_id:
+            if old_book_id:
+                Book.adjust_counters(
+                    old_book_id, total=-1, available=-int(bool(old_available)))
+            Book.adjust_counters(
+                self.book_id, total=1, available=int(self.is_available))
+        elif old_available is not None and old_available != self.is_available:
+            Book.adjust_counters(
+                self.book_id, available=1 if self.is_available else -1)
+        self._loaded_state = (self.book_id, self.is_available)
 
-        # Save barcode image to memory buffer
-        buffer = BytesIO()
-        ean.write(buffer)
-        buffer.seek(0)
+    @property
+    def barcode_url(self):
+        """URL of the SVG barcode image, rendered the first time it is asked for."""
+        if self.barcode:
+            return reverse('myApp:barcode_image', args=[self.barcode, 'svg'])
 
-        # Create Django-friendly file object
-        file_name = f"{barcode_str}.png"
-        django_file = ContentFile(buffer.read(), name=file_name)
+    def create_and_assign_barcode(self, png=None):
+        """
+        Create barcode image and assign it to the book field.
+        """
+        file_name = f"{self.barcode}.png"
+        django_file = ContentFile(
+            png or barcodes.render_png(self.barcode), name=file_name)
 
         # Save to the ImageField using Django's storage backend (Cloudflare R2)
         self.barcode_image.save(file_name, django_file, save=False)
 
-
-    def generate_unique_barcode(self, length=12):
+    def generate_unique_barcode(self):
         """
-        If admin didn't add the barcode manually create a random one
-        which is also unique and doesn't exist.
+        If admin didn't add the barcode manually take the next one from the
+        barcode sequence, no lookups needed.
         """
-        while True:
-            code = ''.join(random.choices('0123456789', k=length))
-            if not BookCopy.objects.filter(barcode=code).exists():
-                return code
+        return barcodes.format_barcode(BarcodeSequence.allocate(1).start)
 
     def __str__(self):
         status = "Available" if self.is_available else "Borrowed"
         return f"Copy of {self.book.title} ({status})"
 
 
-class BorrowRecord(models.Model):
-    book_copy = models.ForeignKey(
-        BookCopy,
-        on_delete=models.CASCADE,
-        related_name='borrow_records'
-    )
-    borrower = models.ForeignKey(
+class BarcodeSequence(models.Model):
+    """Hands out blocks of barcode numbers, one UPDATE per block."""
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    @classmethod
+    def allocate(cls, count, name='copies'):
+        """Reserve ``count`` consecutive numbers and return them as a range."""
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    cls.objects.get_or_create(name=name)
+            except IntegrityError:
+                pass
+            # Bump first: the UPDATE takes the row (or, on SQLite, the
+            # write) lock, so no one else can read the same block.
+            cls.objects.filter(name=name).update(
+                next_value=F('next_value') + count)
+            end = cls.objects.values_list(
+                'next_value', flat=True).get(name=name)
+        return range(end - count, end)
+
+    def __str__(self):
+        return f"{self.name} (next {self.next_value})"
+
+
+class LibraryCard(models.Model):
+    """
+    A patron's library card. The scanned number is the primary key, so the
+    desk identifies a patron with one primary-key lookup.
+    """
+    number = models.CharField(max_length=32, primary_key=True, blank=True)
+    user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='borrowed_books'
-    )
-    rented_days = models.PositiveIntegerField(default=3)
-    borrowed_at = models.DateTimeField(auto_now_add=True)
-    returned_at = models.DateTimeField(null=True, blank=True)
-    total_fee = models.DecimalField(
-        max_digits=6,
-        decimal_places=2,
-        default=0
+        related_name='library_cards'
     )
+    is_active = models.BooleanField(default=True)
+    issued_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ['-borrowed_at']
-        unique_together = ('book_copy', 'borrower', 'returned_at')
+        ordering = ['-issued_at']
+
+    def save(self, *args, **kwargs):
+        if not self.number:
+            self.number = barcodes.format_card(
+                BarcodeSequence.allocate(1, name='cards').start)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def issue(cls, users):
+        """
+        Give each of ``users`` a new card, cancelling the ones they had, with
+        one sequence allocation for the lot.
+        """
+        users = list(users)
+        if not users:
+            return []
+        numbers = BarcodeSequence.allocate(len(users), name='cards')
+        with transaction.atomic():
+            cls.objects.filter(user__in=users, is_active=True).update(is_active=False)
+            return cls.objects.bulk_create([
+                cls(number=barcodes.format_card(number), user=user)
+                for number, user in zip(numbers, users)
+            ])
+
+    def __str__(self):
+        status = "" if self.is_active else " (cancelled)"
+        return f"{self.number} of {self.user}{status}"
+
+
+class EpochDays(models.Func):
+    """Days between 1970-01-01 and the (UTC) date of a datetime column."""
+    template = "((%(expressions)s AT TIME ZONE 'UTC')::date - DATE '1970-01-01')"
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template="CAST(julianday(date(%(expressions)s)) - 2440587.5 AS INTEGER)",
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template="(TO_DAYS(%(expressions)s) - 719528)",
+            **extra_context
+        )
+
+
+def epoch_days(day):
+    return (day - date(1970, 1, 1)).days
+
+
+class BorrowRecordQuerySet(models.QuerySet):
+
+    def with_fees(self, today=None):
+        """
+        Annotate the fee of every record in SQL, mirroring
+        ``get_total_debt_till_now``: returned records keep the fee stored at
+        return time, open ones are charged up to ``today``.
+        """
+        today = today or timezone.now().date()
+        money = DecimalField(max_digits=10, decimal_places=2)
+        daily_rent = F('book_copy__book__daily_rent')
+        overdue_days = Greatest(
+            Value(epoch_days(today)) - EpochDays('borrowed_at') - F('rented_days'),
+            Value(0),
+            output_field=IntegerField()
+        )
+        return self.annotate(
+            base_fee=ExpressionWrapper(daily_rent * F('rented_days'), output_field=money),
+            current_overdue_days=overdue_days,
+            overdue_fee=ExpressionWrapper(
+                daily_rent * F('current_overdue_days') * 2, output_field=money),
+            current_fee=Case(
+                When(returned_at__isnull=False, then=F('total_fee')),
+                default=F('base_fee') + F('overdue_fee'),
+                output_field=money
+            ),
+        )
+
+    def overdue(self, now=None):
+        """
+        Open loans past their due date, through the index on ``due_at``.
+        Their ``overdue_days`` and ``accrued_fee`` are as of ``fees_as_of``
+        (see ``myApp.fees``).
+        """
+        return self.filter(returned_at__isnull=True, due_at__lt=now or timezone.now())
+
+    def outstanding(self):
+        """Loans, overdue loans and accrued fees of the open loans, in one query."""
+        return self.filter(returned_at__isnull=True).aggregate(
+            loans=models.Count('pk'),
+            overdue=models.Count('pk', filter=models.Q(overdue_days__gt=0)),
+            fees=Coalesce(Sum('accrued_fee'), Value(0), output_field=DecimalField()),
+        )
+
+
+class LoanMixin:
+    """Fee arithmetic shared by live, archived and historical loans."""
 
     def get_total_fee(self):
-        data = self.get_total_debt_till_now()
-        self.total_fee = data['total']
-        self.save()
-        return self.total_fee
+        """The stored fee once returned, otherwise the fee till now."""
+        if self.returned_at:
+            return self.total_fee
+        return self.get_total_debt_till_now()['total']
 
     def get_total_debt_till_now(self):
-        """Bring the debt of user till now."""
+        """Bring the debt of user till now (or till the return)."""
+        until = self.returned_at or timezone.now()
         base_fee = self.book_copy.book.daily_rent * self.rented_days
 
         overdue_days = 0
         overdue_fee = 0
 
-        if self.is_overdue():
+        if self.is_overdue(until):
             due_date = self.due_date()
-            overdue_days = (timezone.now().date() - due_date.date()).days
+            overdue_days = (until.date() - due_date.date()).days
             overdue_fee = overdue_days * self.book_copy.book.daily_rent * 2
 
         total = base_fee + overdue_fee
@@ -163,21 +431,446 @@ class BorrowRecord(models.Model):
         """Bring the time the book has been with the user till now."""
         return (timezone.now().date() - self.borrowed_at.date()).days
 
-    def is_overdue(self):
+    def is_overdue(self, until=None):
         """Check if the book return is overdue."""
-        return timezone.now() > self.due_date()
+        return (until or timezone.now()) > self.due_date()
 
     def due_date(self):
-        return self.borrowed_at + timedelta(days=self.rented_days)
+        return self.due_at or self.borrowed_at + timedelta(days=self.rented_days)
+
+    def __str__(self):
+        status = "Returned" if self.returned_at else "Not Returned"
+        return f"{self.borrower.username} - {self.book_copy.book.title} ({status})"
+
+
+class BorrowRecord(LoanMixin, models.Model):
+    book_copy = models.ForeignKey(
+        BookCopy,
+        on_delete=models.CASCADE,
+        related_name='borrow_records'
+    )
+    borrower = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='borrowed_books'
+    )
+    rented_days = models.PositiveIntegerField(default=3)
+    # Set on the instance (not by the INSERT) so ``due_at`` can count from it.
+    borrowed_at = models.DateTimeField(default=timezone.now, editable=False)
+    returned_at = models.DateTimeField(null=True, blank=True)
+    total_fee = models.DecimalField(
+        max_digits=6,
+        decimal_places=2,
+        default=0
+    )
+    due_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Materialized by ``myApp.fees`` as of ``fees_as_of``; final once returned.
+    overdue_days = models.PositiveIntegerField(default=0, editable=False)
+    accrued_fee = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        default=0,
+        editable=False
+    )
+    fees_as_of = models.DateField(null=True, blank=True, editable=False)
+
+    objects = BorrowRecordQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-borrowed_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['book_copy'],
+                condition=models.Q(returned_at__isnull=True),
+                name='one_open_loan_per_copy'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['due_at'],
+                condition=models.Q(returned_at__isnull=True),
+                name='open_loan_due_idx'
+            ),
+            models.Index(
+                fields=['fees_as_of'],
+                condition=models.Q(returned_at__isnull=True),
+                name='open_loan_fees_idx'
+            ),
+            models.Index(
+                fields=['borrower', 'due_at'],
+                condition=models.Q(returned_at__isnull=True),
+                name='open_loan_borrower_idx'
+            ),
+            models.Index(
+                fields=['returned_at'],
+                condition=models.Q(returned_at__isnull=False),
+                name='returned_loan_idx'
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_term = (
+            instance.__dict__.get('borrowed_at'), instance.__dict__.get('rented_days'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Only a new loan or a changed term moves the due date, which then
+        # needs its fees recomputed.
+        term = (self.borrowed_at, self.rented_days)
+        if self._state.adding or getattr(self, '_loaded_term', None) != term:
+            due_at = self.borrowed_at + timedelta(days=self.rented_days)
+            if due_at != self.due_at:
+                self.due_at, self.fees_as_of = due_at, None
+        super().save(*args, **kwargs)
+        self._loaded_term = term
 
     def return_book(self):
         """Mark the book as returned and free the copy."""
         if not self.returned_at:
-            self.returned_at = timezone.now()
-            self.book_copy.is_available = True
-            self.book_copy.save()
-            self.save()
+            from .services import return_record
+            returned = return_record(self)
+            self.returned_at = returned.returned_at
+
+
+class PastLoanFields(LoanMixin, models.Model):
+    """The columns of ``BorrowRecord``, for the archive and the history view."""
+    id = models.BigIntegerField(primary_key=True)
+    rented_days = models.PositiveIntegerField(default=3)
+    borrowed_at = models.DateTimeField()
+    returned_at = models.DateTimeField(null=True, blank=True)
+    total_fee = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    due_at = models.DateTimeField(null=True, blank=True)
+    overdue_days = models.PositiveIntegerField(default=0)
+    accrued_fee = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    fees_as_of = models.DateField(null=True, blank=True)
+
+    objects = BorrowRecordQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+        ordering = ['-borrowed_at']
+
+
+class ArchivedBorrowRecord(PastLoanFields):
+    """
+    A returned loan moved out of ``BorrowRecord`` by ``myApp.archive``,
+    under the same id. Rows are written once and never change.
+    """
+    book_copy = models.ForeignKey(
+        BookCopy,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='archived_loans'
+    )
+    borrower = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='archived_loans'
+    )
+
+    class Meta(PastLoanFields.Meta):
+        indexes = [
+            models.Index(fields=['book_copy', 'borrowed_at'], name='archived_loan_copy_idx'),
+            models.Index(fields=['borrower', 'borrowed_at'], name='archived_loan_borrower_idx'),
+            models.Index(fields=['borrowed_at'], name='archived_loan_time_idx'),
+        ]
+
+
+class LoanHistory(PastLoanFields):
+    """
+    Every loan, live or archived: a read-only database view over the
+    ``BorrowRecord`` and ``ArchivedBorrowRecord`` tables (see
+    ``myApp.archive``). Reports read it so archiving never changes them.
+    """
+    book_copy = models.ForeignKey(
+        BookCopy,
+        on_delete=models.DO_NOTHING,
+        related_name='loan_history'
+    )
+    borrower = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        related_name='loan_history'
+    )
+    is_archived = models.BooleanField(default=False)
+
+    class Meta(PastLoanFields.Meta):
+        managed = False
+        db_table = 'myApp_loanhistory'
+
+
+class CirculationEventQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        raise TypeError("Circulation events are append-only.")
+
+    def delete(self):
+        raise TypeError("Circulation events are append-only.")
+
+
+class CirculationEvent(models.Model):
+    """
+    One line of the append-only circulation log, written in the transaction
+    of the transition it records. The foreign keys carry no database
+    constraint, so the history outlives deleted copies, users and loans.
+    """
+    BORROW = 'borrow'
+    RETURN = 'return'
+    TRACK = 'track'
+    STOCK = 'stock'
+    KIND_CHOICES = [
+        (BORROW, 'Borrow'),
+        (RETURN, 'Return'),
+        (TRACK, 'Track'),
+        (STOCK, 'Stock change'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    occurred_at = models.DateTimeField(default=timezone.now)
+    # Only the composite indexes below: every other index is paid on each write.
+    book_copy = models.ForeignKey(
+        BookCopy,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='events'
+    )
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='+'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        null=True,
+        blank=True,
+        related_name='circulation_events'
+    )
+    record = models.ForeignKey(
+        BorrowRecord,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        null=True,
+        blank=True,
+        related_name='events'
+    )
+    # Copies added to (+1) or taken out of (-1) the book's stock.
+    delta = models.SmallIntegerField(default=0)
+
+    objects = CirculationEventQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-occurred_at']
+        indexes = [
+            models.Index(fields=['book_copy', 'occurred_at'], name='circulation_copy_time_idx'),
+            models.Index(fields=['user', 'occurred_at'], name='circulation_user_time_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise TypeError("Circulation events are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise TypeError("Circulation events are append-only.")
+
+    @classmethod
+    def log(cls, kind, record, occurred_at=None):
+        """Log a transition of the loan ``record``."""
+        return cls.objects.create(
+            kind=kind,
+            occurred_at=occurred_at or timezone.now(),
+            book_copy_id=record.book_copy_id,
+            book_id=record.book_copy.book_id,
+            user_id=record.borrower_id,
+            record=record,
+        )
+
+    @classmethod
+    def stock(cls, copies, delta, book_id=None):
+        """
+        Log ``copies`` joining (``delta=1``) or leaving (``-1``) the stock of
+        their book, or of ``book_id``, with one INSERT.
+        """
+        now = timezone.now()
+        return cls.objects.bulk_create([
+            cls(kind=cls.STOCK, occurred_at=now, book_copy_id=copy.pk,
+                book_id=book_id or copy.book_id, delta=delta)
+            for copy in copies
+        ])
 
     def __str__(self):
-        status = "Returned" if self.returned_at else "Not Returned"
-        return f"{self.borrower.username} - {self.book_copy.book.title} ({status})"
+        return f"{self.get_kind_display()} of copy {self.book_copy_id} at {self.occurred_at}"
+
+
+class DailyRollup(models.Model):
+    """
+    Circulation of one day for one book, author or user, kept up to date
+    from the circulation log by ``myApp.rollups``. Loans count on the day
+    they were made, returns and their fees on the day they were returned.
+    """
+    day = models.DateField()
+    loans = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    overdue_fees = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+        ordering = ['-day']
+
+
+class BookDailyStats(DailyRollup):
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        related_name='daily_stats'
+    )
+
+    class Meta(DailyRollup.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'day'], name='book_daily_stats_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'book'], name='book_daily_stats_day_idx'),
+        ]
+
+
+class AuthorDailyStats(DailyRollup):
+    author = models.ForeignKey(
+        Author,
+        on_delete=models.CASCADE,
+        related_name='daily_stats'
+    )
+
+    class Meta(DailyRollup.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['author', 'day'], name='author_daily_stats_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'author'], name='author_daily_stats_day_idx'),
+        ]
+
+
+class UserDailyStats(DailyRollup):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='daily_stats'
+    )
+
+    class Meta(DailyRollup.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='user_daily_stats_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'user'], name='user_daily_stats_day_idx'),
+        ]
+
+
+class Watermark(models.Model):
+    """How far a job has read an append-only table, by primary key."""
+    name = models.CharField(max_length=50, unique=True)
+    position = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at {self.position}"
+
+
+class OverdueNotice(models.Model):
+    """
+    The overdue notice of a borrower for a day. The unique (borrower, day)
+    row is claimed before the mail goes out, so a notice is sent once.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    borrower = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='overdue_notices'
+    )
+    day = models.DateField()
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    claim = models.CharField(max_length=32, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    loans = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-day', 'borrower']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['borrower', 'day'], name='one_overdue_notice_a_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'status'], name='overdue_notice_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Overdue notice to {self.borrower} on {self.day} ({self.status})"
+
+
+class ReportJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='report_jobs'
+    )
+    snapshot = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    file = models.FileField(upload_to='reports/', blank=True, null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    def __str__(self):
+        return f"Report {self.pk} ({self.status})"
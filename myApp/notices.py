@@ -0,0 +1,177 @@
+"""
+Overdue notices by email.
+
+``send_overdue_notices`` walks the borrowers with overdue loans in chunks,
+in borrower order, through the partial index on the open loans
+(``open_loan_borrower_idx``), and for each chunk:
+
+1. claims today's ``OverdueNotice`` of every borrower in it: the rows are
+   inserted ignoring conflicts, then moved to ``sending`` under a fresh
+   claim token with one conditional UPDATE. Only the rows that UPDATE took
+   are sent, so a rerun, or two runs at once, never send a notice twice;
+2. loads the overdue loans of the claimed borrowers in one query and
+   renders their messages;
+3. hands the messages to a bounded thread pool in batches, one email
+   backend connection per batch, with a rate limiter shared by all
+   threads;
+4. marks the notices ``sent``, or ``failed`` with the error so the next run
+   retries them (up to ``MAX_ATTEMPTS``).
+
+A notice whose run died while it was ``sending`` is not retried: it may
+have gone out. The amounts are the materialized ones (see ``fees``).
+"""
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import BorrowRecord, OverdueNotice
+
+
+TEMPLATE = 'myApp/email/overdue_notice.txt'
+MAX_ATTEMPTS = 3
+
+
+class RateLimiter:
+    """Spaces out ``acquire`` calls of all threads to ``rate`` per second."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_at = time.monotonic()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.next_at)
+            self.next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def borrower_chunks(now, chunk_size=500):
+    """Ids of the borrowers with overdue loans (and an email), a chunk at a time."""
+    last = 0
+    while True:
+        ids = list(
+            BorrowRecord.objects.overdue(now)
+            .filter(borrower_id__gt=last)
+            .exclude(borrower__email='')
+            .order_by('borrower_id')
+            .values_list('borrower_id', flat=True)
+            .distinct()[:chunk_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def claim(borrower_ids, day):
+    """Today's notices of ``borrower_ids`` that this run may send."""
+    OverdueNotice.objects.bulk_create(
+        [OverdueNotice(borrower_id=pk, day=day) for pk in borrower_ids],
+        ignore_conflicts=True)
+    token = uuid.uuid4().hex
+    OverdueNotice.objects.filter(
+        day=day, borrower_id__in=borrower_ids,
+        status__in=[OverdueNotice.PENDING, OverdueNotice.FAILED],
+        attempts__lt=MAX_ATTEMPTS,
+    ).update(status=OverdueNotice.SENDING, claim=token, attempts=F('attempts') + 1)
+    return list(
+        OverdueNotice.objects.filter(claim=token, status=OverdueNotice.SENDING)
+        .select_related('borrower'))
+
+
+def render(notices, now):
+    """``(notice, message)`` pairs, with the overdue loans of all ``notices`` read at once."""
+    by_borrower = {notice.borrower_id: notice for notice in notices}
+    loans = (
+        BorrowRecord.objects.overdue(now)
+        .filter(borrower_id__in=by_borrower)
+        .select_related('book_copy__book')
+        .order_by('borrower_id', 'due_at')
+    )
+    template = get_template(TEMPLATE)
+    messages = []
+    for borrower_id, group in groupby(loans, key=lambda loan: loan.borrower_id):
+        group = list(group)
+        notice = by_borrower[borrower_id]
+        notice.loans = len(group)
+        notice.amount = sum(loan.accrued_fee for loan in group)
+        body = template.render({
+            'borrower': notice.borrower, 'loans': group, 'amount': notice.amount})
+        subject = f"{notice.loans} overdue book{'s' if notice.loans > 1 else ''} at the library"
+        messages.append((notice, EmailMessage(
+            subject, body, settings.DEFAULT_FROM_EMAIL, [notice.borrower.email])))
+    return messages
+
+
+def deliver(batch, limiter):
+    """
+    Send ``batch`` over one backend connection. Returns the errors by
+    notice; notices not in it were sent.
+    """
+    errors = {}
+    try:
+        with get_connection() as connection:
+            for notice, message in batch:
+                limiter.acquire()
+                try:
+                    connection.send_messages([message])
+                except Exception as e:  # whatever the backend raises
+                    errors[notice] = repr(e)
+    except Exception as e:
+        # Opening or closing the connection failed; count what was not sent yet.
+        errors.update((notice, repr(e)) for notice, message in batch if notice not in errors)
+    return errors
+
+
+def send_overdue_notices(now=None, chunk_size=500, batch_size=50,
+                         workers=None, rate=None):
+    """Send today's overdue notices, see the module docstring. Counts what happened."""
+    now = now or timezone.now()
+    day = timezone.localdate(now)
+    workers = workers or settings.NOTICE_WORKERS
+    limiter = RateLimiter(settings.NOTICE_RATE if rate is None else rate)
+    stats = Counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for borrower_ids in borrower_chunks(now, chunk_size):
+            notices = claim(borrower_ids, day)
+            stats['skipped'] += len(borrower_ids) - len(notices)
+            messages = render(notices, now)
+            batches = [messages[i:i + batch_size]
+                       for i in range(0, len(messages), batch_size)]
+            errors = {}
+            for batch_errors in pool.map(partial(deliver, limiter=limiter), batches):
+                errors.update(batch_errors)
+
+            sent_at = timezone.now()
+            for notice, message in messages:
+                if notice in errors:
+                    notice.status, notice.error = OverdueNotice.FAILED, errors[notice]
+                else:
+                    notice.status, notice.error, notice.sent_at = OverdueNotice.SENT, '', sent_at
+            OverdueNotice.objects.bulk_update(
+                [notice for notice, message in messages],
+                ['status', 'error', 'sent_at', 'loans', 'amount'])
+            # Claimed borrowers whose loans were all returned meanwhile.
+            rendered = {notice.pk for notice, message in messages}
+            OverdueNotice.objects.filter(
+                pk__in=[notice.pk for notice in notices if notice.pk not in rendered]
+            ).delete()
+            stats['sent'] += len(messages) - len(errors)
+            stats['failed'] += len(errors)
+    return stats
@@ -0,0 +1,26 @@
+"""
+Entry points run inside the report worker processes.
+
+This module is imported by freshly spawned interpreters before Django is
+set up, so it must not import models (or anything importing them) at the
+top level.
+"""
+import os
+
+
+def init(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def build_report(*args):
+    from django.db import close_old_connections
+
+    from .reports import build_report
+
+    close_old_connections()
+    try:
+        build_report(*args)
+    finally:
+        close_old_connections()
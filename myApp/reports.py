@@ -0,0 +1,145 @@
+"""
+Background generation of the inventory PDF report.
+
+WeasyPrint runs in a small pool of worker processes (started with
+``spawn``, so no broker and no database connection is shared with the web
+process). A request only creates a ``ReportJob`` row and returns; the
+browser then polls the job and downloads the file when it is done.
+
+Finished reports are reused for as long as the inventory they were built
+from does not change: every job is stamped with a hash of the rows and
+charts the report shows. Jobs that are still pending or running after
+``settings.REPORT_TIMEOUT`` seconds (a worker died, or the queue was
+dropped on restart) are marked failed and no longer reused.
+"""
+import atexit
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+import weasyprint
+
+from . import charts, report_worker
+from .models import Book, ReportJob
+
+
+_executor = None
+
+
+def get_executor():
+    """The process pool of this web process, created on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.REPORT_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=report_worker.init,
+            initargs=(os.environ.get('DJANGO_SETTINGS_MODULE',
+                                     'library_management.settings'),),
+        )
+        atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+    return _executor
+
+
+def submit(*args):
+    """Queue ``report_worker.build_report(*args)``, replacing a broken pool."""
+    global _executor
+    try:
+        return get_executor().submit(report_worker.build_report, *args)
+    except BrokenProcessPool:
+        # A worker died: the pool refuses new work until it is replaced.
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        return get_executor().submit(report_worker.build_report, *args)
+
+
+def expire_stale_jobs():
+    """Fail the jobs pending or running for longer than the timeout."""
+    now = timezone.now()
+    return ReportJob.objects.filter(
+        status__in=[ReportJob.PENDING, ReportJob.RUNNING],
+        created_at__lt=now - timedelta(seconds=settings.REPORT_TIMEOUT),
+    ).update(
+        status=ReportJob.FAILED,
+        error="The report did not finish in time.",
+        finished_at=now,
+    )
+
+
+def inventory_snapshot():
+    """Hash of everything the report shows."""
+    digest = hashlib.sha256()
+    rows = Book.objects.order_by('pk').values_list(
+        'pk', 'title', 'author__name', 'daily_rent', 'total_copies')
+    for row in rows.iterator(chunk_size=2000):
+        digest.update(repr(row).encode())
+    for key, svg in sorted(charts.report_charts().items()):
+        digest.update(svg.encode())
+    return digest.hexdigest()
+
+
+def request_report(user, base_url):
+    """
+    The job that holds (or will hold) the report of the current inventory.
+    A finished or running job for the same snapshot is reused, unless it
+    has been running for too long.
+    """
+    expire_stale_jobs()
+    snapshot = inventory_snapshot()
+    job = ReportJob.objects.filter(
+        snapshot=snapshot,
+        status__in=[ReportJob.PENDING, ReportJob.RUNNING, ReportJob.DONE],
+    ).first()
+    if job is not None:
+        if job.status != ReportJob.DONE or job.file.storage.exists(job.file.name):
+            return job
+        job.status = ReportJob.FAILED
+        job.error = "The report file is missing from storage."
+        job.save(update_fields=['status', 'error'])
+
+    job = ReportJob.objects.create(requested_by=user, snapshot=snapshot)
+    args = (job.pk, base_url)
+    if settings.REPORT_WORKERS:
+        transaction.on_commit(lambda: submit(*args))
+    else:
+        build_report(*args)
+        job.refresh_from_db()
+    return job
+
+
+def render_report(base_url):
+    """The report PDF as bytes."""
+    rendered = charts.report_charts()
+    context = {
+        "main_books": Book.objects.select_related('author').order_by('pk').iterator(
+            chunk_size=2000),
+        "charts": [rendered[key] for key, kind, title in charts.CHARTS],
+    }
+    html_string = render_to_string("myApp/books_report_pdf.html", context)
+    return weasyprint.HTML(string=html_string, base_url=base_url).write_pdf()
+
+
+def build_report(job_id, base_url):
+    """Render the report of ``job_id`` and store it, unless it expired."""
+    if not ReportJob.objects.filter(
+            pk=job_id, status=ReportJob.PENDING).update(status=ReportJob.RUNNING):
+        return
+    try:
+        pdf = render_report(base_url)
+        job = ReportJob.objects.get(pk=job_id)
+        job.file.save(f"books_report_{job.snapshot[:16]}.pdf",
+                      ContentFile(pdf), save=False)
+        job.status = ReportJob.DONE
+        job.finished_at = timezone.now()
+        job.save(update_fields=['file', 'status', 'finished_at'])
+    except Exception as e:
+        ReportJob.objects.filter(pk=job_id).update(
+            status=ReportJob.FAILED, error=repr(e), finished_at=timezone.now())
@@ -0,0 +1,182 @@
+"""
+Daily circulation rollups per book, author and user.
+
+``update`` reads the borrow and return events logged since its watermark
+(``Watermark`` named ``WATERMARK``), folds them into per-day sums in
+memory and adds those to ``BookDailyStats``, ``AuthorDailyStats`` and
+``UserDailyStats`` with one ``INSERT ... ON CONFLICT DO UPDATE`` per table
+and batch. The watermark moves in the same transaction, so every event is
+counted exactly once however often the job runs; events backfilled into
+the log later are simply new events.
+
+Event ids are handed out before their transaction commits, so an event
+only counts once it is ``settle`` seconds old: a smaller id that is still
+uncommitted by then would belong to a transition running longer than that.
+
+Revenue is the fee charged on return and the overdue part of it, on the
+day of the return. Dashboards (``analytics``) and reports sum the rollups
+over any range of days, which only reads the rows of those days.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import stats_cache
+from .models import (
+    ArchivedBorrowRecord, AuthorDailyStats, Book, BookDailyStats, BorrowRecord,
+    CirculationEvent, UserDailyStats, Watermark
+)
+
+
+WATERMARK = 'daily_rollups'
+TABLES = {
+    'book': (BookDailyStats, 'book_id'),
+    'author': (AuthorDailyStats, 'author_id'),
+    'user': (UserDailyStats, 'user_id'),
+}
+MEASURES = ['loans', 'returns', 'revenue', 'overdue_fees']
+
+
+def _return_fees(record_ids):
+    """``{record id: (total fee, overdue days)}``, live loans or archived."""
+    fees = {}
+    for model in (BorrowRecord, ArchivedBorrowRecord):
+        missing = [pk for pk in record_ids if pk not in fees]
+        if missing:
+            fees.update(
+                (pk, (total_fee, overdue_days)) for pk, total_fee, overdue_days in
+                model.objects.filter(pk__in=missing).values_list(
+                    'pk', 'total_fee', 'overdue_days'))
+    return fees
+
+
+def fold(events):
+    """
+    Sum borrow and return ``events`` (dicts) into ``{table: {(key, day):
+    [loans, returns, revenue, overdue_fees]}}``. Events of deleted books or
+    users are left out of those rollups.
+    """
+    books = {
+        pk: (author_id, daily_rent) for pk, author_id, daily_rent in
+        Book.objects.filter(pk__in={event['book_id'] for event in events})
+        .values_list('pk', 'author_id', 'daily_rent')
+    }
+    users = set(get_user_model().objects.filter(
+        pk__in={event['user_id'] for event in events}).values_list('pk', flat=True))
+    fees = _return_fees([
+        event['record_id'] for event in events
+        if event['kind'] == CirculationEvent.RETURN and event['record_id']])
+
+    sums = {table: defaultdict(lambda: [0, 0, Decimal(0), Decimal(0)]) for table in TABLES}
+    for event in events:
+        if event['book_id'] not in books:
+            continue
+        author_id, daily_rent = books[event['book_id']]
+        if event['kind'] == CirculationEvent.BORROW:
+            delta = (1, 0, 0, 0)
+        else:
+            total_fee, overdue_days = fees.get(event['record_id'], (0, 0))
+            delta = (0, 1, total_fee, overdue_days * daily_rent * 2)
+        day = timezone.localdate(event['occurred_at'])
+        keys = {'book': event['book_id'], 'author': author_id}
+        if event['user_id'] in users:
+            keys['user'] = event['user_id']
+        for table, key in keys.items():
+            row = sums[table][key, day]
+            for i, value in enumerate(delta):
+                row[i] += value
+    return sums
+
+
+def _upsert(model, key_column, sums):
+    """Add ``sums`` to the rows of ``model``, creating the missing ones."""
+    if not sums:
+        return
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = [key_column, 'day', *MEASURES]
+    sql = (
+        f'INSERT INTO {table} ({", ".join(qn(c) for c in columns)}) '
+        f'VALUES ({", ".join(["%s"] * len(columns))}) '
+        f'ON CONFLICT ({qn(key_column)}, {qn("day")}) DO UPDATE SET ' +
+        ', '.join(f'{qn(c)} = {table}.{qn(c)} + EXCLUDED.{qn(c)}' for c in MEASURES)
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            (key, day, loans, returns, revenue, overdue_fees)
+            for (key, day), (loans, returns, revenue, overdue_fees) in sums.items()
+        ])
+
+
+def settle_seconds():
+    return getattr(settings, 'ROLLUP_SETTLE_SECONDS', 30)
+
+
+def update(batch_size=5000, max_batches=None, settle=None, now=None):
+    """
+    Fold the settled events logged since the watermark into the rollups, a
+    batch per transaction. Returns the number of events folded in.
+    """
+    settle = settle_seconds() if settle is None else settle
+    settled = (now or timezone.now()) - timedelta(seconds=settle)
+    folded = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            Watermark.objects.get_or_create(name=WATERMARK)
+            # Taken for update: concurrent runs wait instead of double counting.
+            watermark = Watermark.objects.select_for_update().get(name=WATERMARK)
+            batch = list(
+                CirculationEvent.objects.filter(
+                    pk__gt=watermark.position,
+                    kind__in=[CirculationEvent.BORROW, CirculationEvent.RETURN],
+                ).order_by('pk').values(
+                    'pk', 'kind', 'occurred_at', 'book_id', 'user_id', 'record_id'
+                )[:batch_size])
+            events = []
+            for event in batch:
+                if event['occurred_at'] >= settled:
+                    break
+                events.append(event)
+            if not events:
+                break
+            for table, sums in fold(events).items():
+                _upsert(*TABLES[table], sums)
+            watermark.position = events[-1]['pk']
+            watermark.save(update_fields=['position', 'updated_at'])
+            transaction.on_commit(stats_cache.invalidate)
+        folded += len(events)
+        batches += 1
+        if len(events) < batch_size:
+            break
+    return folded
+
+
+def rebuild(**kwargs):
+    """Empty the rollups and fold the whole circulation log in again."""
+    with transaction.atomic():
+        for model, key_column in TABLES.values():
+            model.objects.all().delete()
+        Watermark.objects.update_or_create(name=WATERMARK, defaults={'position': 0})
+    return update(**kwargs)
+
+
+def totals(table, since=None, until=None, top=10):
+    """
+    The ``top`` keys of a rollup table by revenue over the days from
+    ``since`` to ``until`` (inclusive), with their summed measures.
+    """
+    model, key_column = TABLES[table]
+    rows = model.objects.order_by()
+    if since:
+        rows = rows.filter(day__gte=since)
+    if until:
+        rows = rows.filter(day__lte=until)
+    rows = rows.values(key_column).annotate(
+        **{measure: Sum(measure) for measure in MEASURES})
+    return list(rows.order_by('-revenue', '-loans', key_column)[:top])
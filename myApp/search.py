@@ -0,0 +1,165 @@
+"""
+Full-text search over book titles and author names.
+
+On Postgres the title and the author name each have a GIN index on their
+``to_tsvector`` (built from the same ``SearchVector`` expressions the
+queries use, so the planner matches them). A book matches when either
+vector matches; matches are ranked with title hits weighted above author
+hits.
+
+On SQLite the same search runs on an FTS5 table, ``myApp_book_fts``, kept
+in sync with the book and author tables by triggers (so bulk writes are
+covered too) and ranked with ``bm25``. Other backends, or an SQLite build
+without FTS5, fall back to ``icontains``.
+
+``install`` creates the indexes, the FTS table and its triggers. It runs
+after ``migrate`` (see ``signals``) and is idempotent. The triggers tie the
+book and author tables together, which breaks SQLite's table rebuilds, so
+``uninstall`` drops them and the FTS table before ``migrate``.
+"""
+import re
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import DatabaseError, connection
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Author, Book
+
+
+CONFIG = 'simple'
+FTS_TABLE = 'myApp_book_fts'
+
+TITLE_VECTOR = SearchVector('title', config=CONFIG)
+AUTHOR_VECTOR = SearchVector('name', config=CONFIG)
+INDEXES = [
+    (Book, GinIndex(TITLE_VECTOR, name='book_title_search')),
+    (Author, GinIndex(AUTHOR_VECTOR, name='author_name_search')),
+]
+
+SQLITE_SETUP = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS "{FTS_TABLE}" USING fts5(
+        title, author, tokenize = 'unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_ai" AFTER INSERT ON "myApp_book"
+    BEGIN
+        INSERT INTO "{FTS_TABLE}" (rowid, title, author)
+        SELECT new.id, new.title, name FROM "myApp_author" WHERE id = new.author_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_au"
+    AFTER UPDATE OF title, author_id ON "myApp_book"
+    BEGIN
+        DELETE FROM "{FTS_TABLE}" WHERE rowid = old.id;
+        INSERT INTO "{FTS_TABLE}" (rowid, title, author)
+        SELECT new.id, new.title, name FROM "myApp_author" WHERE id = new.author_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_ad" AFTER DELETE ON "myApp_book"
+    BEGIN
+        DELETE FROM "{FTS_TABLE}" WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_author_au"
+    AFTER UPDATE OF name ON "myApp_author"
+    BEGIN
+        UPDATE "{FTS_TABLE}" SET author = new.name
+        WHERE rowid IN (SELECT id FROM "myApp_book" WHERE author_id = new.id);
+    END""",
+]
+SQLITE_TEARDOWN = [
+    f'DROP TRIGGER IF EXISTS "{FTS_TABLE}_ai"',
+    f'DROP TRIGGER IF EXISTS "{FTS_TABLE}_au"',
+    f'DROP TRIGGER IF EXISTS "{FTS_TABLE}_ad"',
+    f'DROP TRIGGER IF EXISTS "{FTS_TABLE}_author_au"',
+    f'DROP TABLE IF EXISTS "{FTS_TABLE}"',
+]
+
+
+_fts_tables = {}
+
+
+def _has_fts_table():
+    """Whether this database has the FTS table, looked up once per database."""
+    name = connection.settings_dict['NAME']
+    if not _fts_tables.get(name):
+        _fts_tables[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[name]
+
+
+def install(rebuild=False):
+    """Create the search indexes of the current backend if they are missing."""
+    if connection.vendor == 'postgresql':
+        with connection.schema_editor() as editor, connection.cursor() as cursor:
+            for model, index in INDEXES:
+                existing = connection.introspection.get_constraints(
+                    cursor, model._meta.db_table)
+                if index.name not in existing:
+                    editor.add_index(model, index)
+    elif connection.vendor == 'sqlite':
+        _fts_tables.pop(connection.settings_dict['NAME'], None)
+        created = not _has_fts_table()
+        try:
+            with connection.cursor() as cursor:
+                for statement in SQLITE_SETUP:
+                    cursor.execute(statement)
+                if created or rebuild:
+                    cursor.execute(f'DELETE FROM "{FTS_TABLE}"')
+                    cursor.execute(
+                        f'INSERT INTO "{FTS_TABLE}" (rowid, title, author) '
+                        'SELECT b.id, b.title, a.name FROM "myApp_book" b '
+                        'JOIN "myApp_author" a ON a.id = b.author_id')
+            _fts_tables[connection.settings_dict['NAME']] = True
+        except DatabaseError:
+            # SQLite built without FTS5: search() falls back to icontains.
+            pass
+
+
+def uninstall():
+    """Drop the FTS table and its triggers; ``install`` rebuilds them."""
+    if connection.vendor != 'sqlite':
+        return
+    _fts_tables.pop(connection.settings_dict['NAME'], None)
+    with connection.cursor() as cursor:
+        for statement in SQLITE_TEARDOWN:
+            cursor.execute(statement)
+
+
+def _fts_query(text):
+    """Every word of ``text`` as a quoted FTS5 prefix term, all required."""
+    words = re.findall(r'\w+', text)
+    return ' '.join('"%s"*' % word.replace('"', '""') for word in words)
+
+
+def search(text, queryset=None):
+    """
+    Books matching ``text`` in their title or author name, best first, with
+    the author selected and a ``rank`` annotation.
+    """
+    books = (queryset if queryset is not None else Book.objects.all()).select_related('author')
+    text = text.strip()
+
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(text, config=CONFIG, search_type='websearch')
+        # Matching authors first, so both halves of the OR below are index
+        # conditions on the book table (GIN on the title, the author FK).
+        author_ids = list(Author.objects.annotate(
+            vector=AUTHOR_VECTOR).filter(vector=query).values_list('pk', flat=True))
+        rank = (SearchRank(SearchVector('title', config=CONFIG, weight='A'), query)
+                + SearchRank(SearchVector('author__name', config=CONFIG, weight='B'), query))
+        return books.annotate(vector=TITLE_VECTOR).filter(
+            Q(vector=query) | Q(author_id__in=author_ids)
+        ).annotate(rank=rank).order_by('-rank', 'pk')
+
+    match = _fts_query(text)
+    if connection.vendor == 'sqlite' and match and _has_fts_table():
+        matches = RawSQL(
+            f'SELECT rowid FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH %s', [match])
+        # bm25 is lower for better matches; title hits weigh twice as much.
+        rank = RawSQL(
+            f'SELECT -bm25("{FTS_TABLE}", 2.0, 1.0) FROM "{FTS_TABLE}" '
+            f'WHERE "{FTS_TABLE}" MATCH %s AND rowid = "myApp_book"."id"',
+            [match], output_field=FloatField())
+        return books.filter(pk__in=matches).annotate(rank=rank).order_by('-rank', 'pk')
+
+    words = re.findall(r'\w+', text)
+    for word in words:
+        books = books.filter(Q(title__icontains=word) | Q(author__name__icontains=word))
+    return books.annotate(rank=Value(0.0)).order_by(F('title').asc())
@@ -0,0 +1,206 @@
+"""
+Borrow and return transitions for book copies.
+
+Every transition runs in one transaction. A free copy is picked with
+``select_for_update(skip_locked=True)`` so concurrent borrowers never wait
+on (or grab) the same row, and it is claimed with a conditional UPDATE so
+the check-out stays correct on backends without row locks (SQLite). The
+same UPDATE points the copy at its loan (``BookCopy.current_loan``), and
+the transaction appends the transition to the ``CirculationEvent`` log.
+"""
+import random
+import time
+from functools import partial
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+from . import stats_cache
+from .models import Book, BookCopy, BorrowRecord, CirculationEvent
+
+
+class CirculationError(Exception):
+    """Base error for a borrow/return transition that cannot happen."""
+
+
+class NoCopyAvailable(CirculationError):
+    pass
+
+
+class AlreadyBorrowed(CirculationError):
+    def __init__(self, record):
+        self.record = record
+        super().__init__(
+            f"User ({record.borrower.username}) borrowed the book "
+            f"({record.book_copy.book.title}) and should return it.")
+
+
+class NotBorrowed(CirculationError):
+    pass
+
+
+class WrongBorrower(CirculationError):
+    pass
+
+
+class _ClaimLost(Exception):
+    """Another transaction claimed the row between our read and write."""
+
+
+def _with_retry(func, attempts):
+    """Run ``func`` again when it loses a race or hits a lock error."""
+    for attempt in range(1, attempts + 1):
+        try:
+            return func()
+        except (_ClaimLost, OperationalError):
+            if attempt == attempts:
+                raise CirculationError(
+                    "The book is busy right now, please try again.")
+            time.sleep(random.uniform(0, 0.005 * 2 ** attempt))
+
+
+def _bump_versions():
+    """The UPDATEs below skip the signals, so move the versions here."""
+    transaction.on_commit(partial(stats_cache.bump, BookCopy, Book))
+
+
+def _claim(book_copy, record):
+    """Lend ``book_copy`` on ``record``, or raise if someone else did first."""
+    claimed = BookCopy.objects.filter(
+        pk=book_copy.pk, is_available=True
+    ).update(is_available=False, current_loan=record)
+    if not claimed:
+        raise _ClaimLost
+    book_copy.is_available = False
+    book_copy.current_loan = record
+    book_copy._loaded_state = (book_copy.book_id, False)
+    Book.adjust_counters(book_copy.book_id, available=-1)
+    _bump_versions()
+
+
+def _release(book_copy):
+    """Flip ``book_copy`` back to available if it is borrowed."""
+    released = BookCopy.objects.filter(
+        pk=book_copy.pk, is_available=False
+    ).update(is_available=True, current_loan=None)
+    book_copy.is_available = True
+    book_copy.current_loan = None
+    book_copy._loaded_state = (book_copy.book_id, True)
+    if released:
+        Book.adjust_counters(book_copy.book_id, available=1)
+        _bump_versions()
+
+
+def _lend(book_copy, user, rented_days):
+    """Open a loan of ``book_copy`` and claim the copy for it."""
+    record = BorrowRecord(book_copy=book_copy, borrower=user)
+    if rented_days:
+        record.rented_days = rented_days
+    try:
+        record.save()
+    except IntegrityError:
+        # Another open loan of the copy got in first (one_open_loan_per_copy).
+        raise _ClaimLost
+    _claim(book_copy, record)
+    CirculationEvent.log(CirculationEvent.BORROW, record, record.borrowed_at)
+    return record
+
+
+def borrow_book(book, user, rented_days=None, attempts=5):
+    """Check out any free copy of ``book`` to ``user``."""
+    def attempt():
+        with transaction.atomic():
+            book_copy = (
+                BookCopy.objects.select_for_update(skip_locked=True)
+                .filter(book=book, is_available=True)
+                .order_by('pk')
+                .first()
+            )
+            if book_copy is None:
+                raise NoCopyAvailable(
+                    "Unfortunately there is no any available copy of this book.")
+            return _lend(book_copy, user, rented_days)
+
+    return _with_retry(attempt, attempts)
+
+
+def borrow_copy(book_copy, user, rented_days=None, attempts=5):
+    """Check out the scanned ``book_copy`` to ``user``."""
+    def attempt():
+        with transaction.atomic():
+            locked = (
+                BookCopy.objects.select_for_update(of=('self',))
+                .select_related('book')
+                .get(pk=book_copy.pk)
+            )
+            if not locked.is_available:
+                record = open_record_for(locked)
+                if record is not None:
+                    raise AlreadyBorrowed(record)
+                raise NoCopyAvailable("This book is out of stock.")
+            return _lend(locked, user, rented_days)
+
+    return _with_retry(attempt, attempts)
+
+
+def return_record(record, user=None, any_borrower=True, attempts=5):
+    """
+    Close the open ``record`` and free its copy. The record has to belong to
+    ``user`` unless ``any_borrower`` is set and no user is given.
+    """
+    def attempt():
+        with transaction.atomic():
+            locked = (
+                BorrowRecord.objects.select_for_update(of=('self',))
+                .select_related('book_copy', 'book_copy__book', 'borrower')
+                .get(pk=record.pk)
+            )
+            if locked.returned_at:
+                raise NotBorrowed(
+                    f"This book ({locked.book_copy.book.title}) is not borrowed.")
+            if (user is not None or not any_borrower) and \
+                    locked.borrower_id != getattr(user, 'pk', None):
+                raise WrongBorrower(
+                    f"This book ({locked.book_copy.book.title}) is borrowerd by another user.")
+            locked.returned_at = timezone.now()
+            fees = locked.get_total_debt_till_now()
+            locked.total_fee = locked.accrued_fee = fees['total']
+            locked.overdue_days = fees['overdue_days']
+            locked.fees_as_of = locked.returned_at.date()
+            locked.save(update_fields=[
+                'returned_at', 'total_fee', 'accrued_fee', 'overdue_days', 'fees_as_of'])
+            _release(locked.book_copy)
+            CirculationEvent.log(CirculationEvent.RETURN, locked, locked.returned_at)
+            return locked
+
+    return _with_retry(attempt, attempts)
+
+
+def return_copy(book_copy, user=None, any_borrower=True, attempts=5):
+    """Return the open loan of the scanned ``book_copy``."""
+    record = open_record_for(book_copy)
+    if record is None:
+        raise NotBorrowed(f"This book ({book_copy.book.title}) is not borrowed.")
+    return return_record(record, user=user, any_borrower=any_borrower,
+                         attempts=attempts)
+
+
+def release_deleted_loan(record):
+    """
+    Free the copy of ``record`` if it was still lent on it. For open loans
+    deleted outside the desk: from the admin or with their borrower.
+    """
+    if record.returned_at is not None:
+        return
+    book_copy = BookCopy.objects.filter(pk=record.book_copy_id).first()
+    if book_copy is not None:
+        _release(book_copy)
+
+
+def open_record_for(book_copy):
+    """The loan that currently holds ``book_copy``, if any."""
+    return (
+        BorrowRecord.objects.select_related('borrower', 'book_copy__book')
+        .filter(held_copy=book_copy)
+        .first()
+    )
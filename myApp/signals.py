@@ -0,0 +1,100 @@
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import archive, autocomplete, scan, search, services, stats_cache
+from .models import Author, Book, BookCopy, BorrowRecord, CirculationEvent
+
+
+@receiver(post_save, sender=BookCopy)
+@receiver(post_delete, sender=BookCopy)
+def forget_barcode(sender, instance, **kwargs):
+    """Evict the copy from this process's barcode cache."""
+    if instance.barcode:
+        scan.barcode_cache.discard(instance.barcode)
+
+
+@receiver(post_delete, sender=BookCopy)
+def release_copy_counters(sender, instance, **kwargs):
+    """Take a deleted copy out of its book's counters and log it."""
+    Book.adjust_counters(
+        instance.book_id,
+        total=-1,
+        available=-int(bool(instance.is_available))
+    )
+    CirculationEvent.stock([instance], -1)
+
+
+@receiver(post_delete, sender=BorrowRecord)
+def release_loan_copy(sender, instance, origin=None, **kwargs):
+    """Free the copy of a deleted open loan, unless the copy goes too."""
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model in (Author, Book, BookCopy):
+        # The copy's own delete handler takes it out of the counters.
+        return
+    services.release_deleted_loan(instance)
+
+
+@receiver(post_delete, sender=Book)
+def release_book_counter(sender, instance, **kwargs):
+    """Take a deleted book out of its author's counter."""
+    Author.adjust_counters(instance.author_id, books=-1)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=BookCopy)
+@receiver(post_save, sender=BorrowRecord)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=BookCopy)
+@receiver(post_delete, sender=BorrowRecord)
+def invalidate_stats(sender, **kwargs):
+    """Drop the cached dashboard statistics once the change is committed."""
+    transaction.on_commit(stats_cache.invalidate)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=BookCopy)
+@receiver(post_save, sender=BorrowRecord)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=BookCopy)
+@receiver(post_delete, sender=BorrowRecord)
+@receiver(post_delete, sender=User)
+def bump_version(sender, update_fields=None, **kwargs):
+    """Move the model to a new data version once the change is committed."""
+    if sender is User and update_fields and set(update_fields) == {'last_login'}:
+        # Every login saves last_login, which no payload shows.
+        return
+    transaction.on_commit(partial(stats_cache.bump, sender))
+
+
+def remove_indexes(sender, using='default', **kwargs):
+    """
+    Drop the SQLite search triggers and the loan history view before the
+    schema changes: they read the book, author and loan tables, so
+    rebuilding or retyping those would fail. Connected to ``pre_migrate``
+    of this app in ``MyappConfig.ready``.
+    """
+    if using == 'default':
+        search.uninstall()
+        archive.uninstall()
+
+
+def install_indexes(sender, using='default', **kwargs):
+    """
+    Create the full-text search and autocomplete indexes and the loan history
+    view once the tables exist. Connected to ``post_migrate`` of this app in
+    ``MyappConfig.ready``.
+    """
+    if using == 'default':
+        search.install()
+        autocomplete.install()
+        archive.install()
@@ -0,0 +1,127 @@
+"""
+Data versions, and the cache of the dashboard statistics built on them.
+
+Cached payloads are keyed by a data version. Saves and deletes of the
+models the charts are built from bump the version once their transaction
+commits (see ``signals``), so stale entries are never read again and simply
+expire. The version doubles as the ETag and its bump time as the
+Last-Modified date of ``chart_data``.
+
+Every model the API serves also has a version of its own, moved by
+``bump`` on the same signals (writes that skip the signals call it
+themselves): anything derived from a set of models, like the API payloads
+(``api.caching``), is cached under ``get_versions`` of those models.
+
+The backend is the cache alias named by ``settings.STATS_CACHE_ALIAS``.
+Use a shared backend (Redis) when running several workers: a local memory
+cache only sees the bumps made by its own process.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import analytics
+
+
+VERSION_KEY = 'stats:version'
+MODIFIED_KEY = 'stats:modified'
+
+
+def get_cache():
+    return caches[getattr(settings, 'STATS_CACHE_ALIAS', 'default')]
+
+
+def cache_timeout():
+    return getattr(settings, 'STATS_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def _start(cache, key):
+    """A fresh version under ``key``, unless another process set one first."""
+    # Start from the clock so a lost counter never reuses old keys.
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+def _move(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def current_version():
+    """The data version, starting a fresh one if the cache lost it."""
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = _start(cache, VERSION_KEY)
+        cache.add(MODIFIED_KEY, time.time(), timeout=None)
+    return version
+
+
+def last_modified():
+    stamp = get_cache().get(MODIFIED_KEY)
+    if stamp is None:
+        current_version()
+        stamp = get_cache().get(MODIFIED_KEY) or time.time()
+    return datetime.fromtimestamp(int(stamp), tz=dt_timezone.utc)
+
+
+def invalidate():
+    """Move to a new data version."""
+    cache = get_cache()
+    _move(cache, VERSION_KEY)
+    cache.set(MODIFIED_KEY, time.time(), timeout=None)
+
+
+def _model_key(model):
+    return f'version:{model._meta.label_lower}'
+
+
+def get_versions(*models):
+    """The versions of ``models`` in order, read in one cache round trip."""
+    cache = get_cache()
+    keys = [_model_key(model) for model in models]
+    found = cache.get_many(keys)
+    return [found[key] if key in found else _start(cache, key) for key in keys]
+
+
+def bump(*models):
+    """Move ``models`` to new versions."""
+    cache = get_cache()
+    for model in models:
+        _move(cache, _model_key(model))
+
+
+def _digest(params):
+    return hashlib.md5(repr(sorted(params.items())).encode()).hexdigest()[:16]
+
+
+def etag(params):
+    """ETag of the statistics for the given query parameters."""
+    return f'"stats-{current_version()}-{_digest(params)}"'
+
+
+def chart_series(**params):
+    """``analytics.chart_series`` served from the cache when possible."""
+    cache = get_cache()
+    key = f'stats:charts:{current_version()}:{_digest(params)}'
+    payload = cache.get(key)
+    if payload is None:
+        payload = analytics.chart_series(**params)
+        cache.set(key, payload, timeout=cache_timeout())
+    return payload
+
+
+async def achart_series(**params):
+    """``chart_series`` through the async cache API and the async ORM."""
+    cache = get_cache()
+    key = f'stats:charts:{current_version()}:{_digest(params)}'
+    payload = await cache.aget(key)
+    if payload is None:
+        payload = await analytics.achart_series(**params)
+        await cache.aset(key, payload, timeout=cache_timeout())
+    return payload
@@ -0,0 +1,27 @@
+from django import template
+
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def url_replace(context, *pairs, **kwargs):
+    """
+    The current query string with the given parameters replaced. Names can
+    also be passed positionally as ``name value`` pairs.
+    """
+    query = context['request'].GET.copy()
+    kwargs.update(zip(pairs[::2], pairs[1::2]))
+    for key, value in kwargs.items():
+        if value in (None, ''):
+            query.pop(key, None)
+        else:
+            query[key] = value
+    return query.urlencode()
+
+
+@register.simple_tag(takes_context=True)
+def sort_param(context, name, field):
+    """Toggle between ascending and descending sort on ``field``."""
+    current = context['request'].GET.get(name, '')
+    return f'-{field}' if current == field else field
@@ -1,3 +1,582 @@
-from django.test import TestCase
+import io
+import threading
+from collections import Counter
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User, update_last_login
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import (
+    archive, autocomplete, events, fees, notices, reports, rollups, scan, search,
+    services, signals, stats_cache
+)
+from .forms import BookForm
+from .models import (
+    Author, Book, BookCopy, BookDailyStats, BorrowRecord, CirculationEvent,
+    LoanHistory, OverdueNotice, ReportJob
+)
+
+
+def make_book(title='Dune', copies=1):
+    author, _ = Author.objects.get_or_create(name='Frank Herbert')
+    book = Book.objects.create(title=title, author=author)
+    for i in range(copies):
+        BookCopy.objects.create(book=book, barcode=f'{title}-{i}')
+    return book
+
+
+class ConcurrentBorrowTests(TransactionTestCase):
+    """``services`` under real concurrent transactions, one thread per user."""
+
+    def run_threads(self, users, work):
+        gate = threading.Barrier(len(users))
+        errors = []
+
+        def run(user):
+            try:
+                gate.wait()
+                work(user)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def assert_no_double_checkout(self, book):
+        doubled = (
+            BorrowRecord.objects.filter(returned_at__isnull=True)
+            .values('book_copy').annotate(n=Count('pk')).filter(n__gt=1)
+        )
+        self.assertFalse(doubled.exists())
+        book.refresh_from_db()
+        self.assertEqual(
+            book.available_copies,
+            BookCopy.objects.filter(book=book, is_available=True).count())
+        for book_copy in BookCopy.objects.filter(book=book):
+            self.assertEqual(book_copy.is_available, book_copy.current_loan_id is None)
+
+    def test_more_borrowers_than_copies(self):
+        book = make_book(copies=3)
+        users = [User.objects.create(username=f'reader-{i}') for i in range(8)]
+        outcomes = Counter()
+
+        def borrow(user):
+            try:
+                services.borrow_book(book, user)
+                outcomes['borrowed'] += 1
+            except services.CirculationError:
+                outcomes['refused'] += 1
+
+        self.run_threads(users, borrow)
+        self.assertEqual(outcomes['borrowed'] + outcomes['refused'], 8)
+        self.assertIn(outcomes['borrowed'], (1, 2, 3))
+        self.assertEqual(
+            BorrowRecord.objects.filter(returned_at__isnull=True).count(),
+            outcomes['borrowed'])
+        self.assert_no_double_checkout(book)
+
+    def test_borrow_and_return_rounds(self):
+        book = make_book(copies=2)
+        users = [User.objects.create(username=f'reader-{i}') for i in range(6)]
+
+        def rounds(user):
+            for _ in range(5):
+                try:
+                    record = services.borrow_book(book, user)
+                except services.CirculationError:
+                    continue
+                services.return_record(record, user=user, attempts=20)
+
+        self.run_threads(users, rounds)
+        self.assertFalse(BorrowRecord.objects.filter(returned_at__isnull=True).exists())
+        self.assert_no_double_checkout(book)
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 2)
+
+
+class ChartDataTests(TestCase):
+    def test_top_must_be_a_positive_number(self):
+        for top in ('-1', '0', 'abc'):
+            response = self.client.get(reverse('myApp:chart_data'), {'top': top})
+            self.assertEqual(response.status_code, 400, top)
+        response = self.client.get(reverse('myApp:chart_data'), {'top': '2'})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(REPORT_WORKERS=1, REPORT_TIMEOUT=600)
+class ReportJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='librarian', is_staff=True)
+
+    def pending_job(self, age):
+        job = ReportJob.objects.create(snapshot=reports.inventory_snapshot())
+        ReportJob.objects.filter(pk=job.pk).update(
+            created_at=timezone.now() - timedelta(seconds=age))
+        return job
+
+    def test_running_job_is_reused(self):
+        job = self.pending_job(age=60)
+        self.assertEqual(reports.request_report(self.user, 'http://testserver/'), job)
+
+    def test_stuck_job_is_failed_and_replaced(self):
+        job = self.pending_job(age=601)
+        new = reports.request_report(self.user, 'http://testserver/')
+        self.assertNotEqual(new, job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.FAILED)
+        # A queued build that starts after all leaves the failed job alone.
+        reports.build_report(job.pk, 'http://testserver/')
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.FAILED)
+
+    def test_broken_pool_is_replaced(self):
+        broken, fresh = mock.Mock(), mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool
+        self.addCleanup(setattr, reports, '_executor', None)
+        reports._executor = broken
+        with mock.patch.object(reports, 'ProcessPoolExecutor', return_value=fresh):
+            reports.submit(1, 'http://testserver/')
+        broken.shutdown.assert_called_once()
+        fresh.submit.assert_called_once_with(
+            reports.report_worker.build_report, 1, 'http://testserver/')
+        self.assertIs(reports._executor, fresh)
+
+
+class ScanTests(TestCase):
+    def test_due_date_is_the_stored_one(self):
+        book = make_book()
+        record = services.borrow_book(book, User.objects.create(username='reader'))
+        due_at = record.borrowed_at + timedelta(days=30)
+        BorrowRecord.objects.filter(pk=record.pk).update(due_at=due_at)
+        row = scan.lookup(record.book_copy.barcode)
+        self.assertEqual(scan.as_json(row)['loan']['due_at'], due_at)
+
+
+class ApiFilterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create(username='librarian', is_staff=True))
+
+    def test_id_filters_must_be_numbers(self):
+        for name, param in (('book-list', 'author'), ('copy-list', 'book'),
+                            ('loan-list', 'user')):
+            url = reverse(f'myApp_api:{name}')
+            response = self.client.get(url, {param: 'abc'})
+            self.assertEqual(response.status_code, 400, name)
+            self.assertIn(param, response.json())
+            self.assertEqual(self.client.get(url, {param: '1'}).status_code, 200)
+
+
+class ApiCachingTests(TestCase):
+    def setUp(self):
+        stats_cache.get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create(username='librarian', is_staff=True))
+        self.book = make_book()
+        self.url = reverse('myApp_api:book-list')
+
+    def get_book(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        return response, response.data['results'][0] if response.data else None
+
+    def test_repeated_and_conditional_polls_run_no_queries(self):
+        response, book = self.get_book()
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            again, cached = self.get_book()
+            conditional = self.client.get(
+                self.url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual((again.status_code, cached), (200, book))
+        self.assertEqual(again['ETag'], response['ETag'])
+        self.assertEqual(conditional.status_code, 304)
+
+    def test_new_copy_rebuilds_the_books_payload(self):
+        response, book = self.get_book()
+        self.assertEqual(book['total_copies'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            BookCopy.objects.create(book=self.book, barcode='Dune-new')
+        changed, book = self.get_book(**{'If-None-Match': response['ETag']})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual((book['total_copies'], book['stock']), (2, 2))
+
+    def test_loan_rebuilds_the_books_payload(self):
+        response, book = self.get_book()
+        with self.captureOnCommitCallbacks(execute=True):
+            services.borrow_book(self.book, User.objects.create(username='reader'))
+        changed, book = self.get_book(**{'If-None-Match': response['ETag']})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(book['stock'], 0)
+
+    def test_login_keeps_the_user_version(self):
+        user = User.objects.create(username='reader')
+        before = stats_cache.get_versions(User)
+        with self.captureOnCommitCallbacks(execute=True):
+            update_last_login(None, user)
+        self.assertEqual(stats_cache.get_versions(User), before)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.email = 'reader@example.com'
+            user.save()
+        self.assertNotEqual(stats_cache.get_versions(User), before)
+
+
+class UniqueTitleTests(TestCase):
+    def setUp(self):
+        self.book = make_book()
+
+    def test_form_reports_the_clash_on_title(self):
+        form = BookForm(data={
+            'title': 'DUNE', 'author': self.book.author_id, 'daily_rent': 1})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors, {'title': ['We already have this book.']})
+        form = BookForm(instance=self.book, data={
+            'title': 'dune', 'author': self.book.author_id, 'daily_rent': 1})
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_api_answers_a_clash_with_a_400(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='librarian', is_staff=True))
+        url = reverse('myApp_api:book-list')
+        response = client.post(url, {
+            'title': 'DUNE', 'author': self.book.author_id, 'daily_rent': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('title', response.json())
+        response = client.patch(
+            reverse('myApp_api:book-detail', args=[self.book.pk]), {'title': 'dune'})
+        self.assertEqual(response.status_code, 200)
+
+
+class ArchivedLoanApiTests(TestCase):
+    def test_archived_loans_on_request(self):
+        stats_cache.get_cache().clear()
+        reader = User.objects.create(username='reader')
+        record = services.borrow_book(make_book(), reader)
+        services.return_record(record)
+        with self.captureOnCommitCallbacks(execute=True):
+            archive.archive(before=timezone.now() + timedelta(seconds=1))
+        client = APIClient()
+        client.force_authenticate(reader)
+        url = reverse('myApp_api:loan-list')
+        self.assertEqual(client.get(url).json()['results'], [])
+        loans = client.get(url, {'include_archived': 'true'}).json()['results']
+        self.assertEqual([loan['id'] for loan in loans], [record.pk])
+        self.assertEqual(loans[0]['borrower'], 'reader')
+
+
+class BarcodeImageTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create(username='reader'))
+
+    def test_unknown_barcode_is_a_404_even_when_conditional(self):
+        url = reverse('myApp:barcode_image', args=['NOPE-1', 'svg'])
+        response = self.client.get(url, headers={'If-None-Match': '"svg-NOPE-1"'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_known_barcode_is_revalidated(self):
+        make_book()
+        url = reverse('myApp:barcode_image', args=['Dune-0', 'svg'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+
+class CopyApiTests(TestCase):
+    def setUp(self):
+        stats_cache.get_cache().clear()
+        services.borrow_book(make_book(), User.objects.create(username='alice'))
+        self.url = reverse('myApp_api:copy-list')
+
+    def copies_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(self.url).json()['results']
+
+    def test_only_staff_see_who_holds_a_copy(self):
+        staff = User.objects.create(username='librarian', is_staff=True)
+        self.assertEqual(self.copies_for(staff)[0]['current_borrower'], 'alice')
+        # Asked after staff, so a shared cache entry would leak here.
+        [copy] = self.copies_for(User.objects.create(username='bob'))
+        self.assertNotIn('current_borrower', copy)
+
+
+class SchemaChangeTests(TransactionTestCase):
+    """The objects created after ``migrate`` must not block later migrations."""
+
+    def alter(self, model, name, **changes):
+        old = model._meta.get_field(name)
+        new = old.clone()
+        new.set_attributes_from_name(name)
+        new.model = model
+        for attr, value in changes.items():
+            setattr(new, attr, value)
+        with connection.schema_editor() as editor:
+            editor.alter_field(model, old, new)
+        return new, old
+
+    def migrate(self, changes):
+        """Alter the fields like a migration, then put them back."""
+        signals.remove_indexes(sender=None)
+        altered = [(model, self.alter(model, name, **attrs))
+                   for model, name, attrs in changes]
+        for model, (new, old) in altered:
+            with connection.schema_editor() as editor:
+                editor.alter_field(model, new, old)
+        signals.install_indexes(sender=None)
+
+    def test_book_and_author_columns_can_change(self):
+        book = make_book()
+        search.install()
+        self.migrate([(Author, 'name', {'max_length': 300}),
+                      (Book, 'title', {'max_length': 300})])
+        self.assertEqual(list(search.search('herbert')), [book])
+        Author.objects.update(name='Brian Herbert')
+        self.assertEqual(list(search.search('brian dune')), [book])
+
+    def test_loan_columns_can_change(self):
+        record = services.borrow_book(make_book(), User.objects.create(username='reader'))
+        self.migrate([(BorrowRecord, 'total_fee', {'max_digits': 8})])
+        self.assertEqual(list(LoanHistory.objects.values_list('pk', flat=True)), [record.pk])
+
+
+class PrefixIndexTests(TestCase):
+    def setUp(self):
+        stats_cache.get_cache().clear()
+        self.author = Author.objects.create(name='Ursula K. Le Guin')
+        self.books = {
+            title: Book.objects.create(title=title, author=self.author)
+            for title in ('The Dispossessed', 'The Left Hand of Darkness',
+                          'Lathe of Heaven', 'Tehanu')
+        }
+
+    def titles(self, text, limit=10):
+        return [label for pk, label in autocomplete.complete('books', text, limit)]
+
+    def test_prefix_lookup_ignores_case(self):
+        self.assertEqual(self.titles('DISPO'), ['The Dispossessed'])
+        self.assertEqual(self.titles('the le'), ['The Left Hand of Darkness'])
+        self.assertEqual(self.titles('hand dark'), ['The Left Hand of Darkness'])
+        self.assertEqual(self.titles('spossessed'), [])
+
+    def test_labels_starting_with_the_text_come_first(self):
+        index = autocomplete.PrefixIndex(
+            [(1, 'Heaven'), (2, 'Lathe of Heaven'), (3, 'Heavy')])
+        self.assertEqual(index.search('hea', 10),
+                         [(3, 'Heavy'), (1, 'Heaven'), (2, 'Lathe of Heaven')])
+
+    def test_limit(self):
+        self.assertEqual(len(self.titles('the', limit=1)), 1)
+        self.assertEqual(len(self.titles('t', limit=2)), 2)
+        self.assertEqual(len(self.titles('t')), 3)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.assertEqual(self.titles('earthsea'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(title='A Wizard of Earthsea', author=self.author)
+        self.assertEqual(self.titles('earthsea'), ['A Wizard of Earthsea'])
+        with self.captureOnCommitCallbacks(execute=True):
+            book.title = 'The Tombs of Atuan'
+            book.save()
+        self.assertEqual(self.titles('earthsea'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        self.assertEqual(self.titles('tombs'), [])
+
+    def test_authors_follow_saves_and_deletes(self):
+        self.assertEqual(autocomplete.complete('authors', 'gui'),
+                         [(self.author.pk, 'Ursula K. Le Guin')])
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Author.objects.create(name='Gene Wolfe')
+        self.assertEqual(autocomplete.complete('authors', 'gene'), [(other.pk, 'Gene Wolfe')])
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertEqual(autocomplete.complete('authors', 'gene'), [])
+
+    def test_endpoint(self):
+        self.client.force_login(User.objects.create(username='librarian', is_staff=True))
+        url = reverse('myApp:autocomplete', args=['books'])
+        response = self.client.get(url, {'q': 'teh', 'limit': 5})
+        self.assertEqual(response.json(), {'results': [
+            {'id': self.books['Tehanu'].pk, 'label': 'Tehanu'}]})
+        self.assertEqual(
+            self.client.get(reverse('myApp:autocomplete', args=['shelves'])).status_code, 404)
+
+
+class DueDateTests(TestCase):
+    def setUp(self):
+        self.record = services.borrow_book(
+            make_book(), User.objects.create(username='reader'), rented_days=3)
+
+    def test_due_date_counts_from_the_stored_borrow_time(self):
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.due_at, self.record.borrowed_at + timedelta(days=3))
+
+    def test_saving_an_open_loan_keeps_its_fees(self):
+        fees.materialize()
+        record = BorrowRecord.objects.get(pk=self.record.pk)
+        as_of = record.fees_as_of
+        self.assertIsNotNone(as_of)
+        record.save()
+        record.refresh_from_db()
+        self.assertEqual(record.fees_as_of, as_of)
+        record.rented_days = 5
+        record.save()
+        record.refresh_from_db()
+        self.assertIsNone(record.fees_as_of)
+        self.assertEqual(record.due_at, record.borrowed_at + timedelta(days=5))
+
+    def test_returned_loan_keeps_its_final_fees(self):
+        record = services.return_record(self.record)
+        record.refresh_from_db()
+        self.assertEqual(record.fees_as_of, record.returned_at.date())
+        self.assertEqual(fees.materialize(), 0)
+        self.assertFalse(fees.stale(timezone.now().date()).filter(pk=record.pk).exists())
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   NOTICE_WORKERS=2, NOTICE_RATE=0)
+class OverdueNoticeTests(TestCase):
+    def setUp(self):
+        dune, emma = make_book('Dune'), make_book('Emma', copies=2)
+        alice, bob = [
+            User.objects.create(username=name, email=f'{name}@example.com')
+            for name in ('alice', 'bob')
+        ]
+        # Two loans for alice, one for bob: still one mail each.
+        for book, reader in ((dune, alice), (emma, alice), (emma, bob)):
+            services.borrow_book(book, reader)
+        BorrowRecord.objects.update(due_at=timezone.now() - timedelta(days=2))
+        fees.materialize()
+
+    def test_one_mail_per_overdue_borrower(self):
+        stats = notices.send_overdue_notices(batch_size=1)
+        self.assertEqual(stats['sent'], 2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         ['alice@example.com', 'bob@example.com'])
+
+    def test_rerun_sends_nothing(self):
+        notices.send_overdue_notices()
+        mail.outbox.clear()
+        stats = notices.send_overdue_notices()
+        self.assertEqual((stats['sent'], stats['skipped']), (0, 2))
+        self.assertEqual(mail.outbox, [])
+
+    def test_failed_send_is_retried(self):
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=OSError('mail server down')):
+            stats = notices.send_overdue_notices()
+        self.assertEqual(stats['failed'], 2)
+        self.assertEqual(
+            set(OverdueNotice.objects.values_list('status', flat=True)), {OverdueNotice.FAILED})
+        stats = notices.send_overdue_notices()
+        self.assertEqual(stats['sent'], 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(
+            set(OverdueNotice.objects.values_list('status', 'attempts')),
+            {(OverdueNotice.SENT, 2)})
+
+
+class DeletedLoanTests(TestCase):
+    def setUp(self):
+        self.book = make_book()
+        self.reader = User.objects.create(username='reader')
+        self.record = services.borrow_book(self.book, self.reader)
+
+    def assert_free(self):
+        book_copy = BookCopy.objects.get(book=self.book)
+        self.assertTrue(book_copy.is_available)
+        self.assertIsNone(book_copy.current_loan_id)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+        services.borrow_book(self.book, User.objects.create(username='next'))
+
+    def test_deleting_an_open_loan_frees_the_copy(self):
+        self.record.delete()
+        self.assert_free()
+
+    def test_deleting_the_borrower_frees_the_copy(self):
+        self.reader.delete()
+        self.assert_free()
+
+    def test_deleting_the_copy_keeps_the_counters(self):
+        BookCopy.objects.get(book=self.book).delete()
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.total_copies, self.book.available_copies), (0, 0))
+
+    def test_rebuild_counters_repairs_availability(self):
+        BorrowRecord.objects.filter(pk=self.record.pk).update(returned_at=timezone.now())
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', '--check', stdout=io.StringIO())
+        call_command('rebuild_counters', stdout=io.StringIO())
+        call_command('rebuild_counters', '--check', stdout=io.StringIO())
+        self.assert_free()
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        stats_cache.get_cache().clear()
+        self.book = make_book(copies=2)
+        self.reader = User.objects.create(username='reader')
+
+    def book_sums(self):
+        return {
+            book_id: (loans, returns) for book_id, loans, returns in
+            BookDailyStats.objects.order_by().values('book')
+            .annotate(loans=Sum('loans'), returns=Sum('returns'))
+            .values_list('book', 'loans', 'returns')
+        }
+
+    def test_update_counts_each_event_once(self):
+        record = services.borrow_book(self.book, self.reader)
+        services.return_record(record)
+        self.assertEqual(rollups.update(settle=0), 2)
+        self.assertEqual(rollups.update(settle=0), 0)
+        self.assertEqual(self.book_sums(), {self.book.pk: (1, 1)})
+        record.refresh_from_db()
+        stats = BookDailyStats.objects.get(book=self.book)
+        self.assertEqual(stats.revenue, record.total_fee)
+
+    @override_settings(ROLLUP_SETTLE_SECONDS=60)
+    def test_recent_events_wait_to_settle(self):
+        services.borrow_book(self.book, self.reader)
+        self.assertEqual(rollups.update(), 0)
+        self.assertFalse(BookDailyStats.objects.exists())
+        self.assertEqual(rollups.update(now=timezone.now() + timedelta(minutes=2)), 1)
+        self.assertEqual(self.book_sums(), {self.book.pk: (1, 0)})
+
+    def test_backfill_matches_a_recount_of_the_log(self):
+        # Loans from before the log started: no events of their own.
+        other = make_book('Emma')
+        earlier = timezone.now() - timedelta(days=3)
+        for book_copy in [*self.book.copies.all(), *other.copies.all()]:
+            BorrowRecord.objects.create(
+                book_copy=book_copy, borrower=self.reader,
+                borrowed_at=earlier, returned_at=earlier + timedelta(days=1))
+        services.borrow_book(self.book, self.reader)
+        self.assertEqual(events.backfill(), 6)
+        rollups.rebuild(settle=0)
+
+        counts = Counter(CirculationEvent.objects.values_list('book_id', 'kind'))
+        recount = {
+            book.pk: (counts[book.pk, CirculationEvent.BORROW],
+                      counts[book.pk, CirculationEvent.RETURN])
+            for book in (self.book, other)
+        }
+        self.assertEqual(self.book_sums(), {self.book.pk: (3, 2), other.pk: (1, 1)})
+        self.assertEqual(self.book_sums(), recount)
@@ -1,23 +1,32 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 
 
 app_name = 'myApp'
 
+# The read-heavy views have async versions for ASGI deployments.
+read_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     path('return-summary/<int:pk>/', views.return_summary, name='return_summary'),
     path('edit-book/<int:pk>/', views.BookUpdateView.as_view(), name='edit-book'),
     path('update-stock/<int:pk>/', views.update_stock, name='update-stock'),
     path('dashboard-management/', views.inventory_dashboard, name='inventory-dashboard'),
     path('transactions/', views.book_transactions, name='transactions'),
+    path('scan/<str:barcode>/', read_views.scan_barcode, name='scan'),
+    path('autocomplete/<str:kind>/', views.autocomplete_lookup, name='autocomplete'),
+    path('barcodes/<path:barcode>.<str:fmt>', views.barcode_image, name='barcode_image'),
     path('add-copy-book/', views.BookCopyCreateView.as_view(), name='add_copy_book'),
     path('add-book/', views.BookCreateView.as_view(), name='add-book'),
     path('add-author/', views.AuthorCreateView.as_view(), name='add-author'),
     path('borrow-book/<int:pk>/', views.borrow_book, name='borrow_book'),
     path('my-borrows/', views.my_borrows_list, name='my_borrows_list'),
     path('return-book/<int:pk>/', views.return_book, name='return_book'),
-    path('chart-data/', views.chart_data, name='chart_data'),
+    path('chart-data/', read_views.chart_data, name='chart_data'),
     path('generate-report-pdf/', views.generate_report_pdf, name='generate_report_pdf'),
-    path('', views.IndexTemplateView.as_view(), name='home'),
+    path('reports/<int:pk>/', views.report_status, name='report_status'),
+    path('reports/<int:pk>/download/', views.report_download, name='report_download'),
+    path('', read_views.IndexTemplateView.as_view(), name='home'),
 ]
\ No newline at end of file
@@ -1,25 +1,33 @@
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views import generic
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
-from django.utils import timezone
-from django.http import JsonResponse
+from django.utils.dateparse import parse_date
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from django.http import Http404, JsonResponse
+from django.db import IntegrityError, transaction
 from django.db.models import Sum
-from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
 from django.template.loader import render_to_string
-from django.http import HttpResponse
-import weasyprint
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from itertools import islice
 
 
-from .models import Author, BookCopy, BorrowRecord, Book
+from .models import (
+    Author, BookCopy, BorrowRecord, Book, CirculationEvent, LoanHistory, ReportJob
+)
 from .forms import (
     BorrowAndReturnForm, BookForm, AuthorForm, BookCopyFormSet,
                     NoFieldBorrowReturnForm
 )
+from . import (
+    autocomplete, barcodes, dashboard, intake, reports, scan, search, services,
+    stats_cache
+)
 
 
 
@@ -27,6 +35,19 @@ class IndexTemplateView(generic.ListView):
     model = Book
     template_name = "myApp/index.html"
     context_object_name = 'all_books'
+    paginate_by = 12
+
+    def get_queryset(self):
+        """Ranked search results for ``?q=``, otherwise the whole catalogue."""
+        q = self.request.GET.get('q', '').strip()
+        if q:
+            return search.search(q)
+        return Book.objects.select_related('author').order_by('pk')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['q'] = self.request.GET.get('q', '').strip()
+        return context
 
     # def get_context_data(self, **kwargs):
     #     context = super().get_context_data(**kwargs)
@@ -51,60 +72,45 @@ def book_transactions(request):
         select=cd['select']
         user=cd['user']
 
-        book = BookCopy.objects.filter(barcode=barcode).first()
+        book = BookCopy.objects.select_related('book').filter(barcode=barcode).first()
         if not book:
             messages.warning(request, "There is no book with the code you entered.")
             return redirect('myApp:transactions')
 
-        record = BorrowRecord.objects.filter(book_copy=book).order_by('-borrowed_at').first()
-
         if select == 'Borrow':
             if not user:
                 messages.warning(request, "Please select a user to borrow the book.")
                 return redirect('myApp:transactions')
-            if not record or record.returned_at:
-                if book.is_available:
-                    if cd['rented_days']:
-                        BorrowRecord.objects.create(
-                            book_copy=book, borrower=user, rented_days=cd['rented_days'])
-                    else:
-                        BorrowRecord.objects.create(
-                            book_copy=book, borrower=user)
-                    book.is_available = False
-                    book.save()
-                    messages.success(
-                        request,
-                        f"The user ({user}) borrowed the book ({book.book.title}) successfully.")
-                else:
-                    messages.warning(request, "This book is out of stock.")
+            try:
+                services.borrow_copy(book, user, rented_days=cd['rented_days'])
+            except services.CirculationError as e:
+                messages.warning(request, str(e))
             else:
-                messages.warning(
+                messages.success(
                     request,
-                    f"User ({record.borrower.username}) borrowed the book ({book.book.title}) and should return it.")
+                    f"The user ({user}) borrowed the book ({book.book.title}) successfully.")
 
         elif select == 'Return':
-            if record and not record.returned_at:
-                if record.borrower == user:
-                    book.is_available = True
-                    book.save()
-                    record.returned_at = timezone.now()
-                    record.save()
-                    messages.success(
-                                request,
-                                f"The book ({book.book.title}) has been returned successfully.")
-                    return redirect('myApp:return_summary', pk=record.pk)
-                else:
-                    messages.warning(
-                        request,
-                        f"This book ({book.book.title}) is borrowerd by another user.")
+            try:
+                record = services.return_copy(book, user=user, any_borrower=False)
+            except services.CirculationError as e:
+                messages.warning(request, str(e))
             else:
-                messages.warning(request, f"This book ({book.book.title}) is not borrowed.")
+                messages.success(
+                            request,
+                            f"The book ({book.book.title}) has been returned successfully.")
+                return redirect('myApp:return_summary', pk=record.pk)
 
         elif select == 'Track':
-            if record and not record.returned_at:
+            row = scan.lookup(barcode) or {}
+            CirculationEvent.objects.create(
+                kind=CirculationEvent.TRACK, book_copy_id=book.pk, book_id=book.book_id,
+                user_id=row.get('current_loan__borrower_id'),
+                record_id=row.get('current_loan__pk'))
+            if row.get('current_loan__pk'):
                 messages.info(
                     request,
-                    f"The user ({record.borrower.username}) has the book ({book.book.title}).")
+                    f"The user ({row['current_loan__borrower__username']}) has the book ({book.book.title}).")
             else:
                 messages.info(request, f"The book ({book.book.title}) is in the library.")
 
@@ -113,9 +119,63 @@ def book_transactions(request):
                   {'form': form, 'result': result})
 
 
+@staff_member_required
+@login_required
+def scan_barcode(request, barcode):
+    """Copy, book and open loan of a scanned barcode in one query."""
+    row = scan.lookup(barcode)
+    if row is None:
+        return JsonResponse(
+            {"error": "There is no book with the code you entered."}, status=404)
+    return JsonResponse(scan.as_json(row))
+
+
+@staff_member_required
+@login_required
+def autocomplete_lookup(request, kind):
+    """The best matches of ``?q=`` among books, authors or users, as JSON."""
+    if kind not in autocomplete.SOURCES:
+        raise Http404
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        limit = 10
+    matches = autocomplete.complete(kind, request.GET.get('q', ''), limit)
+    return JsonResponse(
+        {"results": [{"id": pk, "label": label} for pk, label in matches]})
+
+
+def _barcode_etag(request, barcode, fmt):
+    # No ETag for unknown barcodes: If-None-Match must not turn a 404 into a 304.
+    if not BookCopy.objects.filter(barcode=barcode).exists():
+        return None
+    return f'{fmt}-{barcode}'
+
+
+@login_required
+@condition(etag_func=_barcode_etag)
+def barcode_image(request, barcode, fmt):
+    """
+    The barcode of a copy as an image. It is rendered on the first request
+    and then comes from the barcode cache; browsers keep it for a year.
+    """
+    if fmt not in barcodes.CONTENT_TYPES:
+        raise Http404("Unknown image format.")
+    if not BookCopy.objects.filter(barcode=barcode).exists():
+        # The image of a deleted copy may still be in the cache.
+        raise Http404("There is no book with this barcode.")
+    image = barcodes.get_cached(barcode, fmt)
+    if image is None:
+        image = barcodes.cached_image(barcode, fmt)
+    response = HttpResponse(image, content_type=barcodes.CONTENT_TYPES[fmt])
+    patch_cache_control(response, private=True, max_age=60 * 60 * 24 * 365,
+                        immutable=True)
+    return response
+
+
 @login_required
 def return_summary(request, pk):
-    record = get_object_or_404(BorrowRecord, pk=pk)
+    record = get_object_or_404(LoanHistory, pk=pk)
     fee_data = record.get_total_debt_till_now()
     return render(request, 'myApp/return_summary.html',
                   {'record': record, 'fee_data': fee_data})
@@ -131,7 +191,22 @@ class AuthorCreateView(UserPassesTestMixin, LoginRequiredMixin, generic.CreateVi
         return self.request.user.is_staff
 
 
-class BookCreateView(UserPassesTestMixin, LoginRequiredMixin, generic.CreateView):
+class UniqueTitleMixin:
+    """
+    The form checks the title against the case-insensitive unique index;
+    a book saved by someone else in the meantime trips the index itself.
+    """
+
+    def form_valid(self, form):
+        try:
+            with transaction.atomic():
+                return super().form_valid(form)
+        except IntegrityError:
+            form.add_error('title', 'We already have this book.')
+            return self.form_invalid(form)
+
+
+class BookCreateView(UniqueTitleMixin, UserPassesTestMixin, LoginRequiredMixin, generic.CreateView):
     model = Book
     form_class = BookForm
     template_name = "myApp/add_book.html"
@@ -155,15 +230,14 @@ class BookCopyCreateView(UserPassesTestMixin, LoginRequiredMixin, generic.View):
     def post(self, request, *args, **kwargs):
         formset = BookCopyFormSet(request.POST, request.FILES)
         if formset.is_valid():
-            for form in formset:
-                if form.cleaned_data:
-                    book_copy = form.save(commit=False)
-                    book_copy.save()
+            intake.create_copies(
+                form.save(commit=False) for form in formset if form.cleaned_data
+            )
             return redirect(self.success_url)
         return render(request, self.template_name, {"formset": formset})
 
 
-class BookUpdateView(UserPassesTestMixin, LoginRequiredMixin, generic.UpdateView):
+class BookUpdateView(UniqueTitleMixin, UserPassesTestMixin, LoginRequiredMixin, generic.UpdateView):
     model = Book
     form_class = BookForm
     template_name = "myApp/edit_book.html"
@@ -176,35 +250,59 @@ class BookUpdateView(UserPassesTestMixin, LoginRequiredMixin, generic.UpdateView
 @staff_member_required
 @login_required
 def inventory_dashboard(request):
-    main_books = Book.objects.select_related('author'
-                                             ).prefetch_related('copies')
-    copy_books = BookCopy.objects.select_related('book'
-                                                 ).prefetch_related(
-                                                     'borrow_records')
+    params = request.GET
+    main_books = dashboard.book_queryset(params)
+    copy_books = dashboard.copy_queryset(params)
+    if params.get('stream'):
+        return _stream_inventory_dashboard(request, main_books, copy_books)
     return render(request,'myApp/inventory_dashboard.html',
         {
-            'main_books': main_books,
-            'copy_books': copy_books,
+            'books_page': dashboard.paginate(main_books, params, 'books_page'),
+            'copies_page': dashboard.paginate(copy_books, params, 'copies_page'),
         }
     )
 
 
+def _stream_inventory_dashboard(request, main_books, copy_books, chunk_size=500):
+    """
+    Send every matching row, rendering the tables ``chunk_size`` rows at a
+    time so the page starts arriving before the last rows are read.
+    """
+    page = render_to_string('myApp/inventory_dashboard.html',
+                            {'streaming': True}, request=request)
+    head, rest = page.split('<!--book-rows-->')
+    middle, tail = rest.split('<!--copy-rows-->')
+
+    def rows(template_name, name, queryset):
+        iterator = queryset.iterator(chunk_size=chunk_size)
+        while chunk := list(islice(iterator, chunk_size)):
+            yield render_to_string(template_name, {name: chunk}, request=request)
+
+    def content():
+        yield head
+        yield from rows('myApp/includes/book_rows.html', 'main_books', main_books)
+        yield middle
+        yield from rows('myApp/includes/copy_rows.html', 'copy_books', copy_books)
+        yield tail
+
+    return StreamingHttpResponse(content(), content_type='text/html; charset=utf-8')
+
+
 @staff_member_required
 @login_required
 def update_stock(request, pk):
-    book = get_object_or_404(BookCopy, pk=pk)
+    book = get_object_or_404(Book, pk=pk)
 
     if request.method == 'POST':
         action = request.POST.get('action')
 
         if action == 'increase':
-            book.stock += 1
-            book.save()
+            BookCopy.objects.create(book=book)
             messages.success(request, f"Stock for '{book.title}' increased.")
         elif action == 'decrease':
-            if book.stock > 0:
-                book.stock -= 1
-                book.save()
+            book_copy = book.copies.filter(is_available=True).first()
+            if book_copy is not None:
+                book_copy.delete()
                 messages.success(request,
                                  f"Stock for '{book.title}' decreased.")
             else:
@@ -232,20 +330,14 @@ def borrow_book(request, pk):
     if request.method == "POST":
         form = NoFieldBorrowReturnForm(request.POST)
         if form.is_valid():
-            book_copy = book.copies.filter(is_available=True).first()
-            if book_copy is not None:
-                form.instance.book_copy = book_copy
-                form.instance.borrower = request.user
-                form.save()
-                book_copy.is_available = False
-                book_copy.save()
-                messages.success(
-                    request,
-                    f'You borrowed {book_copy.book.title} successfully.')
+            try:
+                record = services.borrow_book(book, request.user)
+            except services.CirculationError as e:
+                messages.warning(request, str(e))
             else:
-                messages.warning(
+                messages.success(
                     request,
-                    'Unfortunately there is no any available copy of this book.')
+                    f'You borrowed {record.book_copy.book.title} successfully.')
             return redirect('myApp:home')
 
     form = NoFieldBorrowReturnForm()
@@ -255,17 +347,18 @@ def borrow_book(request, pk):
 
 @login_required
 def my_borrows_list(request):
-    records = BorrowRecord.objects.filter(
+    records = LoanHistory.objects.filter(
         borrower=request.user
-        ).select_related('book_copy', 'book_copy__book')
+        ).with_fees()
+    total_debt = records.aggregate(total=Sum('current_fee'))['total'] or 0
 
-    total_debt = 0
-    for record in records:
-        record.total_fee = record.get_total_fee()
-        total_debt += record.total_fee
+    page_obj = Paginator(
+        records.select_related('book_copy', 'book_copy__book'), 20
+        ).get_page(request.GET.get('page'))
 
     return render(request, 'myApp/my_borrows_list.html', {
-        "records": records,
+        "records": page_obj,
+        "page_obj": page_obj,
         "total_debt": total_debt,
     })
 
@@ -281,10 +374,11 @@ def return_book(request, pk):
     if request.method == 'POST':
         form = NoFieldBorrowReturnForm(request.POST)
         if form.is_valid():
-            record.returned_at = timezone.now()
-            record.book_copy.is_available = True
-            record.book_copy.save()
-            record.save()
+            try:
+                services.return_record(record, user=request.user)
+            except services.CirculationError as e:
+                messages.warning(request, str(e))
+                return redirect('myApp:my_borrows_list')
             return redirect('myApp:return_summary', pk=pk)
     form = NoFieldBorrowReturnForm()
     return render(request, 'myApp/return_book.html',
@@ -294,132 +388,89 @@ def return_book(request, pk):
                   })
 
 
+def _chart_params(request):
+    """
+    Optional ``top`` (a positive number) limits every chart to its N
+    biggest rows, ``since``/``until`` (YYYY-MM-DD) limit the borrow counts
+    and revenue to the days in that range, see ``analytics``. Raises
+    ValueError on bad input.
+    """
+    params = {'top': None}
+    if request.GET.get('top'):
+        try:
+            params['top'] = int(request.GET['top'])
+        except ValueError:
+            params['top'] = 0
+        if params['top'] < 1:
+            raise ValueError("top must be a positive number.")
+    for key in ('since', 'until'):
+        value = request.GET.get(key)
+        if value:
+            try:
+                params[key] = parse_date(value)
+            except ValueError:
+                params[key] = None
+            if params[key] is None:
+                raise ValueError(f"{key} must be a date (YYYY-MM-DD).")
+    return params
+
+
+def _chart_etag(request):
+    try:
+        return stats_cache.etag(_chart_params(request))
+    except ValueError:
+        return None
+
+
+def _chart_last_modified(request):
+    return stats_cache.last_modified()
+
+
+@condition(etag_func=_chart_etag, last_modified_func=_chart_last_modified)
 def chart_data(request):
-    # quries
-    queried_authors = Author.objects.prefetch_related(
-        'books',
-        'books__copies',
-        'books__copies__borrow_records'
-    )
-
-    queried_main_books = Book.objects.select_related(
-        'author'
-        ).prefetch_related(
-        'copies'
-    )
-
-    # each book how many copies has
-    books_list = [book.title for book in queried_main_books]
-    copies = [book.copies.count() for book in queried_main_books]
-
-    # each author how many copies has
-    authors_list = [author.name for author in queried_authors]
-    author_copies_count = [
-        sum(book.copies.count() for book in author.books.all())
-        for author in queried_authors
-    ]
-
-    # each author how many books has
-    authors_list = authors_list
-    author_books_count = [author.books.count() for author in queried_authors]
-
-    # daily_rent of each book
-    books_list = books_list
-    daily_rent_list = [book.daily_rent for book in queried_main_books]
-
-    # each book how many times were borrwed
-    books_list = books_list
-    book_borrowed_counts = [
-        sum(len(copy.borrow_records.all()) for copy in book.copies.all())
-        for book in queried_main_books
-    ]
-
-    # the books wich are borrowed now
-    books_list = books_list
-    books_are_borrowed_now = [
-        sum(1 for copy in book.copies.all() if not copy.is_available)
-        for book in queried_main_books
-    ]
-
-    # the books with the highest revenue
-    books_list = books_list
-    books_with_revenue = queried_main_books.annotate(
-        revenue=Sum("copies__borrow_records__total_fee")
-    )
-    books_revenue = [book.revenue or 0 for book in books_with_revenue]
+    """Series for the dashboard charts, see ``_chart_params`` for filters."""
+    try:
+        params = _chart_params(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
-    # users base on the revenue
-    users_with_revenue = get_user_model().objects.annotate(
-        revenue=Sum("borrowed_books__total_fee")
-    ).order_by('-revenue')
-    users_list = [user.username for user in users_with_revenue]
-    revenues_list = [user.revenue for user in users_with_revenue]
-
-    return JsonResponse(
-        {
-            "chart1": {
-                "labels": books_list,
-                "values": copies
-            },
-            "chart2": {
-                "labels": authors_list,
-                "values": author_copies_count
-            },
-            "chart3": {
-                "labels": authors_list,
-                "values": author_books_count
-            },
-            "chart4": {
-                "labels": books_list,
-                "values": daily_rent_list
-            },
-            "chart5": {
-                "labels": books_list,
-                "values": book_borrowed_counts
-            },
-            "chart6": {
-                "labels": books_list,
-                "values": books_are_borrowed_now
-            },
-            "chart7": {
-                "labels": books_list,
-                "values": books_revenue
-            },
-            "chart8": {
-                "labels": users_list,
-                "values": revenues_list
-            }
-        }
-    )
+    response = JsonResponse(stats_cache.chart_series(**params))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @staff_member_required
 @login_required
 def generate_report_pdf(request):
     if request.method == 'POST':
-        context = {
-            "main_books": Book.objects.all(),
-            "chart1_image": request.POST.get("chart1_image"),
-            "chart2_image": request.POST.get("chart2_image"),
-            "chart3_image": request.POST.get("chart3_image"),
-            "chart4_image": request.POST.get("chart4_image"),
-            "chart5_image": request.POST.get("chart5_image"),
-            "chart6_image": request.POST.get("chart6_image"),
-            "chart7_image": request.POST.get("chart7_image"),
-            "chart8_image": request.POST.get("chart8_image"),
-        }
-
-        # Render HTML
-        html_string = render_to_string("myApp/books_report_pdf.html", context, request=request)
-
         # Define Base URL (Crucial for Docker)
         # This tells WeasyPrint that "static/img.png" means "http://localhost:8000/static/img.png"
         base_url = request.build_absolute_uri('/')
+        job = reports.request_report(request.user, base_url)
+        return redirect('myApp:report_status', pk=job.pk)
+    return redirect('myApp:inventory-dashboard')
 
-        response = HttpResponse(content_type="application/pdf")
-        response['Content-Disposition'] = 'attachment; filename="books_report.pdf"'
 
-        # 3. Generate PDF with base_url
-        weasyprint.HTML(string=html_string, base_url=base_url).write_pdf(response)
+@staff_member_required
+@login_required
+def report_status(request, pk):
+    reports.expire_stale_jobs()
+    job = get_object_or_404(ReportJob, pk=pk)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            "id": job.pk,
+            "status": job.status,
+            "error": job.error,
+            "download_url": (reverse('myApp:report_download', args=[job.pk])
+                             if job.status == ReportJob.DONE else None),
+        })
+    return render(request, 'myApp/report_status.html', {'job': job})
 
-        return response
+
+@staff_member_required
+@login_required
+def report_download(request, pk):
+    job = get_object_or_404(ReportJob, pk=pk, status=ReportJob.DONE)
+    return FileResponse(job.file.open('rb'), as_attachment=True,
+                        filename="books_report.pdf",
+                        content_type="application/pdf")
@@ -0,0 +1,26 @@
+from django import forms
+from django.urls import reverse
+
+from . import autocomplete
+
+
+class AutocompleteWidget(forms.TextInput):
+    """
+    A search box for a ``ModelChoiceField``: it suggests rows of an
+    ``autocomplete`` source as the user types instead of rendering the whole
+    table as options, and posts the chosen primary key in a hidden input.
+    """
+    template_name = 'myApp/widgets/autocomplete.html'
+
+    class Media:
+        js = ['js/autocomplete.js']
+
+    def __init__(self, kind, attrs=None):
+        super().__init__(attrs)
+        self.kind = kind
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['url'] = reverse('myApp:autocomplete', args=[self.kind])
+        context['widget']['label'] = autocomplete.label(self.kind, value) if value else ''
+        return context
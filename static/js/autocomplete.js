@@ -0,0 +1,41 @@
+// Suggestions for myApp.widgets.AutocompleteWidget: fetch matches as the
+// user types, and put the primary key of the chosen one in the hidden input.
+document.querySelectorAll('[data-autocomplete-url]').forEach((input) => {
+  const hidden = document.getElementById(input.dataset.autocompleteFor);
+  const list = document.getElementById(input.getAttribute('list'));
+  let timer = null;
+  let pending = null;
+
+  const pick = () => {
+    const option = Array.from(list.options).find((o) => o.value === input.value);
+    hidden.value = option ? option.dataset.id : '';
+  };
+
+  input.addEventListener('input', () => {
+    pick();
+    clearTimeout(timer);
+    const q = input.value.trim();
+    if (!q) {
+      list.replaceChildren();
+      return;
+    }
+    timer = setTimeout(async () => {
+      if (pending) pending.abort();
+      pending = new AbortController();
+      try {
+        const url = `${input.dataset.autocompleteUrl}?q=${encodeURIComponent(q)}`;
+        const response = await fetch(url, { signal: pending.signal });
+        const data = await response.json();
+        list.replaceChildren(...data.results.map((result) => {
+          const option = document.createElement('option');
+          option.value = result.label;
+          option.dataset.id = result.id;
+          return option;
+        }));
+        pick();
+      } catch (err) {
+        if (err.name !== 'AbortError') console.error('Autocomplete failed:', err);
+      }
+    }, 150);
+  });
+});